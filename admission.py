@@ -0,0 +1,332 @@
+"""
+Admission control and load shedding.
+
+Every user-facing request (a chat turn, a research run, a queued research job) is admitted
+through `controller.admit(tenant, session, kind)`. Admission checks per-tenant and per-session
+budgets (tokens and requests per sliding window, concurrent requests) and the global load, and
+hands back a ticket carrying a degradation tier:
+
+    0 normal          full pipeline
+    1 reduced_search  fewer searches per research run
+    2 skip_email      ... and no report email
+    3 cached_only     ... and searches are answered from cache only
+    4 reject          AdmissionRejected with a retry-after
+
+Global load is the larger of in-flight model calls and queued research jobs relative to their
+limits; a tenant close to its token budget is degraded the same way. Tokens are charged by
+model_router.run_stage to the ticket of the request it runs under.
+"""
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Callable, Deque, Dict, Hashable, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+NORMAL, REDUCED_SEARCH, SKIP_EMAIL, CACHED_ONLY, REJECT = range(5)
+TIER_NAMES = ["normal", "reduced_search", "skip_email", "cached_only", "reject"]
+
+# Load (0..1+) at which each tier starts
+TIER_THRESHOLDS = [(REJECT, 1.0), (CACHED_ONLY, 0.9), (SKIP_EMAIL, 0.75), (REDUCED_SEARCH, 0.6)]
+REDUCED_SEARCHES = 2        # searches kept per research run from the reduced_search tier on
+DECISION_LOG_SIZE = 500
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name, default))
+
+
+class Budget(BaseModel):
+    tokens: int = Field(description="Model tokens per window")
+    requests: int = Field(description="Admitted requests per window")
+    concurrency: int = Field(description="Requests running at the same time")
+    window: float = Field(default=3600, description="Sliding window in seconds")
+
+
+TENANT_BUDGET = Budget(
+    tokens=_env_int("TENANT_TOKEN_BUDGET", 2_000_000),
+    requests=_env_int("TENANT_REQUEST_BUDGET", 120),
+    concurrency=_env_int("TENANT_CONCURRENCY", 4),
+)
+SESSION_BUDGET = Budget(
+    tokens=_env_int("SESSION_TOKEN_BUDGET", 500_000),
+    requests=_env_int("SESSION_REQUEST_BUDGET", 40),
+    concurrency=_env_int("SESSION_CONCURRENCY", 1),
+)
+MAX_IN_FLIGHT_CALLS = _env_int("MAX_IN_FLIGHT_CALLS", 32)
+MAX_QUEUE_DEPTH = _env_int("MAX_QUEUE_DEPTH", 20)
+
+
+class AdmissionRejected(Exception):
+    """ Raised when a request is shed; retry_after is in seconds """
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"Request rejected ({reason}), retry after {retry_after:.0f}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionDecision(BaseModel):
+    timestamp: float = Field(default_factory=time.time)
+    tenant: str
+    session: str
+    kind: str
+    tier: str
+    reason: str = Field(description="What set the tier: ok, global_load, tenant_tokens, session_tokens, ...")
+    load: float = Field(description="Load figure that set the tier")
+
+
+class Ticket(BaseModel):
+    """ An admitted request; nested admissions in the same context share it """
+    id: str = Field(default_factory=lambda: uuid.uuid4().hex[:12])
+    tenant: str
+    session: str
+    kind: str
+    tier: int = NORMAL
+    tokens: int = 0
+
+    @property
+    def tier_name(self) -> str:
+        return TIER_NAMES[self.tier]
+
+
+_current_ticket: ContextVar[Optional[Ticket]] = ContextVar("admission_ticket", default=None)
+
+
+class _Usage:
+    """ Sliding-window token / request counters and concurrency for one tenant or session """
+
+    def __init__(self):
+        self.tokens: Deque[Tuple[float, int]] = deque()
+        self.requests: Deque[float] = deque()
+        self.active = 0
+
+    def trim(self, window: float, now: float) -> None:
+        while self.tokens and self.tokens[0][0] < now - window:
+            self.tokens.popleft()
+        while self.requests and self.requests[0] < now - window:
+            self.requests.popleft()
+
+    def token_total(self) -> int:
+        return sum(tokens for _, tokens in self.tokens)
+
+    def retry_after(self, window: float, now: float) -> float:
+        """ Seconds until the oldest entry leaves the window """
+        candidates = ([self.tokens[0][0]] if self.tokens else []) + ([self.requests[0]] if self.requests else [])
+        oldest = min(candidates, default=now)
+        return max(1.0, oldest + window - now)
+
+
+# ============================
+# Controller
+# ============================
+class AdmissionController:
+    """ Budgets per tenant and session, global overload detection and the degradation tier per request """
+
+    def __init__(self, tenant_budget: Budget = TENANT_BUDGET, session_budget: Budget = SESSION_BUDGET,
+                 max_in_flight: int = MAX_IN_FLIGHT_CALLS, max_queue_depth: int = MAX_QUEUE_DEPTH,
+                 enabled: Optional[bool] = None):
+        self.budgets = {"tenant": tenant_budget, "session": session_budget}
+        self.max_in_flight = max_in_flight
+        self.max_queue_depth = max_queue_depth
+        self.enabled = os.environ.get("ADMISSION_CONTROL", "1") == "1" if enabled is None else enabled
+        # Session usage is keyed by (tenant, session): tenants reuse session names such as "default"
+        self.usage: Dict[str, Dict[Hashable, _Usage]] = {"tenant": defaultdict(_Usage), "session": defaultdict(_Usage)}
+        self.in_flight = 0
+        # Reports queued research jobs; set by watch_queue()
+        self.queue_depth: Callable[[], int] = lambda: 0
+        self.decisions: Deque[AdmissionDecision] = deque(maxlen=DECISION_LOG_SIZE)
+        self.tier_counts: Dict[str, int] = defaultdict(int)
+        self.rejections: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def watch_queue(self, queue) -> None:
+        """ Count queued jobs of a job_queue.JobQueue as load """
+        from job_queue import QUEUED
+        self.queue_depth = lambda: queue.counts().get(QUEUED, 0)
+
+    # ----------------------------
+    # Load and tiers
+    # ----------------------------
+    def global_load(self) -> float:
+        try:
+            depth = self.queue_depth()
+        except Exception:
+            depth = 0
+        return max(self.in_flight / self.max_in_flight, depth / self.max_queue_depth)
+
+    @staticmethod
+    def _scopes(tenant: str, session: str) -> Tuple[Tuple[str, Hashable], ...]:
+        """ (scope, usage key) pairs a request counts against """
+        return ("tenant", tenant), ("session", (tenant, session))
+
+    @staticmethod
+    def _tier_for(load: float) -> int:
+        for tier, threshold in TIER_THRESHOLDS:
+            if load >= threshold:
+                return tier
+        return NORMAL
+
+    def _assess(self, tenant: str, session: str, now: float) -> Tuple[int, str, float, float]:
+        """ (tier, reason, load, retry_after) for a new request; call with the lock held """
+        tier, reason, load, retry_after = NORMAL, "ok", self.global_load(), 5.0
+        tier = self._tier_for(load)
+        if tier:
+            reason = "global_load"
+
+        for scope, key in self._scopes(tenant, session):
+            budget = self.budgets[scope]
+            usage = self.usage[scope][key]
+            usage.trim(budget.window, now)
+            if usage.active >= budget.concurrency:
+                return REJECT, f"{scope}_concurrency", usage.active / budget.concurrency, 5.0
+            if len(usage.requests) >= budget.requests:
+                return REJECT, f"{scope}_requests", 1.0, usage.retry_after(budget.window, now)
+            token_load = usage.token_total() / budget.tokens
+            scope_tier = self._tier_for(token_load)
+            if scope_tier > tier:
+                tier, reason, load = scope_tier, f"{scope}_tokens", token_load
+                retry_after = usage.retry_after(budget.window, now)
+        return tier, reason, load, retry_after
+
+    # ----------------------------
+    # Admission
+    # ----------------------------
+    @asynccontextmanager
+    async def admit(self, tenant: str = "default", session: str = "default", kind: str = "request"):
+        """
+        Admit a request and yield its Ticket, or raise AdmissionRejected.
+        Inside an admitted request (e.g. the research tool called from a chat turn) the outer ticket is reused.
+        """
+        outer = _current_ticket.get()
+        if outer is not None:
+            yield outer
+            return
+        ticket = self._open(tenant, session, kind)
+        token = _current_ticket.set(ticket)
+        try:
+            yield ticket
+        finally:
+            try:
+                _current_ticket.reset(token)
+            except ValueError:
+                # Closed from another context, e.g. an async generator finalized elsewhere
+                pass
+            self._close(ticket)
+
+    def check(self, tenant: str = "default", session: str = "default", kind: str = "request") -> Ticket:
+        """ Admission decision without holding a slot, for work handed to another process (queued jobs) """
+        ticket = self._open(tenant, session, kind)
+        self._close(ticket)
+        return ticket
+
+    def _open(self, tenant: str, session: str, kind: str) -> Ticket:
+        if not self.enabled:
+            return Ticket(tenant=tenant, session=session, kind=kind)
+        now = time.time()
+        with self._lock:
+            tier, reason, load, retry_after = self._assess(tenant, session, now)
+            self.decisions.append(AdmissionDecision(tenant=tenant, session=session, kind=kind,
+                                                    tier=TIER_NAMES[tier], reason=reason, load=round(load, 3)))
+            self.tier_counts[TIER_NAMES[tier]] += 1
+            if tier == REJECT:
+                self.rejections[reason] += 1
+                print(f"🚦 Rejected {kind} for {tenant}/{session}: {reason}")
+                raise AdmissionRejected(reason, retry_after)
+            for scope, key in self._scopes(tenant, session):
+                usage = self.usage[scope][key]
+                usage.active += 1
+                usage.requests.append(now)
+        if tier:
+            print(f"🚦 Degrading {kind} for {tenant}/{session} to {TIER_NAMES[tier]} ({reason}, load {load:.2f})")
+        return Ticket(tenant=tenant, session=session, kind=kind, tier=tier)
+
+    def _close(self, ticket: Ticket) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            for scope, key in self._scopes(ticket.tenant, ticket.session):
+                usage = self.usage[scope][key]
+                usage.active = max(0, usage.active - 1)
+
+    # ----------------------------
+    # Accounting
+    # ----------------------------
+    def call_started(self) -> None:
+        with self._lock:
+            self.in_flight += 1
+
+    def call_finished(self, tokens: int = 0) -> None:
+        """ One model call ended; its tokens go to the budgets of the current request """
+        ticket = _current_ticket.get()
+        now = time.time()
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+            if ticket is None or not tokens:
+                return
+            ticket.tokens += tokens
+            for scope, key in self._scopes(ticket.tenant, ticket.session):
+                self.usage[scope][key].tokens.append((now, tokens))
+
+    def metrics(self) -> Dict:
+        """ Degradation and rejection counts, current load and per-tenant usage """
+        now = time.time()
+        with self._lock:
+            tenants = {}
+            for tenant, usage in self.usage["tenant"].items():
+                usage.trim(self.budgets["tenant"].window, now)
+                tenants[tenant] = {"tokens": usage.token_total(), "requests": len(usage.requests), "active": usage.active}
+            return {
+                "global_load": round(self.global_load(), 3),
+                "current_tier": TIER_NAMES[self._tier_for(self.global_load())],
+                "in_flight_calls": self.in_flight,
+                "tiers": dict(self.tier_counts),
+                "rejections": dict(self.rejections),
+                "tenants": tenants,
+            }
+
+
+controller = AdmissionController()
+
+
+def current_ticket() -> Optional[Ticket]:
+    return _current_ticket.get()
+
+
+def current_tier() -> int:
+    """ Degradation tier of the request running in this context (NORMAL outside admitted requests) """
+    ticket = _current_ticket.get()
+    return ticket.tier if ticket is not None else NORMAL
+
+
+if __name__ == "__main__":
+    # Offline check: one heavy tenant and growing global load
+    import asyncio
+
+    async def main():
+        local = AdmissionController(tenant_budget=Budget(tokens=10_000, requests=100, concurrency=2),
+                                    session_budget=Budget(tokens=10_000, requests=100, concurrency=2),
+                                    max_in_flight=10, enabled=True)
+        for i in range(12):
+            try:
+                async with local.admit("heavy", "s1", "research") as ticket:
+                    local.call_started()
+                    local.call_finished(tokens=1_000)
+                    print(f"request {i}: {ticket.tier_name}")
+            except AdmissionRejected as e:
+                print(f"request {i}: {e}")
+        for in_flight in (5, 7, 8, 9, 10):
+            local.in_flight = in_flight
+            try:
+                async with local.admit("light", "s2", "chat") as ticket:
+                    print(f"in flight {in_flight}: {ticket.tier_name}")
+            except AdmissionRejected as e:
+                print(f"in flight {in_flight}: {e}")
+        local.in_flight = 0
+        print(local.metrics())
+
+    asyncio.run(main())
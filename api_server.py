@@ -0,0 +1,351 @@
+"""
+Headless HTTP API for research, feature generation and clarifying questions.
+
+Every request runs on the server's single event loop (no per-request asyncio.run). Research and
+feature requests stream Server-Sent Events and can be cancelled: by disconnecting, or with
+POST /requests/{request_id}/cancel using the id from the first `request` event.
+With "clarify": true, /research sends its clarifying questions as a `clarification` event and starts
+researching the bare idea while they are answered with POST /research/{request_id}/answers.
+
+    uvicorn api_server:app --port 8000            # or: python api_server.py --port 8000
+    API_SIMULATE=1 python api_server.py           # offline pipeline with realistic stage delays
+    RESEARCH_QUEUE=1 python api_server.py         # run research on the research_worker.py pool
+
+Endpoints:
+    POST /research      {"feature_idea", "clarified_query"?, "clarify"?, "tenant"?, "session"?}   -> SSE
+    POST /research/{request_id}/answers {"answers"}                                          -> JSON
+    POST /feature       {"message", "history"?, "tenant"?, "session"?}                           -> SSE
+    POST /clarify       {"query", "count"?, "refine"?}                                           -> JSON
+    POST /clarify/query {"query", "answers"}                                                     -> JSON
+    POST /requests/{request_id}/cancel                                                           -> JSON
+    GET  /metrics, GET /health                                                                   -> JSON
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import uuid
+from typing import Any, AsyncIterator, Dict, Optional, Set
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from admission import AdmissionRejected, controller as admission_controller
+from cancellation import CancelToken, cancel_stats
+from job_queue import DONE
+
+# Offline mode for load tests: the research pipeline is replaced by stage-shaped delays
+SIMULATE = os.environ.get("API_SIMULATE") == "1"
+# Hand research runs to the research_worker.py pool (shared JOB_QUEUE_URL) instead of running them here
+RESEARCH_QUEUE = os.environ.get("RESEARCH_QUEUE") == "1"
+SIMULATED_STAGES = [
+    ("🔍 Conducting market and competitive analysis...", 0.25),
+    ("⚙️ Analyzing technical feasibility and implementation...", 0.05),
+    ("📊 Evaluating business impact and ROI...", 0.05),
+    ("📝 Generating comprehensive product analysis report...", 0.4),
+    ("📧 Sending analysis report...", 0.1),
+]
+
+_SENTINEL = object()
+
+
+def sse(event: str, data: Any) -> str:
+    """ One Server-Sent Event """
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class StreamingRequest:
+    """ A running request: its task, the events it produced and whether it got admitted """
+
+    def __init__(self, kind: str):
+        self.id = uuid.uuid4().hex[:16]
+        self.kind = kind
+        self.events: asyncio.Queue = asyncio.Queue()
+        self.admitted: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.task: Optional[asyncio.Task] = None
+        # Cancelling the token stops the task and every search / tool task it started
+        self.token = CancelToken(f"{kind} request {self.id}")
+
+    def emit(self, event: str, data: Any) -> None:
+        self.events.put_nowait((event, data))
+
+    def close(self) -> None:
+        self.events.put_nowait(_SENTINEL)
+
+    def cancel(self, reason: str) -> None:
+        """ Cancel the request's work and wait for it to wind down in the background (bounded, measured) """
+        if self.token.cancel(reason):
+            drain = asyncio.get_running_loop().create_task(self.token.drain())
+            DRAINING.add(drain)
+            drain.add_done_callback(DRAINING.discard)
+
+
+RUNNING: Dict[str, StreamingRequest] = {}
+CLARIFICATIONS: Dict[str, Any] = {}     # ClarificationSession of each "clarify" research request, by request id
+DRAINING: Set[asyncio.Task] = set()     # drains of cancelled requests, referenced until they finish
+
+
+# ============================
+# Producers
+# ============================
+async def simulated_research(feature_idea: str) -> AsyncIterator[str]:
+    """ Same updates as ProductAnalysisManager.run, with lognormal stage delays instead of model calls """
+    from research_manager import REPORT, ResearchUpdate
+    for status, seconds in SIMULATED_STAGES:
+        yield status
+        await asyncio.sleep(seconds * random.lognormvariate(0, 0.3))
+    yield "✅ Product analysis complete!"
+    yield ResearchUpdate(f"# Product Feature Analysis: {feature_idea}\n\nSimulated report.", REPORT)
+
+
+def open_clarification(stream: StreamingRequest, feature_idea: str):
+    """ Register a clarification session for the request and send its questions as a `clarification` event """
+    from query_clarifying_agent import ClarificationSession
+    clarification = CLARIFICATIONS[stream.id] = ClarificationSession(feature_idea)
+    stream.emit("clarification", {"request_id": stream.id,
+                                  "questions": [question.question for question in clarification.questions.questions]})
+    return clarification
+
+
+async def produce_queued_research(stream: StreamingRequest, body: Dict) -> None:
+    from research_worker import cancel_job, submit_research, wait_for_job
+    tenant, session = body.get("tenant", "default"), body.get("session", stream.id)
+    clarified_query = body.get("clarified_query")
+    if body.get("clarify") and not clarified_query:
+        # Answers can't reach a worker process, so the job is submitted once they are in
+        from query_clarifying_agent import create_query
+        from research_manager import CLARIFICATION_TIMEOUT
+        clarification = open_clarification(stream, body["feature_idea"])
+        try:
+            answers = await clarification.wait_answers(timeout=CLARIFICATION_TIMEOUT)
+            clarified_query = await create_query(body["feature_idea"], answers)
+        except asyncio.TimeoutError:
+            stream.emit("status", "⌛ No answers to the clarifying questions yet, so the research covers the original idea.")
+    # Admission is decided at submit time; the job then runs in a worker process
+    job_id = await asyncio.to_thread(submit_research, body["feature_idea"], clarified_query,
+                                     tenant=tenant, session=session)
+    stream.admitted.set_result(None)
+    stream.emit("status", f"⏳ Research queued as job {job_id}")
+    try:
+        job = await wait_for_job(job_id)
+    except asyncio.CancelledError:
+        # Stop the worker too, not only this poll: it would keep calling (and billing) models
+        await asyncio.to_thread(cancel_job, job_id, reason=stream.token.reason or "cancelled")
+        raise
+    if job.status != DONE:
+        raise RuntimeError(job.error or f"Research job {job_id} failed")
+    stream.emit("report", job.result)
+
+
+async def produce_research(stream: StreamingRequest, body: Dict) -> None:
+    if RESEARCH_QUEUE and not SIMULATE:
+        return await produce_queued_research(stream, body)
+    tenant, session = body.get("tenant", "default"), body.get("session", stream.id)
+    async with admission_controller.admit(tenant, session, "research") as ticket:
+        stream.admitted.set_result(ticket)
+        if SIMULATE:
+            updates = simulated_research(body["feature_idea"])
+        else:
+            from research_manager import ProductAnalysisManager
+            manager = ProductAnalysisManager(
+                tenant=tenant, session=session,
+                on_report_field=lambda field: stream.emit("report_field", {"path": list(field.path), "value": field.value}),
+            )
+            clarification = None
+            if body.get("clarify") and not body.get("clarified_query"):
+                # Research starts on the bare idea while the answers are on their way (POST .../answers)
+                clarification = open_clarification(stream, body["feature_idea"])
+            updates = manager.run(body["feature_idea"], body.get("clarified_query"), clarification=clarification)
+        # Updates are typed by the manager: status lines stream as they come, the report is one event
+        last, reported = None, False
+        async for update in updates:
+            last = update
+            kind = getattr(update, "kind", "status")
+            stream.emit(kind, str(update))
+            reported = reported or kind == "report"
+        if not reported:
+            # e.g. rejected by the manager's own admission check: the last status line says why
+            stream.emit("error", {"message": str(last) if last is not None else "No analysis report generated."})
+
+
+async def produce_feature(stream: StreamingRequest, body: Dict) -> None:
+    from feature_agent import handle_feature_request
+    tenant, session = body.get("tenant", "default"), body.get("session", stream.id)
+    async with admission_controller.admit(tenant, session, "chat") as ticket:
+        stream.admitted.set_result(ticket)
+        response = await handle_feature_request(
+            body["message"], body.get("history", []),
+            on_field=lambda agent, field: stream.emit("field", {"agent": agent, "path": list(field.path),
+                                                                "value": field.value}),
+        )
+        stream.emit("response", response)
+
+
+async def _run(stream: StreamingRequest, producer, body: Dict) -> None:
+    try:
+        await producer(stream, body)
+        stream.emit("done", {"request_id": stream.id})
+    except AdmissionRejected as e:
+        if not stream.admitted.done():
+            stream.admitted.set_exception(e)
+    except asyncio.CancelledError:
+        stream.emit("cancelled", {"request_id": stream.id})
+        raise
+    except Exception as e:
+        print(f"Error in {stream.kind} request {stream.id}: {e}")
+        stream.emit("error", {"message": str(e)})
+    finally:
+        if not stream.admitted.done():
+            # Failed before admission; the error event is already queued
+            stream.admitted.set_result(None)
+        RUNNING.pop(stream.id, None)
+        CLARIFICATIONS.pop(stream.id, None)
+        stream.close()
+
+
+async def _stream_events(stream: StreamingRequest) -> AsyncIterator[str]:
+    try:
+        yield sse("request", {"request_id": stream.id, "kind": stream.kind})
+        while True:
+            item = await stream.events.get()
+            if item is _SENTINEL:
+                return
+            yield sse(*item)
+    finally:
+        # The client went away: stop paying for work nobody will read
+        if stream.task is not None and not stream.task.done():
+            stream.cancel("disconnect")
+
+
+async def start_streaming(kind: str, producer, body: Dict):
+    """ Start the producer, wait for its admission decision, then stream its events """
+    stream = StreamingRequest(kind)
+    RUNNING[stream.id] = stream
+    stream.task = stream.token.spawn(_run(stream, producer, body))
+    try:
+        await asyncio.shield(stream.admitted)
+    except AdmissionRejected as e:
+        return JSONResponse({"error": "rejected", "reason": e.reason, "retry_after": e.retry_after},
+                            status_code=429, headers={"Retry-After": str(int(e.retry_after))})
+    except asyncio.CancelledError:
+        stream.token.cancel("disconnect")
+        raise
+    return StreamingResponse(_stream_events(stream), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Request-Id": stream.id})
+
+
+# ============================
+# Routes
+# ============================
+async def research(request: Request):
+    body = await request.json()
+    if not body.get("feature_idea"):
+        return JSONResponse({"error": "feature_idea is required"}, status_code=400)
+    return await start_streaming("research", produce_research, body)
+
+
+async def answers(request: Request):
+    clarification = CLARIFICATIONS.get(request.path_params["request_id"])
+    if clarification is None:
+        return JSONResponse({"error": "unknown or finished clarification"}, status_code=404)
+    if clarification.answered:
+        return JSONResponse({"error": "already answered"}, status_code=409)
+    body = await request.json()
+    if not isinstance(body.get("answers"), list):
+        return JSONResponse({"error": "answers must be a list"}, status_code=400)
+    clarification.submit_answers([str(answer) for answer in body["answers"]])
+    return JSONResponse({"accepted": True, "request_id": request.path_params["request_id"]})
+
+
+async def feature(request: Request):
+    body = await request.json()
+    if not body.get("message"):
+        return JSONResponse({"error": "message is required"}, status_code=400)
+    return await start_streaming("feature", produce_feature, body)
+
+
+async def clarify(request: Request):
+    from query_clarifying_agent import classify_framework, refine_questions, template_questions
+    body = await request.json()
+    query = body.get("query")
+    if not query:
+        return JSONResponse({"error": "query is required"}, status_code=400)
+    if body.get("refine"):
+        return JSONResponse({"questions_text": await refine_questions(query)})
+    output = template_questions(query, count=int(body.get("count", 3)))
+    return JSONResponse({"framework": classify_framework(query),
+                         "questions": [question.model_dump() for question in output.questions]})
+
+
+async def clarified_query(request: Request):
+    from query_clarifying_agent import create_query
+    body = await request.json()
+    if not body.get("query"):
+        return JSONResponse({"error": "query is required"}, status_code=400)
+    return JSONResponse({"clarified_query": await create_query(body["query"], body.get("answers", []))})
+
+
+async def cancel(request: Request):
+    stream = RUNNING.get(request.path_params["request_id"])
+    if stream is None or stream.task is None:
+        return JSONResponse({"cancelled": False, "error": "unknown or finished request"}, status_code=404)
+    stream.cancel("api_cancel")
+    return JSONResponse({"cancelled": True, "request_id": stream.id})
+
+
+def store_stats() -> Dict[str, Any]:
+    """ Stats of the stores research is configured to use; disabled ones are not opened (that creates their files) """
+    from search_providers import provider_names
+    stats: Dict[str, Any] = {}
+    if os.environ.get("REPORT_REUSE", "0") == "1":
+        from report_archive import report_archive
+        stats["report_archive"] = report_archive().stats()
+    if os.environ.get("KNOWLEDGE_BASE", "1") == "1":
+        from knowledge_base import knowledge_base
+        stats["knowledge_base"] = knowledge_base().stats()
+    if "docs" in provider_names():
+        from doc_index import document_index
+        stats["doc_index"] = document_index().stats()
+    return stats
+
+
+async def metrics(request: Request):
+    from model_router import router
+    from structured_repair import repair_stats
+    # Both read SQLite files (admission load includes the job queue depth)
+    admission, stores = await asyncio.gather(asyncio.to_thread(admission_controller.metrics),
+                                             asyncio.to_thread(store_stats))
+    return JSONResponse({"running": len(RUNNING), "admission": admission,
+                         "models": router.report(), "output_repair": repair_stats(),
+                         "cancellation": cancel_stats(), **stores})
+
+
+async def health(request: Request):
+    return JSONResponse({"status": "ok", "simulate": SIMULATE})
+
+
+app = Starlette(routes=[
+    Route("/research", research, methods=["POST"]),
+    Route("/research/{request_id}/answers", answers, methods=["POST"]),
+    Route("/feature", feature, methods=["POST"]),
+    Route("/clarify", clarify, methods=["POST"]),
+    Route("/clarify/query", clarified_query, methods=["POST"]),
+    Route("/requests/{request_id}/cancel", cancel, methods=["POST"]),
+    Route("/metrics", metrics),
+    Route("/health", health),
+])
+
+
+if __name__ == "__main__":
+    import uvicorn
+    from dotenv import load_dotenv
+
+    load_dotenv(override=True)
+    parser = argparse.ArgumentParser(description="Product MVP Assistant API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
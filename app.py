@@ -1,19 +1,25 @@
 import streamlit as st
 from dotenv import load_dotenv
-from research_manager import ProductAnalysisManager
-from feature_agent import handle_feature_request
-from agents import Agent, Runner, function_tool
-from agents.tracing import trace
+from prompt_registry import RESEARCH_AGENT_INSTRUCTIONS, render, format_history
+from feature_prewarm import FeaturePrewarmer, is_handoff_question, first_turn_response
+from admission import AdmissionRejected, controller as admission_controller
+from startup import warm_up
+from chat_view import render_history, reset_history_view
+from message_store import MessageStore, sessions_memory, format_bytes
+from cancellation import CancelToken, run_cancellable
 import asyncio
+import functools
+import importlib.util
 import os
 import json
+import uuid
 
-# Handle optional dependencies gracefully
-try:
-    import sendgrid
-    SENDGRID_AVAILABLE = True
-except ImportError:
-    SENDGRID_AVAILABLE = False
+# Agent modules (and the Agents SDK behind them) are imported on first use, not at startup,
+# so the first page renders without waiting for them; startup.warm_up() loads them right after.
+
+# Handle optional dependencies gracefully (checked without importing)
+SENDGRID_AVAILABLE = importlib.util.find_spec("sendgrid") is not None
+if not SENDGRID_AVAILABLE:
     print("⚠️  SendGrid not available - email features will be disabled")
 
 # Load environment variables
@@ -21,9 +27,19 @@ load_dotenv(override=True)
 
 # No global variables - using Streamlit session state only
 
-@function_tool
+# Research starts on the bare idea while the user answers its clarifying questions (CLARIFY_RESEARCH=0 disables)
+CLARIFY_RESEARCH = os.environ.get("CLARIFY_RESEARCH", "1") == "1"
+
 async def research_report(query: str) -> str:
     """Conduct research on the given query"""
+    from agents.tracing import trace
+    from research_manager import ClarifiedResearch, ProductAnalysisManager
+    if CLARIFY_RESEARCH:
+        # The next user message answers the questions and gets the report (see _assistant_turn)
+        pending = ClarifiedResearch(query, tenant=st.session_state.tenant, session=st.session_state.session_id)
+        st.session_state.pending_research = pending
+        return ("Research has started. Before it can finish, ask the user these clarifying questions exactly "
+                f"as written and wait for their answers:\n{pending.questions}")
     try:
         with trace("Research_Report_Tool"):
             report_chunks = []
@@ -39,40 +55,17 @@ async def research_report(query: str) -> str:
 # ============================
 # Research Agent
 # ============================
-research_agent = Agent(
-    name="Alex_ResearchManager",
-    instructions="""
-You are Alex, a senior Product Manager specializing in research and initial product assessment.
-
-YOUR ROLE:
-- Greet users and understand their product ideas
-- Assess if research is needed and conduct it when appropriate
-- Handoff to MVP development when research is complete
-
-CONVERSATION FLOW:
-1. GREETING: Welcome users and ask about their product ideas
-2. RESEARCH ASSESSMENT: Determine if research is needed
-   - If user wants research: Use research_report tool to conduct comprehensive market research
-   - If user provides research: Accept and summarize their research
-   - If no research needed: Proceed directly to handoff
-3. HANDOFF: When research is complete, ask "Are you ready to proceed to feature development?" and wait for user confirmation before saying "Ready for MVP development"
-
-TOOL USAGE:
-- research_report: Use when user wants market research or when you determine research is needed
-
-CONVERSATION STYLE:
-- Be conversational, professional, and context-aware
-- Focus on research phase only
-- When research is complete, clearly indicate readiness for MVP development
-- Don't handle MVP questions - handoff to MVP agent
-
-HANDOFF CRITERIA:
-- Research is complete (either automatic or user-provided)
-- User explicitly confirms they are ready for feature development
-- Only after user confirmation, say "Ready for MVP development" to trigger handoff
-""",
-    tools=[research_report]
-)
+@functools.lru_cache(maxsize=None)
+def get_research_agent():
+    """ The research agent, built on first use """
+    from agents import Agent, function_tool
+    from model_router import stage_model
+    return Agent(
+        name="Alex_ResearchManager",
+        instructions=RESEARCH_AGENT_INSTRUCTIONS,
+        tools=[function_tool(research_report)],
+        model=stage_model("research_agent")
+    )
 
 def format_feature_definition(feature_def) -> str:
     """Format FeatureDefinition object into proper markdown structure"""
@@ -118,25 +111,96 @@ def format_feature_definition(feature_def) -> str:
         # It's already a string or other format
         return str(feature_def)
 
-async def Assistant_conversation(message: str, history):
-    """Conversation handler with research agent and MVP agent handoff"""
+class FeatureDraftRenderer:
+    """Renders the feature draft into a placeholder field by field while it is being generated"""
+
+    def __init__(self, placeholder):
+        self.placeholder = placeholder
+        self.fields = {}
+        self.core_features = {}     # by index: outline-first drafts write them concurrently
+        self.status = ""
+
+    def __call__(self, agent_name, field):
+        from feature_agent import FeatureDefinition, feature_evaluator_agent
+        key = field.path[0]
+        if agent_name == feature_evaluator_agent.name:
+            if field.path == ("decision",):
+                self.status = f"🔎 Reviewer decision: **{field.value}**\n\n"
+        elif key == "feature_name":
+            # A new draft (or a revision) has started
+            self.fields = {"feature_name": field.value}
+            self.core_features = {}
+        elif key == "core_features":
+            if len(field.path) == 2:
+                self.core_features[field.path[1]] = field.value
+        elif len(field.path) == 1:
+            self.fields[key] = field.value
+        if "feature_name" not in self.fields:
+            return
+        core_features = [self.core_features[index] for index in sorted(self.core_features)]
+        draft = FeatureDefinition.model_construct(**self.fields, core_features=core_features)
+        self.placeholder.markdown(self.status + format_feature_definition(draft))
+
+async def Assistant_conversation(message: str, history, on_field=None):
+    """Conversation handler with research agent and MVP agent handoff, admitted per tenant and session"""
+    try:
+        async with admission_controller.admit(st.session_state.tenant, st.session_state.session_id, "chat"):
+            return await _assistant_turn(message, history, on_field)
+    except AdmissionRejected as e:
+        return f"⚠️ Alex is handling a lot of requests right now. Please try again in {e.retry_after:.0f} seconds."
+
+async def _assistant_turn(message: str, history, on_field=None):
+    from agents.tracing import trace
+    from feature_agent import handle_feature_request
+    from model_router import run_stage
     print(f"\n🔍 DEBUG - Assistant_conversation called with message: '{message}'")
     print(f"🔍 DEBUG - Current state: mvp_phase={st.session_state.mvp_phase}")
     print(f"🔍 DEBUG - History length: {len(history) if history else 0}")
     
+    pending = st.session_state.pending_research
+    if pending is not None and not st.session_state.mvp_phase:
+        # This message answers the clarifying questions of the research already running
+        print("🔍 DEBUG - Answering clarifying questions of pending research")
+        st.session_state.pending_research = None
+        pending.answer([message])
+        try:
+            report = await pending.report()
+        except Exception as e:
+            return f"Error conducting research: {str(e)}"
+        response = f"{report}\n\nAre you ready to proceed to feature development?"
+        st.session_state.feature_prewarmer.start(list(history) + [{"role": "assistant", "content": response}])
+        return response
+
     # Check if we should switch to MVP phase using session state history
     if not st.session_state.mvp_phase and len(history) >= 2:
         last_assistant_msg = history[-2]["content"]
         if "ready for mvp development" in last_assistant_msg.lower():
             print("🔍 DEBUG - Switching to Feature phase")
             st.session_state.mvp_phase = True
+            # Index of the first feature-phase message in the session's messages
+            st.session_state.feature_start = len(st.session_state.messages) - 1
+            st.session_state.feature_prewarm = await st.session_state.feature_prewarmer.ready(
+                timeout=float(os.environ.get("FEATURE_PREWARM_WAIT", "2")))
+            if st.session_state.feature_prewarm is not None:
+                print("🔍 DEBUG - Serving first feature turn from pre-warmed work")
+                prewarm = st.session_state.feature_prewarm
+                response = first_turn_response(prewarm)
+                if prewarm.draft is not None:
+                    response = format_feature_definition(prewarm.draft) + "\n\n" + response
+                return response
     
     try:
         # Route to appropriate agent based on current phase
         if st.session_state.mvp_phase:
             print("🔍 DEBUG - Using Feature Agent")
+            prewarm = st.session_state.feature_prewarm
+            history = st.session_state.messages
+            if prewarm is not None:
+                # The digest stands in for the research conversation
+                history = history[st.session_state.feature_start:]
             with trace("Feature_Agent_Call"):
-                feature_response = await handle_feature_request(message, st.session_state.conversation_history)
+                feature_response = await handle_feature_request(message, history, on_field=on_field,
+                                                                 prewarm=prewarm)
             # Format the response properly
             formatted_response = format_feature_definition(feature_response)
             return formatted_response
@@ -146,14 +210,18 @@ async def Assistant_conversation(message: str, history):
             context_message = _build_context_message(message, history)
             
             with trace("Research_Agent_Call"):
-                result = await Runner.run(
-                    research_agent,
+                result = await run_stage(
+                    "research_agent",
+                    get_research_agent(),
                     context_message
                 )
             
             response = result.final_output
             # Ensure response is a string to avoid JSON schema issues
             response_str = str(response)
+            if is_handoff_question(response_str):
+                # Prepare the feature phase while the user reads the question
+                st.session_state.feature_prewarmer.start(list(history) + [{"role": "assistant", "content": response_str}])
             return response_str
         
     except Exception as e:
@@ -161,24 +229,48 @@ async def Assistant_conversation(message: str, history):
         error_msg = f"Error in conversation: {str(e)}"
         return error_msg
 
+def _session_watchdog(placeholder, token: CancelToken):
+    """
+    Streamlit only notices a rerun (the Reset button, a new message) or a closed tab when the script
+    next touches the page, and then aborts it with an exception. Touching an empty placeholder while
+    a turn runs lets that happen mid-turn; the turn's work is cancelled before the abort goes on.
+    """
+    def check():
+        try:
+            placeholder.empty()
+        except BaseException as e:
+            # RerunException / StopException; matched by name, their module moved between Streamlit versions
+            token.cancel("reset" if type(e).__name__ == "RerunException" else "disconnect")
+            raise
+    return check
+
 def _build_context_message(message: str, history) -> str:
     """Build context message with conversation history"""
     if not history:
         return message
     
-    context_message = "Conversation History:\n"
-    for msg in history:
-        context_message += f"{msg['role']}: {msg['content']}\n"
-    context_message += f"\nCurrent user message: {message}"
-    return context_message
+    return render("conversation.research", history=format_history(history), message=message)
 
 # Initialize session state
+# One store per session serves both the chat display and the agent prompts (see message_store.py)
 if "messages" not in st.session_state:
-    st.session_state.messages = []
+    st.session_state.messages = MessageStore()
 if "mvp_phase" not in st.session_state:
     st.session_state.mvp_phase = False
-if "conversation_history" not in st.session_state:
-    st.session_state.conversation_history = []
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+if "tenant" not in st.session_state:
+    st.session_state.tenant = st.query_params.get("tenant", os.environ.get("TENANT_ID", "default"))
+if "feature_prewarmer" not in st.session_state:
+    st.session_state.feature_prewarmer = FeaturePrewarmer()
+if "feature_prewarm" not in st.session_state:
+    st.session_state.feature_prewarm = None
+if "feature_start" not in st.session_state:
+    st.session_state.feature_start = 0
+if "cancel_token" not in st.session_state:
+    st.session_state.cancel_token = CancelToken()
+if "pending_research" not in st.session_state:
+    st.session_state.pending_research = None
 
 # Streamlit interface
 def main():
@@ -237,21 +329,26 @@ def main():
         """, unsafe_allow_html=True)
     with col2:
         if st.button("🔄 Reset Chat", type="secondary"):
-            st.session_state.messages = []
-            st.session_state.conversation_history = []
+            # Stop whatever the session still has running before its state goes away
+            st.session_state.cancel_token.cancel("reset")
+            st.session_state.messages = MessageStore()
             st.session_state.mvp_phase = False
+            st.session_state.feature_prewarmer.cancel()
+            if st.session_state.pending_research is not None:
+                st.session_state.pending_research.cancel()
+                st.session_state.pending_research = None
+            st.session_state.feature_prewarm = None
+            st.session_state.feature_start = 0
+            reset_history_view()
             st.rerun()
     
-    # Display chat messages
-    for message in st.session_state.messages:
-        with st.chat_message(message["role"]):
-            st.markdown(message["content"])
+    # Display chat messages (recent window, long older messages collapsed; see chat_view.py)
+    render_history(st.session_state.messages)
     
     # Chat input
     if prompt := st.chat_input("Type your product idea here..."):
         # Add user message to chat history
         st.session_state.messages.append({"role": "user", "content": prompt})
-        st.session_state.conversation_history.append({"role": "user", "content": prompt})
         with st.chat_message("user"):
             st.markdown(prompt)
         
@@ -260,15 +357,27 @@ def main():
             with st.spinner("Alex is thinking..."):
                 try:
                     # Handle the conversation using asyncio.run()
-                    response = asyncio.run(Assistant_conversation(prompt, st.session_state.messages))
+                    draft_placeholder = st.empty()
+                    # Searches, writer and evaluator runs of this turn stop on Reset or when the tab closes
+                    token = st.session_state.cancel_token = CancelToken(f"chat turn {st.session_state.session_id[:8]}")
+                    response = asyncio.run(run_cancellable(
+                        Assistant_conversation(prompt, st.session_state.messages,
+                                               on_field=FeatureDraftRenderer(draft_placeholder)),
+                        token, watchdog=_session_watchdog(st.empty(), token)))
+                    draft_placeholder.empty()
                     st.markdown(response)
                     st.session_state.messages.append({"role": "assistant", "content": response})
-                    st.session_state.conversation_history.append({"role": "assistant", "content": response})
+                    memory, totals = st.session_state.messages.memory(), sessions_memory()
+                    print(f"💾 Session memory: {format_bytes(memory['bytes'])} for {memory['messages']} messages "
+                          f"({memory['raw_chars']:,} chars); {totals['sessions']} sessions hold "
+                          f"{format_bytes(totals['total_bytes'])}")
                 except Exception as e:
                     error_msg = f"Error: {str(e)}"
                     st.error(error_msg)
                     st.session_state.messages.append({"role": "assistant", "content": error_msg})
-                    st.session_state.conversation_history.append({"role": "assistant", "content": error_msg})
+
+    # The page is on screen; load the agent modules and prime the API connection in the background
+    warm_up()
 
 # Run the Streamlit app
 if __name__ == "__main__":
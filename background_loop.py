@@ -0,0 +1,24 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Coroutine, Optional
+
+# One long-lived event loop in a daemon thread. Work submitted here outlives the per-request
+# asyncio.run() loops the UIs use, and can still be cancelled through the returned Future.
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_lock = threading.Lock()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """ The shared background loop, started on first use """
+    global _loop
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="background-loop", daemon=True).start()
+        return _loop
+
+
+def submit(coro: Coroutine) -> Future:
+    """ Run a coroutine on the background loop; cancel() on the Future cancels the task """
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
@@ -0,0 +1,173 @@
+"""
+Cooperative cancellation of research and feature work.
+
+A CancelToken belongs to one user-facing request (a chat turn, a research run, an API stream).
+Work started for the request runs as tasks spawned through the token, so cancel() stops all of
+them, not only the task awaiting the result: asyncio.gather / as_completed leave their child
+tasks running when the awaiting task is cancelled, and those keep calling (and billing) models.
+Cancelled tasks unwind through their finally blocks, which gives back their admission slots and
+in-flight call counts.
+
+The token of the running request is in a context variable, so nested code (run_stage, the
+research tool called by the research agent) picks it up without it being passed down.
+
+Metrics (cancel_stats(), also in GET /metrics) count the work a cancellation stopped: tasks and
+model calls interrupted, pipeline stages and searches that never ran, and how long it took for
+everything to wind down.
+"""
+import asyncio
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Coroutine, Deque, Dict, Optional, Set
+
+CANCEL_TIMEOUT = 5.0        # seconds cancelled work gets to unwind before it is reported as stuck
+CANCEL_POLL_SECONDS = 0.5   # how often run_cancellable calls its watchdog
+
+
+class CancelToken:
+    """ Cancellation state of one request and the tasks running for it """
+
+    def __init__(self, name: str = ""):
+        self.name = name
+        self.reason: Optional[str] = None
+        self.cancelled_at: Optional[float] = None
+        self.tokens_spent = 0        # model tokens of the request's finished calls (run_stage)
+        self._tasks: Set[asyncio.Task] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.reason is not None
+
+    def raise_if_cancelled(self) -> None:
+        """ Checkpoint between stages: stop before starting more work """
+        if self.cancelled:
+            raise asyncio.CancelledError(f"{self.name or 'request'} cancelled ({self.reason})")
+
+    def spawn(self, coro: Coroutine) -> asyncio.Task:
+        """ create_task() for work of this request; the task runs with this token as the current one """
+        with use_token(self):
+            task = asyncio.get_running_loop().create_task(coro)
+        with self._lock:
+            self._tasks.add(task)
+        task.add_done_callback(self._untrack)
+        if self.cancelled:
+            task.cancel()
+        return task
+
+    def _untrack(self, task: asyncio.Task) -> None:
+        with self._lock:
+            self._tasks.discard(task)
+
+    def cancel(self, reason: str = "cancelled") -> int:
+        """ Cancel every running task of the request; safe to call from any thread. Returns the number cancelled """
+        with self._lock:
+            if self.cancelled:
+                return 0
+            self.reason = reason
+            self.cancelled_at = time.time()
+            tasks = [task for task in self._tasks if not task.done()]
+        for task in tasks:
+            task.get_loop().call_soon_threadsafe(task.cancel)
+        _stats["cancelled"][reason] += 1
+        _stats["tasks_cancelled"] += len(tasks)
+        _stats["tokens_spent"] += self.tokens_spent
+        print(f"🛑 Cancelled {self.name or 'request'} ({reason}): {len(tasks)} running tasks")
+        return len(tasks)
+
+    async def drain(self, timeout: float = CANCEL_TIMEOUT) -> int:
+        """ Wait for the cancelled tasks of this loop to finish; returns how many did not in time """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            tasks = [task for task in self._tasks if not task.done() and task.get_loop() is loop]
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=timeout)
+        else:
+            pending = set()
+        if self.cancelled_at is not None:
+            _stats["drain_seconds"].append(time.time() - self.cancelled_at)
+        _stats["stuck_tasks"] += len(pending)
+        return len(pending)
+
+
+_current_token: ContextVar[Optional[CancelToken]] = ContextVar("cancel_token", default=None)
+
+
+def current_token() -> Optional[CancelToken]:
+    return _current_token.get()
+
+
+@contextmanager
+def use_token(token: Optional[CancelToken]):
+    """ Make `token` the current one for code (and tasks created) inside the block """
+    reset = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset)
+
+
+def check_cancelled() -> None:
+    """ raise_if_cancelled() for the current request, if it has a token """
+    token = _current_token.get()
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+async def run_cancellable(coro: Coroutine, token: CancelToken, watchdog: Optional[Callable[[], None]] = None,
+                          poll: float = CANCEL_POLL_SECONDS) -> Any:
+    """
+    Run a request's coroutine under its token. watchdog() is called every `poll` seconds while it
+    runs and may raise to abandon the request (e.g. Streamlit stopping the script on a rerun);
+    any exit other than completion cancels the token and waits (bounded) for the work to stop.
+    """
+    task = token.spawn(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll if watchdog is not None else None)
+            if done:
+                return task.result()
+            watchdog()
+    except BaseException:
+        if not task.done():
+            token.cancel("abandoned")
+            await asyncio.shield(token.drain())
+        raise
+
+
+# ============================
+# Metrics
+# ============================
+_stats: Dict[str, Any] = {
+    "cancelled": defaultdict(int),     # by reason
+    "tasks_cancelled": 0,
+    "calls_interrupted": 0,            # model calls in flight when their request was cancelled
+    "stages_avoided": 0,               # pipeline stages that never started
+    "searches_avoided": 0,             # planned searches that never finished
+    "tokens_spent": 0,                 # charged before the cancellation landed
+    "stuck_tasks": 0,                  # still running CANCEL_TIMEOUT after cancel()
+    "drain_seconds": deque(maxlen=500),
+}
+
+
+def record_interrupted_call() -> None:
+    _stats["calls_interrupted"] += 1
+
+
+def record_avoided(stages: int = 0, searches: int = 0) -> None:
+    """ Work of a cancelled request that never happened """
+    _stats["stages_avoided"] += stages
+    _stats["searches_avoided"] += searches
+
+
+def cancel_stats() -> Dict[str, Any]:
+    drains: Deque[float] = _stats["drain_seconds"]
+    ordered = sorted(drains)
+    return {
+        **{key: value for key, value in _stats.items() if key not in ("cancelled", "drain_seconds")},
+        "cancelled": dict(_stats["cancelled"]),
+        "drain_p90_seconds": round(ordered[int(0.9 * (len(ordered) - 1))], 3) if ordered else None,
+    }
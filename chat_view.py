@@ -0,0 +1,138 @@
+"""
+Chat history rendering for the Streamlit app.
+
+Streamlit reruns the whole script on every interaction, so the history is rendered on every
+rerun. Only the last CHAT_WINDOW messages are drawn (older ones on demand), long messages
+outside the last turn show a cached preview until expanded, and the time spent drawing the
+history is recorded per rerun against the session length.
+
+    python chat_view.py     # rerun time vs session length, windowed vs full rendering
+"""
+import hashlib
+import os
+import time
+from typing import Dict, Sequence, Tuple
+
+import streamlit as st
+
+LONG_MESSAGE_CHARS = 1500   # messages longer than this are collapsed to a preview
+PREVIEW_CHARS = 600
+RECENT_EXPANDED = 2         # the last turn (user + assistant) is always shown in full
+RENDER_LOG_SIZE = 200
+
+
+def chat_window() -> int:
+    """ Messages drawn by default; 0 draws the whole history """
+    return int(os.environ.get("CHAT_WINDOW", "6"))
+
+
+def message_id(message: Dict) -> str:
+    """ Stable id of a message: its own id if it has one, otherwise a hash of role and content """
+    if message.get("id"):
+        return message["id"]
+    return hashlib.sha1(f"{message['role']}:{message['content']}".encode()).hexdigest()[:16]
+
+
+@st.cache_data(max_entries=1000, show_spinner=False)
+def message_preview(msg_id: str, _content: str) -> Tuple[str, bool]:
+    """ (preview markdown, truncated?) for a message; cached by id, the content itself is not hashed """
+    if len(_content) <= LONG_MESSAGE_CHARS:
+        return _content, False
+    preview, size = [], 0
+    for line in _content.splitlines():
+        if size + len(line) > PREVIEW_CHARS and preview:
+            break
+        preview.append(line)
+        size += len(line) + 1
+    text = "\n".join(preview)
+    # Don't leave a code block open in the preview
+    if text.count("```") % 2:
+        text += "\n```"
+    return text, True
+
+
+def _render_message(message: Dict, index: int, msg_id: str, collapse: bool) -> None:
+    # Identical messages (a report repeated by the research tool output) share msg_id, so widget
+    # keys and expansion state go by position; msg_id only keys the preview cache
+    key = f"{index}-{msg_id}"
+    with st.chat_message(message["role"]):
+        content = str(message["content"])
+        if not collapse or key in st.session_state.expanded_messages:
+            st.markdown(content)
+            return
+        preview, truncated = message_preview(msg_id, content)
+        st.markdown(preview)
+        if truncated:
+            words = len(content.split())
+            # The full text is only sent to the browser once asked for
+            if st.button(f"Show full message ({words:,} words)", key=f"expand-{key}"):
+                st.session_state.expanded_messages.add(key)
+                st.rerun()
+
+
+def render_history(messages: Sequence[Dict]) -> None:
+    """
+    Draw the chat history: a window of recent messages, long older ones collapsed.
+    `messages` is a list or a message_store.MessageStore; only the drawn messages are read.
+    """
+    start = time.perf_counter()
+    if "expanded_messages" not in st.session_state:
+        st.session_state.expanded_messages = set()
+    if "history_shown" not in st.session_state:
+        st.session_state.history_shown = chat_window()
+
+    shown = st.session_state.history_shown
+    first = max(0, len(messages) - shown) if shown else 0
+    if first:
+        if st.button(f"⬆️ Show {min(first, chat_window() or first)} earlier messages ({first} hidden)",
+                     key="show-earlier"):
+            st.session_state.history_shown = shown + (chat_window() or first)
+            st.rerun()
+
+    for index in range(first, len(messages)):
+        message = messages[index]
+        recent = index >= len(messages) - RECENT_EXPANDED
+        _render_message(message, index, message_id(message), collapse=shown != 0 and not recent)
+
+    record_render_time(len(messages), len(messages) - first, time.perf_counter() - start)
+
+
+def reset_history_view() -> None:
+    st.session_state.expanded_messages = set()
+    st.session_state.history_shown = chat_window()
+
+
+def record_render_time(num_messages: int, rendered: int, seconds: float) -> None:
+    log = st.session_state.setdefault("render_log", [])
+    log.append({"messages": num_messages, "rendered": rendered, "ms": seconds * 1000})
+    del log[:-RENDER_LOG_SIZE]
+
+
+if __name__ == "__main__":
+    # Rerun time of the app against session length, with AppTest (no browser)
+    from streamlit.testing.v1 import AppTest
+    from message_store import MessageStore
+
+    report = "# Product Feature Analysis\n\n" + "\n\n".join(
+        f"## Section {i}\n\n" + "The market for meeting assistants keeps growing. " * 40 for i in range(9))
+
+    def session(turns: int) -> MessageStore:
+        messages = MessageStore()
+        for i in range(turns):
+            messages.add("user", f"Question {i} about the product idea")
+            messages.add("assistant", f"Answer {i}\n\n{report}")
+        return messages
+
+    print(f"{'messages':>8} {'full rerun':>11} {'windowed rerun':>15}")
+    for turns in (5, 25, 100):
+        timings = {}
+        for label, window in (("full", "0"), ("windowed", "6")):
+            os.environ["CHAT_WINDOW"] = window
+            app = AppTest.from_file("app.py", default_timeout=60)
+            app.session_state["messages"] = session(turns)
+            app.run()
+            start = time.perf_counter()
+            for _ in range(3):
+                app.run()
+            timings[label] = (time.perf_counter() - start) / 3 * 1000
+        print(f"{turns * 2:>8} {timings['full']:>9.0f}ms {timings['windowed']:>13.0f}ms")
@@ -0,0 +1,131 @@
+"""
+Stage checkpoints for research runs.
+
+ProductAnalysisManager saves the output of every completed stage (search plan, each search
+result, the analyses, the report, the email marker) under a run id derived from the request and
+the tenant and session that sent it. Running the same request again after an interruption resumes
+after the last completed stage instead of repeating every paid call. A run that finishes deletes
+its checkpoints, so only unfinished runs are resumed. Checkpoints older than the TTL are
+garbage-collected.
+
+    python checkpoints.py            # list runs with checkpoints
+    python checkpoints.py --gc       # drop expired checkpoints
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+DEFAULT_CHECKPOINT_PATH = os.environ.get("CHECKPOINT_PATH", "research_checkpoints.db")
+DEFAULT_TTL = float(os.environ.get("CHECKPOINT_TTL_HOURS", "24")) * 3600
+GC_EVERY = 100   # saves between opportunistic garbage collections
+
+
+def make_run_id(*parts: Optional[str]) -> str:
+    """ Stable run id for a request, from its normalized inputs """
+    normalized = [" ".join(str(part).lower().split()) if part else "" for part in parts]
+    return hashlib.sha256(json.dumps(normalized).encode()).hexdigest()[:24]
+
+
+def stage_key(stage: str, detail: str = "") -> str:
+    """ Checkpoint name for a stage, optionally qualified by its input (e.g. one search query) """
+    if not detail:
+        return stage
+    return f"{stage}:{hashlib.sha256(' '.join(detail.lower().split()).encode()).hexdigest()[:16]}"
+
+
+class CheckpointStore:
+    """ Stage outputs keyed by (run id, stage) in a local SQLite file, safe to share between processes """
+
+    def __init__(self, path: str = DEFAULT_CHECKPOINT_PATH, ttl: float = DEFAULT_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._saves = 0
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS checkpoints (
+                    run_id TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (run_id, stage)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_checkpoints_created ON checkpoints (created_at)")
+        self.gc()
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread; sqlite3 connections must not cross threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def save(self, run_id: str, stage: str, data: str) -> None:
+        self._connect().execute(
+            "INSERT OR REPLACE INTO checkpoints (run_id, stage, data, created_at) VALUES (?, ?, ?, ?)",
+            (run_id, stage, data, time.time()),
+        )
+        self._saves += 1
+        if self._saves % GC_EVERY == 0:
+            self.gc()
+
+    def load(self, run_id: str, stage: str) -> Optional[str]:
+        row = self._connect().execute(
+            "SELECT data FROM checkpoints WHERE run_id = ? AND stage = ? AND created_at >= ?",
+            (run_id, stage, time.time() - self.ttl),
+        ).fetchone()
+        return row["data"] if row else None
+
+    def stages(self, run_id: str) -> List[str]:
+        """ Unexpired checkpointed stages of a run, oldest first """
+        rows = self._connect().execute(
+            "SELECT stage FROM checkpoints WHERE run_id = ? AND created_at >= ? ORDER BY created_at",
+            (run_id, time.time() - self.ttl)).fetchall()
+        return [row["stage"] for row in rows]
+
+    def delete_run(self, run_id: str) -> int:
+        return self._connect().execute("DELETE FROM checkpoints WHERE run_id = ?", (run_id,)).rowcount
+
+    def gc(self, max_age: Optional[float] = None) -> int:
+        """ Delete checkpoints older than max_age seconds (the TTL by default) """
+        cutoff = time.time() - (self.ttl if max_age is None else max_age)
+        removed = self._connect().execute("DELETE FROM checkpoints WHERE created_at < ?", (cutoff,)).rowcount
+        if removed:
+            print(f"Removed {removed} expired checkpoints")
+        return removed
+
+    def runs(self) -> Dict[str, Dict]:
+        rows = self._connect().execute(
+            "SELECT run_id, COUNT(*) AS stages, MIN(created_at) AS started, MAX(created_at) AS updated "
+            "FROM checkpoints GROUP BY run_id ORDER BY updated DESC").fetchall()
+        return {row["run_id"]: {"stages": row["stages"], "started": row["started"], "updated": row["updated"]}
+                for row in rows}
+
+
+_checkpoint_store: Optional[CheckpointStore] = None
+
+
+def checkpoint_store() -> CheckpointStore:
+    """ Shared store for this process """
+    global _checkpoint_store
+    if _checkpoint_store is None:
+        _checkpoint_store = CheckpointStore()
+    return _checkpoint_store
+
+
+if __name__ == "__main__":
+    store = checkpoint_store()
+    if "--gc" in sys.argv:
+        print(f"Removed {store.gc()} checkpoints")
+    for run_id, info in store.runs().items():
+        age = (time.time() - info["updated"]) / 60
+        print(f"{run_id}  {info['stages']:>3} stages  last update {age:.0f} min ago")
@@ -4,6 +4,8 @@ from research_manager import ProductAnalysisManager
 from feature_agent import feature_dialogue
 from agents import Agent, Runner, function_tool
 from agents.tracing import trace
+from model_router import stage_model, run_stage
+from prompt_registry import RESEARCH_AGENT_INSTRUCTIONS
 import asyncio
 
 load_dotenv(override=True)
@@ -31,37 +33,9 @@ async def research_report(query: str) -> str:
 # ============================
 research_agent = Agent(
     name="Alex_ResearchManager",
-    instructions="""
-You are Alex, a senior Product Manager specializing in research and initial product assessment.
-
-YOUR ROLE:
-- Greet users and understand their product ideas
-- Assess if research is needed and conduct it when appropriate
-- Handoff to MVP development when research is complete
-
-CONVERSATION FLOW:
-1. GREETING: Welcome users and ask about their product ideas
-2. RESEARCH ASSESSMENT: Determine if research is needed
-   - If user wants research: Use research_report tool to conduct comprehensive market research
-   - If user provides research: Accept and summarize their research
-   - If no research needed: Proceed directly to handoff
-3. HANDOFF: When research is complete, ask "Are you ready to proceed to feature development?" and wait for user confirmation before saying "Ready for MVP development"
-
-TOOL USAGE:
-- research_report: Use when user wants market research or when you determine research is needed
-
-CONVERSATION STYLE:
-- Be conversational, professional, and context-aware
-- Focus on research phase only
-- When research is complete, clearly indicate readiness for MVP development
-- Don't handle MVP questions - handoff to MVP agent
-
-HANDOFF CRITERIA:
-- Research is complete (either automatic or user-provided)
-- User explicitly confirms they are ready for feature development
-- Only after user confirmation, say "Ready for MVP development" to trigger handoff
-""",
-    tools=[research_report]
+    instructions=RESEARCH_AGENT_INSTRUCTIONS,
+    tools=[research_report],
+    model=stage_model("research_agent")
 )
 
 async def Assistant_conversation(message: str, history):
@@ -96,7 +70,8 @@ async def Assistant_conversation(message: str, history):
             context_message = _build_context_message(message)
             
             with trace("Research_Agent_Call"):
-                result = await Runner.run(
+                result = await run_stage(
+                    "research_agent",
                     research_agent,
                     context_message
                 )
@@ -0,0 +1,441 @@
+"""
+Local document index: BM25 over a directory of internal documents (PRDs, support tickets, past reports).
+
+Documents are split into passages of about PASSAGE_WORDS words. The index is a list of immutable
+segments. Each segment is a set of .npy arrays opened with mmap: a sorted table of term hashes with
+their postings offsets, the postings (passage id, term frequency), passage lengths and files, and
+the passage text in one file. Opening an index reads only its manifest, whatever its size. A query
+touches only the postings of its own terms.
+
+build() is incremental. New and changed files go into a new segment, and the passages of changed
+or deleted files are masked out of the old ones. Document frequencies still count masked passages
+until the next compaction, as in Lucene. compact() rewrites the live passages into one segment, and
+build() does so on its own beyond MAX_SEGMENTS.
+
+    python doc_index.py build docs/              # index (or update the index of) a directory
+    python doc_index.py query "churn alerts"     # best passages with their BM25 scores
+    python doc_index.py bench                    # build / open / query timings on a synthetic corpus
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import shutil
+import threading
+import time
+from array import array
+from collections import Counter
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from extractive_summarizer import tokenize
+
+DEFAULT_INDEX_PATH = os.environ.get("DOC_INDEX_PATH", "doc_index")
+DOC_EXTENSIONS = (".md", ".txt", ".rst", ".csv", ".json", ".html", ".htm")
+PASSAGE_WORDS = 200
+SEGMENT_PASSAGES = 50_000   # passages per segment written by a build; bounds the memory a build needs
+MAX_SEGMENTS = 8
+BM25_K1 = 1.2
+BM25_B = 0.75
+MANIFEST = "manifest.json"
+
+
+def _terms(text: str) -> List[str]:
+    # tokenize() drops stopwords; plural "s" is folded so "tickets" matches "ticket"
+    return [token[:-1] if len(token) > 4 and token.endswith("s") and not token.endswith("ss") else token
+            for token in tokenize(text)]
+
+
+def term_hash(term: str) -> int:
+    return int.from_bytes(hashlib.blake2b(term.encode(), digest_size=8).digest(), "little")
+
+
+def read_document(path: str) -> Tuple[str, str]:
+    """ (title, text) of a file; HTML is reduced to its main content """
+    with open(path, encoding="utf-8", errors="replace") as f:
+        text = f.read()
+    if path.lower().endswith((".html", ".htm")):
+        from local_search import extract_main_content
+        title, text = extract_main_content(text)
+        if title:
+            return title[:120], text
+    first = next((line.strip("# \t") for line in text.splitlines() if line.strip()), "")
+    return (first[:120] or os.path.basename(path)), text
+
+
+def split_passages(text: str, words: int = PASSAGE_WORDS) -> List[str]:
+    tokens = text.split()
+    return [" ".join(tokens[i:i + words]) for i in range(0, len(tokens), words)]
+
+
+class DocHit(NamedTuple):
+    path: str
+    title: str
+    passage: int        # index of the passage within its file
+    text: str
+    score: float
+
+
+# ============================
+# Segments
+# ============================
+def _write_segment(path: str, passages: List[Tuple[int, int, str]]) -> Tuple[Dict, np.ndarray]:
+    """ Write (file id, passage number, text) passages as a segment directory; returns its manifest entry and passage lengths """
+    os.makedirs(path)
+    hashes, docs, tfs = array("Q"), array("I"), array("H")
+    lengths, files, numbers, text_offsets = array("I"), array("I"), array("I"), array("q", [0])
+    vocabulary: Dict[str, int] = {}
+    with open(os.path.join(path, "text.bin"), "wb") as text_file:
+        for doc, (file_id, number, text) in enumerate(passages):
+            terms = _terms(text)
+            for term, count in Counter(terms).items():
+                if term not in vocabulary:
+                    vocabulary[term] = term_hash(term)
+                hashes.append(vocabulary[term])
+                docs.append(doc)
+                tfs.append(min(count, 65535))
+            lengths.append(len(terms))
+            files.append(file_id)
+            numbers.append(number)
+            data = text.encode()
+            text_file.write(data)
+            text_offsets.append(text_offsets[-1] + len(data))
+
+    hashes, docs, tfs = np.frombuffer(hashes, np.uint64), np.frombuffer(docs, np.uint32), np.frombuffer(tfs, np.uint16)
+    order = np.lexsort((docs, hashes))
+    hashes = hashes[order]
+    terms, starts = np.unique(hashes, return_index=True)
+    arrays = {
+        "terms": terms,
+        "offsets": np.append(starts, len(hashes)).astype(np.int64),
+        "post_doc": docs[order],
+        "post_tf": tfs[order],
+        "doc_len": np.frombuffer(lengths, np.uint32),
+        "doc_file": np.frombuffer(files, np.uint32),
+        "doc_number": np.frombuffer(numbers, np.uint32),
+        "text_offset": np.frombuffer(text_offsets, np.int64),
+    }
+    for name, values in arrays.items():
+        np.save(os.path.join(path, f"{name}.npy"), values)
+    meta = {"name": os.path.basename(path), "passages": len(passages), "live_passages": len(passages),
+            "live_length": int(arrays["doc_len"].sum()), "deleted": []}
+    return meta, arrays["doc_len"]
+
+
+class _Segment:
+    """ Read-only, memory-mapped view of a segment directory """
+
+    def __init__(self, path: str, meta: Dict):
+        self.meta = meta
+        for name in ("terms", "offsets", "post_doc", "post_tf", "doc_len", "doc_file", "doc_number", "text_offset"):
+            setattr(self, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r"))
+        text_path = os.path.join(path, "text.bin")
+        self.text = np.memmap(text_path, dtype=np.uint8, mode="r") if os.path.getsize(text_path) else None
+        self.deleted = np.array(sorted(meta["deleted"]), dtype=np.uint32)
+
+    def postings(self, hashed: int) -> Tuple[int, int]:
+        i = int(np.searchsorted(self.terms, np.uint64(hashed)))
+        if i < len(self.terms) and int(self.terms[i]) == hashed:
+            return int(self.offsets[i]), int(self.offsets[i + 1])
+        return 0, 0
+
+    def passage_text(self, doc: int) -> str:
+        start, end = int(self.text_offset[doc]), int(self.text_offset[doc + 1])
+        return bytes(self.text[start:end]).decode(errors="replace") if self.text is not None else ""
+
+
+# ============================
+# Index
+# ============================
+class DocumentIndex:
+    """ Segmented BM25 index in a directory; other processes see updates on their next query """
+
+    def __init__(self, path: str = DEFAULT_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._manifest_mtime = None
+        self._load()
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.path, MANIFEST)
+
+    def _load(self) -> None:
+        manifest_path = self._manifest_path()
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            self._manifest_mtime = os.path.getmtime(manifest_path)
+        else:
+            manifest = {"segments": [], "files": {}, "next_file_id": 0, "next_segment": 0}
+        self.manifest = manifest
+        self.segments = [_Segment(os.path.join(self.path, meta["name"]), meta) for meta in manifest["segments"]]
+        self._files_by_id = {entry["id"]: (path, entry["title"]) for path, entry in manifest["files"].items()}
+
+    def _refresh(self) -> None:
+        manifest_path = self._manifest_path()
+        if os.path.exists(manifest_path) and os.path.getmtime(manifest_path) != self._manifest_mtime:
+            self._load()
+
+    def _save(self) -> None:
+        tmp = self._manifest_path() + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp, self._manifest_path())
+        self._load()
+
+    # ----------------------------
+    # Building
+    # ----------------------------
+    def _remove_file(self, path: str) -> None:
+        """ Mask the file's passages in every segment it spans """
+        entry = self.manifest["files"].pop(path)
+        spans = entry.get("spans")
+        if spans is None:
+            # Manifests written before files could span segments
+            spans = [{"segment": entry["segment"], "passages": entry["passages"], "length": entry["length"]}]
+        segments = {meta["name"]: meta for meta in self.manifest["segments"]}
+        for span in spans:
+            meta = segments.get(span["segment"])
+            if meta is None:
+                continue
+            meta["deleted"].append(entry["id"])
+            meta["live_passages"] -= span["passages"]
+            meta["live_length"] -= span["length"]
+
+    def _write_segments(self, passages: Iterator[Tuple[int, int, str]]) -> None:
+        batch: List[Tuple[int, int, str]] = []
+
+        def flush():
+            name = f"seg_{self.manifest['next_segment']:05d}"
+            self.manifest["next_segment"] += 1
+            meta, lengths = _write_segment(os.path.join(self.path, name), batch)
+            self.manifest["segments"].append(meta)
+            self._record_files(name, batch, lengths)
+
+        for passage in passages:
+            batch.append(passage)
+            if len(batch) >= SEGMENT_PASSAGES:
+                flush()
+                batch = []
+        if batch:
+            flush()
+
+    def _record_files(self, name: str, batch: List[Tuple[int, int, str]], lengths: np.ndarray) -> None:
+        """
+        Add the passage range each file of a written batch has in its segment to the file's spans.
+        A file cut by a SEGMENT_PASSAGES boundary gets one span in each segment.
+        """
+        by_id = {entry["id"]: entry for entry in self.manifest["files"].values()}
+        for doc, ((file_id, _, _), length) in enumerate(zip(batch, lengths.tolist())):
+            spans = by_id[file_id]["spans"]
+            if not spans or spans[-1]["segment"] != name:
+                spans.append({"segment": name, "first": doc, "passages": 0, "length": 0})
+            spans[-1]["passages"] += 1
+            spans[-1]["length"] += length
+
+    def build(self, directory: str) -> Dict[str, int]:
+        """ Index new and changed files under `directory` and drop deleted ones; returns the counts """
+        with self._lock:
+            self._refresh()
+            os.makedirs(self.path, exist_ok=True)
+            root = os.path.abspath(directory)
+            found = {}
+            for folder, _, names in os.walk(root):
+                for name in names:
+                    if name.lower().endswith(DOC_EXTENSIONS):
+                        path = os.path.join(folder, name)
+                        stat = os.stat(path)
+                        found[path] = (stat.st_mtime, stat.st_size)
+            indexed = {path for path in self.manifest["files"] if path.startswith(root + os.sep)}
+            removed = [path for path in indexed if path not in found]
+            changed = [path for path in indexed & found.keys()
+                       if (self.manifest["files"][path]["mtime"], self.manifest["files"][path]["size"]) != found[path]]
+            added = [path for path in found if path not in indexed]
+            for path in removed + changed:
+                self._remove_file(path)
+
+            def passages() -> Iterator[Tuple[int, int, str]]:
+                for path in sorted(changed + added):
+                    try:
+                        title, text = read_document(path)
+                    except OSError as e:
+                        print(f"Could not index {path}: {e}")
+                        continue
+                    file_id = self.manifest["next_file_id"]
+                    self.manifest["next_file_id"] += 1
+                    self.manifest["files"][path] = {"id": file_id, "title": title, "mtime": found[path][0],
+                                                    "size": found[path][1], "spans": []}
+                    for number, passage in enumerate(split_passages(text)):
+                        yield file_id, number, passage
+
+            self._write_segments(passages())
+            # Files without any text never get a segment
+            for path in [path for path, entry in self.manifest["files"].items() if entry.get("spans") == []]:
+                del self.manifest["files"][path]
+            self._save()
+            if len(self.segments) > MAX_SEGMENTS:
+                self._compact()
+        return {"added": len(added), "updated": len(changed), "removed": len(removed)}
+
+    def compact(self) -> None:
+        with self._lock:
+            self._refresh()
+            self._compact()
+
+    def _compact(self) -> None:
+        """ Rewrite the live passages of all segments into new segments and drop the old ones """
+        old = self.segments
+
+        def live_passages() -> Iterator[Tuple[int, int, str]]:
+            for segment in old:
+                deleted = set(segment.deleted.tolist())
+                for doc in range(segment.meta["passages"]):
+                    file_id = int(segment.doc_file[doc])
+                    if file_id not in deleted:
+                        yield file_id, int(segment.doc_number[doc]), segment.passage_text(doc)
+
+        self.manifest["segments"] = []
+        for entry in self.manifest["files"].values():
+            for key in ("segment", "passages", "length"):
+                entry.pop(key, None)
+            entry["spans"] = []
+        self._write_segments(live_passages())
+        self._save()
+        for segment in old:
+            shutil.rmtree(os.path.join(self.path, segment.meta["name"]), ignore_errors=True)
+        print(f"Compacted document index into {len(self.segments)} segments")
+
+    # ----------------------------
+    # Search
+    # ----------------------------
+    def search(self, query: str, k: int = 5) -> List[DocHit]:
+        """ The k passages with the best BM25 score for `query` """
+        self._refresh()
+        segments = self.segments
+        passages = sum(segment.meta["live_passages"] for segment in segments)
+        if not passages:
+            return []
+        average_length = max(1.0, sum(segment.meta["live_length"] for segment in segments) / passages)
+        hashes = [term_hash(term) for term in set(_terms(query))]
+        spans = [[segment.postings(h) for h in hashes] for segment in segments]
+        document_frequency = [sum(segment_spans[i][1] - segment_spans[i][0] for segment_spans in spans)
+                              for i in range(len(hashes))]
+        # Masked passages are still in the postings, so idf counts them too (like df)
+        indexed = sum(segment.meta["passages"] for segment in segments)
+        idf = [math.log(1 + (indexed - df + 0.5) / (df + 0.5)) for df in document_frequency]
+
+        candidates: List[Tuple[float, int, int]] = []
+        for s, segment in enumerate(segments):
+            docs, scores = [], []
+            for i, (start, end) in enumerate(spans[s]):
+                if start == end:
+                    continue
+                doc = np.asarray(segment.post_doc[start:end])
+                tf = np.asarray(segment.post_tf[start:end], dtype=np.float32)
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * np.asarray(segment.doc_len[doc], dtype=np.float32) / average_length)
+                docs.append(doc)
+                scores.append(idf[i] * tf * (BM25_K1 + 1) / (tf + norm))
+            if not docs:
+                continue
+            doc, score = np.concatenate(docs), np.concatenate(scores)
+            order = np.argsort(doc, kind="stable")
+            doc, score = doc[order], score[order]
+            unique, starts = np.unique(doc, return_index=True)
+            total = np.add.reduceat(score, starts)
+            if len(segment.deleted):
+                live = ~np.isin(np.asarray(segment.doc_file[unique]), segment.deleted)
+                unique, total = unique[live], total[live]
+            top = np.argpartition(-total, min(k, len(total)) - 1)[:k] if len(total) > k else np.arange(len(total))
+            candidates += [(float(total[i]), s, int(unique[i])) for i in top]
+
+        hits = []
+        for score, s, doc in sorted(candidates, reverse=True)[:k]:
+            segment = segments[s]
+            path, title = self._files_by_id.get(int(segment.doc_file[doc]), ("", ""))
+            hits.append(DocHit(path, title, int(segment.doc_number[doc]), segment.passage_text(doc), round(score, 3)))
+        return hits
+
+    def stats(self) -> Dict:
+        segments = self.manifest["segments"]
+        size = sum(os.path.getsize(os.path.join(folder, name))
+                   for folder, _, names in os.walk(self.path) for name in names) if os.path.isdir(self.path) else 0
+        return {"files": len(self.manifest["files"]), "segments": len(segments),
+                "passages": sum(meta["live_passages"] for meta in segments), "bytes": size}
+
+
+_index: Optional[DocumentIndex] = None
+
+
+def document_index() -> DocumentIndex:
+    """ Shared index for this process """
+    global _index
+    if _index is None:
+        _index = DocumentIndex()
+    return _index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local BM25 document index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build_parser = sub.add_parser("build", help="Index or update a directory of documents")
+    build_parser.add_argument("directory")
+    query_parser = sub.add_parser("query", help="Best passages for a query")
+    query_parser.add_argument("text")
+    query_parser.add_argument("-k", type=int, default=5)
+    sub.add_parser("compact", help="Merge all segments into one")
+    bench_parser = sub.add_parser("bench", help="Timings on a synthetic corpus")
+    bench_parser.add_argument("--files", type=int, default=2000)
+    bench_parser.add_argument("--words", type=int, default=1500, help="Words per file")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start = time.perf_counter()
+        counts = DocumentIndex().build(args.directory)
+        print(f"{counts} in {time.perf_counter() - start:.1f}s; index: {DocumentIndex().stats()}")
+    elif args.command == "query":
+        start = time.perf_counter()
+        hits = DocumentIndex().search(args.text, k=args.k)
+        print(f"{len(hits)} hits in {(time.perf_counter() - start) * 1000:.1f}ms")
+        for hit in hits:
+            print(f"{hit.score:7.3f}  {hit.path} #{hit.passage}  {hit.title}\n         {hit.text[:160]}")
+    elif args.command == "compact":
+        DocumentIndex().compact()
+    else:
+        import random
+        import tempfile
+
+        rng = random.Random(0)
+        # Zipf-like vocabulary, so postings lengths look like real text
+        vocabulary = [f"term{i}" for i in range(20_000)]
+        weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+        corpus, index_path = tempfile.mkdtemp(), tempfile.mkdtemp()
+        for i in range(args.files):
+            with open(os.path.join(corpus, f"doc{i:05d}.txt"), "w") as f:
+                f.write(f"Document {i}\n" + " ".join(rng.choices(vocabulary, weights, k=args.words)))
+        megabytes = sum(os.path.getsize(os.path.join(corpus, name)) for name in os.listdir(corpus)) / 1e6
+
+        start = time.perf_counter()
+        DocumentIndex(index_path).build(corpus)
+        build_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        index = DocumentIndex(index_path)
+        open_ms = (time.perf_counter() - start) * 1000
+        queries = [" ".join(rng.choices(vocabulary[50:5000], k=3)) for _ in range(200)]
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            index.search(query)
+            latencies.append((time.perf_counter() - start) * 1000)
+        latencies.sort()
+        with open(os.path.join(corpus, "doc00000.txt"), "a") as f:
+            f.write(" updated")
+        start = time.perf_counter()
+        counts = index.build(corpus)
+        update_ms = (time.perf_counter() - start) * 1000
+        print(f"corpus: {args.files} files, {megabytes:.0f} MB; index: {index.stats()}")
+        print(f"build {build_seconds:.1f}s, open {open_ms:.1f}ms, query p50 {latencies[len(latencies) // 2]:.1f}ms "
+              f"p95 {latencies[int(0.95 * (len(latencies) - 1))]:.1f}ms, incremental update {counts} {update_ms:.0f}ms")
+        shutil.rmtree(corpus)
+        shutil.rmtree(index_path)
@@ -1,6 +1,7 @@
 import os
 from typing import Dict
 from agents import Agent, function_tool
+from model_router import stage_model
 
 # Handle optional sendgrid dependency
 try:
@@ -39,5 +40,5 @@ email_agent = Agent(
     name="Email agent",
     instructions=INSTRUCTIONS,
     tools=[send_email],
-    model="gpt-4o-mini",
+    model=stage_model("email"),
 )
@@ -0,0 +1,150 @@
+"""
+Query-focused extractive summarizer.
+
+Scores sentences with TF-IDF + TextRank (personalized toward the search query), drops
+near-duplicates and returns a 2-3 paragraph summary under the same 300-word bound the
+search agent works to. Runs in milliseconds with NumPy only.
+"""
+import math
+import re
+from collections import Counter
+from typing import List
+
+import numpy as np
+
+MAX_WORDS = 300
+MAX_PARAGRAPHS = 3
+MIN_SENTENCE_WORDS = 6
+MAX_SENTENCE_WORDS = 60
+REDUNDANCY_THRESHOLD = 0.6   # cosine similarity above which a sentence counts as a repeat
+DAMPING = 0.85
+QUERY_WEIGHT = 0.7           # how strongly the TextRank walk restarts toward query-relevant sentences
+
+STOPWORDS = set("""
+a about above after again against all am an and any are as at be because been before being below between
+both but by can could did do does doing down during each few for from further had has have having he her
+here hers herself him himself his how i if in into is it its itself just me more most my myself no nor not
+now of off on once only or other our ours ourselves out over own same she should so some such than that the
+their theirs them themselves then there these they this those through to too under until up very was we were
+what when where which while who whom why will with would you your yours yourself yourselves also may might
+""".split())
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(])|\n+")
+_TOKEN = re.compile(r"[a-z0-9][a-z0-9\-]+")
+
+
+def split_sentences(text: str) -> List[str]:
+    """ Split text into cleaned sentences of a useful length """
+    sentences = []
+    for raw in _SENTENCE_SPLIT.split(text):
+        sentence = " ".join(raw.split())
+        words = len(sentence.split())
+        if MIN_SENTENCE_WORDS <= words <= MAX_SENTENCE_WORDS:
+            sentences.append(sentence)
+    return sentences
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def tfidf_matrix(documents: List[List[str]], vocabulary: dict) -> np.ndarray:
+    """ L2-normalized TF-IDF rows, one per tokenized document """
+    matrix = np.zeros((len(documents), len(vocabulary)), dtype=np.float32)
+    doc_freq = Counter(term for doc in documents for term in set(doc))
+    num_docs = len(documents)
+    for row, doc in enumerate(documents):
+        for term, count in Counter(doc).items():
+            column = vocabulary.get(term)
+            if column is not None:
+                idf = math.log((1 + num_docs) / (1 + doc_freq.get(term, 0))) + 1
+                matrix[row, column] = (1 + math.log(count)) * idf
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def textrank_scores(similarity: np.ndarray, personalization: np.ndarray, iterations: int = 50) -> np.ndarray:
+    """ PageRank over the sentence similarity graph, restarting toward `personalization` """
+    graph = similarity.copy()
+    np.fill_diagonal(graph, 0.0)
+    out_weight = graph.sum(axis=1, keepdims=True)
+    out_weight[out_weight == 0] = 1.0
+    transition = graph / out_weight
+    scores = np.full(len(graph), 1.0 / len(graph), dtype=np.float32)
+    for _ in range(iterations):
+        updated = (1 - DAMPING) * personalization + DAMPING * transition.T @ scores
+        if np.abs(updated - scores).sum() < 1e-6:
+            return updated
+        scores = updated
+    return scores
+
+
+def summarize(query: str, texts: List[str], max_words: int = MAX_WORDS) -> str:
+    """
+    Query-focused extractive summary of `texts`.
+    Returns an empty string when there is nothing worth summarizing.
+    """
+    sentences = []
+    for text in texts:
+        sentences.extend(split_sentences(text))
+    # Exact duplicates are common across scraped pages (boilerplate, syndicated copy)
+    sentences = list(dict.fromkeys(sentences))
+    if not sentences:
+        return ""
+
+    tokenized = [tokenize(sentence) for sentence in sentences]
+    query_tokens = tokenize(query)
+    vocabulary = {term: i for i, term in enumerate(sorted({t for doc in tokenized + [query_tokens] for t in doc}))}
+    if not vocabulary:
+        return ""
+
+    vectors = tfidf_matrix(tokenized + [query_tokens], vocabulary)
+    sentence_vectors, query_vector = vectors[:-1], vectors[-1]
+    similarity = sentence_vectors @ sentence_vectors.T
+
+    relevance = sentence_vectors @ query_vector
+    uniform = np.full(len(sentences), 1.0 / len(sentences), dtype=np.float32)
+    if relevance.sum() > 0:
+        personalization = QUERY_WEIGHT * relevance / relevance.sum() + (1 - QUERY_WEIGHT) * uniform
+    else:
+        personalization = uniform
+    scores = textrank_scores(similarity, personalization)
+
+    # Greedy pick by score, skipping sentences too close to one already chosen
+    chosen: List[int] = []
+    words = 0
+    for index in np.argsort(-scores):
+        length = len(sentences[index].split())
+        if words + length > max_words:
+            continue
+        if chosen and similarity[index, chosen].max() > REDUNDANCY_THRESHOLD:
+            continue
+        chosen.append(int(index))
+        words += length
+
+    # Keep source order so the summary reads naturally, then group into paragraphs
+    chosen.sort()
+    per_paragraph = max(1, math.ceil(len(chosen) / MAX_PARAGRAPHS))
+    paragraphs = [
+        " ".join(sentences[i] for i in chosen[start:start + per_paragraph])
+        for start in range(0, len(chosen), per_paragraph)
+    ]
+    return "\n\n".join(paragraphs)
+
+
+if __name__ == "__main__":
+    import time
+
+    sample = [
+        "The AI meeting assistant market grew 35% in 2024. Otter.ai and Fireflies lead in transcription. "
+        "Pricing usually starts at $10 per user per month for small teams. "
+        "Enterprise buyers ask for SOC 2 compliance and data residency controls before adopting meeting tools.",
+        "Fireflies offers automatic meeting summaries and CRM sync for sales teams. "
+        "Otter.ai focuses on live transcription and collaboration features for education and business users. "
+        "The AI meeting assistant market grew 35% in 2024 according to analysts.",
+    ] * 20
+    start = time.perf_counter()
+    summary = summarize("AI meeting summarizer market competitors pricing", sample)
+    print(summary)
+    print(f"\n{len(summary.split())} words in {(time.perf_counter() - start) * 1000:.1f}ms")
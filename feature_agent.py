@@ -1,7 +1,16 @@
+import asyncio
+import os
 from pydantic import BaseModel, Field
 from agents import Agent, Runner, function_tool
-from typing import List
+from agents.tool_context import ToolContext
+from typing import Callable, Dict, List, Optional
+from contextvars import ContextVar
 from agents.tracing import trace
+from model_router import stage_model, run_stage
+from partial_json import FieldEvent, StreamingJSONParser, stream_text_deltas
+from prompt_registry import render, format_history
+from structured_repair import TolerantOutputSchema
+from cancellation import CancelToken, current_token, run_cancellable
 
 # ----------------------------
 # Schema for final Feature output
@@ -21,29 +30,39 @@ class FeatureEvaluation(BaseModel):
     decision: str = Field(description="Either 'Go ahead' or 'Needs improvement'")
     feedback: List[str] = Field(description="List of actionable suggestions to improve the feature definition")
 
-# ============================
-# Feature Creation Specialist Agent
-# ============================
-feature_creator_agent = Agent(
-    name="Agent_Feature",
-    instructions="""
+# ----------------------------
+# Progressive rendering of tool outputs
+# ----------------------------
+class _FieldStream:
+    """ Per-request listener plus one parser per nested tool call """
 
-            You are a senior product manager producing engineering-ready FeatureDefinitions.
-            Your job is to refine, normalize, and complete user input to produce a fully scoped feature ready for engineers, QA, and design.
+    def __init__(self, listener: Callable[[str, FieldEvent], None]):
+        self.listener = listener
+        self.parsers: Dict[str, StreamingJSONParser] = {}
 
-            INPUTS:
-            - Conversation history and research context
-            - User clarifications (if any)
-            - Evaluator feedback (if present)
 
-            MANDATORY OUTPUTS (FeatureDefinition object):
-            - feature_name: concise, descriptive
-            - target_users: concrete personas with customer pain points addressed
-            - core_features: 5–7 scoped capabilities; tag 1–3 as MVP and explain why; each feature should follow the structured template below
-            - competition: list competitors + 1–2 lines differentiation
-            - acceptance_criteria: ≥3 QA-testable criteria with measurable thresholds
-            - success_metrics: ≥3 KPIs with numeric targets and measurement method
+_field_stream: ContextVar[Optional[_FieldStream]] = ContextVar("feature_field_stream", default=None)
+
 
+def _stream_tool_fields(stream_event) -> None:
+    """ on_stream hook for the creator/evaluator tools: parse their JSON output as it is generated """
+    field_stream = _field_stream.get()
+    if field_stream is None:
+        return
+    delta = stream_text_deltas(stream_event["event"])
+    if not delta:
+        return
+    tool_call = stream_event["tool_call"]
+    call_id = tool_call.call_id if tool_call else stream_event["agent"].name
+    parser = field_stream.parsers.setdefault(call_id, StreamingJSONParser())
+    for field in parser.feed(delta):
+        field_stream.listener(stream_event["agent"].name, field)
+
+# ============================
+# Feature Creation Specialist Agent
+# ============================
+# Shared by the single creator call and the core-feature writer of the outline-first creator
+CORE_FEATURE_TEMPLATE = """
             CORE FEATURES TEMPLATE:
             Each core feature must follow this exact structure:
 
@@ -139,7 +158,28 @@ feature_creator_agent = Agent(
             ✅ GOOD (Product Requirement): "Smart Seasonal Pattern Recognition: The system automatically learns when metrics typically spike or drop due to business cycles (like Black Friday traffic), but users can also manually specify known events like maintenance windows or seasonal campaigns. This prevents false alarms during expected business changes while catching real problems."
 
             CRITICAL: Write for users, not engineers. Focus on what the feature DOES for the user, not what components it's MADE OF.
+"""
 
+feature_creator_agent = Agent(
+    name="Agent_Feature",
+    instructions=f"""
+
+            You are a senior product manager producing engineering-ready FeatureDefinitions.
+            Your job is to refine, normalize, and complete user input to produce a fully scoped feature ready for engineers, QA, and design.
+
+            INPUTS:
+            - Conversation history and research context
+            - User clarifications (if any)
+            - Evaluator feedback (if present)
+
+            MANDATORY OUTPUTS (FeatureDefinition object):
+            - feature_name: concise, descriptive
+            - target_users: concrete personas with customer pain points addressed
+            - core_features: 5–7 scoped capabilities; tag 1–3 as MVP and explain why; each feature should follow the structured template below
+            - competition: list competitors + 1–2 lines differentiation
+            - acceptance_criteria: ≥3 QA-testable criteria with measurable thresholds
+            - success_metrics: ≥3 KPIs with numeric targets and measurement method
+{CORE_FEATURE_TEMPLATE}
             REFINEMENTS:
             - Add NFRs: latency, throughput, retention, scale (or inferred)
             - Add Dependencies & Assumptions: external systems, APIs, hardware, services (mark inferred)
@@ -155,15 +195,179 @@ feature_creator_agent = Agent(
             - Acceptance criteria must be QA-testable without interpretation
             - Keep language clear, direct, and scoped        
         """,
-    output_type=FeatureDefinition
+    output_type=TolerantOutputSchema(FeatureDefinition),
+    model=stage_model("feature_creator")
+)
+
+# ============================
+# Outline-first feature creation
+# ============================
+class CoreFeatureOutline(BaseModel):
+    title: str = Field(description="User-centric name of the core feature")
+    mvp: bool = Field(description="Whether the core feature is in the MVP scope")
+    scope: str = Field(description="One line: the user problem it solves and why it is or is not in the MVP")
+
+
+class FeatureOutline(BaseModel):
+    feature_name: str = Field(description="Creative, descriptive name for the feature")
+    target_users: List[str] = Field(description="Specific user segments and personas and their pain points addressed")
+    core_features: List[CoreFeatureOutline] = Field(description="5-7 core features in priority order")
+    competition: List[str] = Field(description="Competitive landscape and differentiation")
+    acceptance_criteria: List[str] = Field(description="Completion and validation criteria")
+    success_metrics: List[str] = Field(description="Measurable success criteria and KPIs")
+
+
+feature_outline_agent = Agent(
+    name="Agent_FeatureOutline",
+    instructions="""
+            You are a senior product manager outlining an engineering-ready FeatureDefinition.
+            Separate writers turn each core feature of your outline into its full template at the same time,
+            so the outline fixes everything they share: the feature, its users and the split into core features.
+
+            INPUTS:
+            - Conversation history and research context
+            - User clarifications (if any)
+            - Evaluator feedback (if present)
+
+            MANDATORY OUTPUTS (FeatureOutline object):
+            - feature_name: concise, descriptive
+            - target_users: concrete personas with customer pain points addressed
+            - core_features: 5–7 scoped capabilities, each with a user-centric title, an MVP tag (1–3 of them MVP)
+              and one line on the user problem it solves and why it is or is not in the MVP. Do not write the template.
+            - competition: list competitors + 1–2 lines differentiation
+            - acceptance_criteria: ≥3 QA-testable criteria with measurable thresholds
+            - success_metrics: ≥3 KPIs with numeric targets and measurement method
+
+            SCOPE:
+            - Core features must not overlap; each covers a distinct part of the user workflow
+            - Name features for what they do for the user, not for the components they are made of
+            - Apply evaluator feedback on scope, MVP split, competition, criteria and metrics
+
+            QUALITY RULES:
+            - Avoid vague terms; use measurable conditions
+            - Acceptance criteria must be QA-testable without interpretation
+            - Keep language clear, direct, and scoped
+        """,
+    output_type=TolerantOutputSchema(FeatureOutline),
+    model=stage_model("feature_outline")
 )
 
-# Convert specialist agent to tool
-feature_creator_tool = feature_creator_agent.as_tool(
-    tool_name="create_feature_definition",
-    tool_description="Creates comprehensive feature definitions from complete conversation and research context"
+core_feature_agent = Agent(
+    name="Agent_CoreFeature",
+    instructions=f"""
+            You are a senior product manager writing one core feature of a FeatureDefinition.
+            You are given the conversation and research context, the outline of the whole feature and the core
+            feature to write. The other core features are written separately: stay within your feature's scope.
+            Apply evaluator feedback on core features and their template sections.
+            Keep the outline's MVP tag in the heading, e.g. "# Predictive Alert Creation (MVP)".
+{CORE_FEATURE_TEMPLATE}
+            Return only the markdown of the core feature.
+        """,
+    model=stage_model("core_feature")
 )
 
+# Creator tool: "outline" (default) writes the outline, then every core feature concurrently;
+# "single" generates the whole FeatureDefinition in one call
+FEATURE_CREATOR_MODE = os.environ.get("FEATURE_CREATOR_MODE", "outline")
+
+
+def _emit_field(path: tuple, value) -> None:
+    """ Report an assembled field to the request's on_field listener, as if the creator had streamed it """
+    field_stream = _field_stream.get()
+    if field_stream is not None:
+        field_stream.listener(feature_creator_agent.name, FieldEvent(path, value))
+
+
+def _format_outline(outline: FeatureOutline) -> str:
+    users = "".join(f"- {user}\n" for user in outline.target_users)
+    features = "".join(f"{i + 1}. {feature.title} ({'MVP' if feature.mvp else 'Phase 2'}): {feature.scope}\n"
+                       for i, feature in enumerate(outline.core_features))
+    return f"Feature: {outline.feature_name}\nTarget users:\n{users}Core features:\n{features}"
+
+
+def _tag_heading(body: str, feature: CoreFeatureOutline) -> str:
+    """ The core feature with a heading carrying the outline's MVP tag """
+    body = body.strip()
+    if not body.startswith("#"):
+        body = f"# {feature.title}\n{body}"
+    heading, _, rest = body.partition("\n")
+    if "MVP" not in heading and "Phase 2" not in heading:
+        heading = f"{heading.rstrip()} ({'MVP' if feature.mvp else 'Phase 2'})"
+    return f"{heading}\n{rest}"
+
+
+async def write_core_feature(context: str, outline: FeatureOutline, index: int, run_config=None) -> str:
+    """ Write one core feature of the outline in the full template """
+    feature = outline.core_features[index]
+    result = await run_stage(
+        "core_feature",
+        core_feature_agent,
+        render("feature.core", context=context, outline=_format_outline(outline), number=index + 1,
+               title=feature.title),
+        run_config=run_config,
+    )
+    body = _tag_heading(str(result.final_output), feature)
+    _emit_field(("core_features", index), body)
+    return body
+
+
+async def create_feature_in_parallel(context: str, run_config=None) -> FeatureDefinition:
+    """ Outline call, then every core feature written concurrently and assembled into a FeatureDefinition """
+    result = await run_stage("feature_outline", feature_outline_agent, context, run_config=run_config)
+    outline = result.final_output_as(FeatureOutline)
+    # The draft shows the outline while the core features are written; each one replaces its placeholder
+    _emit_field(("feature_name",), outline.feature_name)
+    _emit_field(("target_users",), outline.target_users)
+    for index, feature in enumerate(outline.core_features):
+        tag = "MVP" if feature.mvp else "Phase 2"
+        _emit_field(("core_features", index), f"# {feature.title} ({tag})\n_{feature.scope}_")
+    for name in ("competition", "acceptance_criteria", "success_metrics"):
+        _emit_field((name,), getattr(outline, name))
+
+    print(f"Writing {len(outline.core_features)} core features in parallel...")
+    # Spawned through the request's token, so a reset or disconnect stops them too
+    token = current_token()
+    spawn = token.spawn if token is not None else asyncio.ensure_future
+    tasks = [spawn(write_core_feature(context, outline, index, run_config)) for index in range(len(outline.core_features))]
+    try:
+        core_features = await asyncio.gather(*tasks)
+    finally:
+        # Stops the other core features if one of them failed
+        for task in tasks:
+            task.cancel()
+    return FeatureDefinition(feature_name=outline.feature_name, target_users=outline.target_users,
+                             core_features=list(core_features), competition=outline.competition,
+                             acceptance_criteria=outline.acceptance_criteria, success_metrics=outline.success_metrics)
+
+
+async def create_feature(context: str, run_config=None) -> FeatureDefinition:
+    """ The outline-first creator, falling back to the single creator call if it fails """
+    try:
+        return await create_feature_in_parallel(context, run_config=run_config)
+    except Exception as e:
+        print(f"Parallel feature creation failed, falling back to single creator: {e}")
+    result = await run_stage("feature_creator", feature_creator_agent, context, run_config=run_config,
+                             on_field=lambda field: _emit_field(field.path, field.value))
+    return result.final_output_as(FeatureDefinition)
+
+
+@function_tool(name_override="create_feature_definition",
+               description_override="Creates comprehensive feature definitions from complete conversation and research context")
+async def create_feature_definition(ctx: ToolContext, input: str) -> FeatureDefinition:
+    """ create_feature() as the conversation agent's creator tool """
+    return await create_feature(input, run_config=ctx.run_config)
+
+
+if FEATURE_CREATOR_MODE == "outline":
+    feature_creator_tool = create_feature_definition
+else:
+    # Convert specialist agent to tool
+    feature_creator_tool = feature_creator_agent.as_tool(
+        tool_name="create_feature_definition",
+        tool_description="Creates comprehensive feature definitions from complete conversation and research context",
+        on_stream=_stream_tool_fields
+    )
+
 feature_evaluator_agent = Agent(
     name="Agent_FeatureEvaluator",
     instructions="""
@@ -237,12 +441,14 @@ feature_evaluator_agent = Agent(
             - "core_features: Split 'Topology overlay' into 'IP overlay (MVP)' and 'Per-link historical charts (Phase 2)'."
             - "Q: Confirm telemetry retention (30 vs 90 days) — needed to size storage and rollups."
             """,
-    output_type=FeatureEvaluation
+    output_type=TolerantOutputSchema(FeatureEvaluation, optional=["feedback"]),
+    model=stage_model("feature_evaluator")
 )
 
 feature_evaluator_tool = feature_evaluator_agent.as_tool(
     tool_name="evaluate_feature_definition",
-    tool_description="Evaluates feature definitions for completeness, clarity, and engineering-readiness"
+    tool_description="Evaluates feature definitions for completeness, clarity, and engineering-readiness",
+    on_stream=_stream_tool_fields
 )
 # ============================
 # Main Feature Conversation Agent
@@ -296,33 +502,55 @@ SYSTEM_PROMPT = """
 feature_conversation_agent = Agent(
     name="Agent_ManageFeatureConversation",
     instructions=SYSTEM_PROMPT,
-    tools=[feature_creator_tool, feature_evaluator_tool]  # Use both tools
+    tools=[feature_creator_tool, feature_evaluator_tool],  # Use both tools
+    model=stage_model("feature_conversation")
 )
 
 # ============================
 # Feature Controller
 # ============================
 
-async def handle_feature_request(user_text: str, conversation_history: list = []) -> str:
+# Create/evaluate cycles are capped by the prompt; this caps the conversation agent's model calls
+FEATURE_MAX_TURNS = 6
+
+async def handle_feature_request(user_text: str, conversation_history: list = [],
+                                 on_field: Optional[Callable[[str, FieldEvent], None]] = None,
+                                 prewarm=None, run_config=None, cancel_token: Optional[CancelToken] = None) -> str:
     """
     Controller for feature creation with conversation history.
+    on_field(agent_name, field) is called for each FeatureDefinition / FeatureEvaluation field
+    as soon as it has been generated, so UIs can render drafts progressively.
+    prewarm is a feature_prewarm.FeaturePrewarm: its research digest (and draft, if any) replaces
+    the research part of the history, so pass only the messages since the handoff.
+    run_config is passed to the run (and inherited by the creator/evaluator tools), e.g. to
+    swap in the offline model of feature_bench.py.
+    cancel_token: the request's CancelToken; cancelling it stops the turn, including the nested
+    creator/evaluator runs. Defaults to the token of the request this runs under.
     Returns: response_text
     """
+    if cancel_token is not None and cancel_token is not current_token():
+        return await run_cancellable(handle_feature_request(user_text, conversation_history, on_field, prewarm,
+                                                            run_config), cancel_token)
+    token = _field_stream.set(_FieldStream(on_field) if on_field else None)
     try:
         # Build context message with conversation history
+        history = format_history(conversation_history)
+        if prewarm is not None:
+            history = f"{prewarm.digest}\n\n" + (
+                f"Starting draft FeatureDefinition: {prewarm.draft.model_dump_json()}\n\n" if prewarm.draft else ""
+            ) + history
         context_message = user_text
-        if conversation_history:
-            context_message = "Complete Conversation History:\n"
-            for msg in conversation_history:
-                context_message += f"{msg['role']}: {msg['content']}\n"
-            context_message += f"\nCurrent user message: {user_text}"
+        if history:
+            context_message = render("conversation.feature", history=history, message=user_text)
         
         # Use conversation agent with both tools for complete feature development
         with trace("Feature_Conversation_Agent"):
-            result = await Runner.run(
+            result = await run_stage(
+                "feature_conversation",
                 feature_conversation_agent,
                 context_message,
-                max_turns=6  # Allow 3 iterations of create+evaluate (2 turns each)
+                max_turns=FEATURE_MAX_TURNS,  # Allow 3 iterations of create+evaluate (2 turns each)
+                run_config=run_config
             )
         
         return result.final_output
@@ -331,6 +559,8 @@ async def handle_feature_request(user_text: str, conversation_history: list = []
         error_msg = f"Error processing feature request: {str(e)}"
         print(error_msg)
         return error_msg
+    finally:
+        _field_stream.reset(token)
 # ============================
 # Integration wrapper (removed - use handle_feature_request directly)
 # ============================
@@ -0,0 +1,568 @@
+"""
+Convergence and cost benchmark for the feature creator/evaluator loop.
+
+Runs handle_feature_request on every case of feature_bench_corpus.json (a message plus the
+conversation history before it) and reports per case: conversation-agent turns, creator/evaluator
+tool calls, tokens, model latency, wall time, model time until the first draft, whether max_turns
+was hit, and a local rubric score of the final FeatureDefinition. Each run is appended to
+feature_bench_results.jsonl and compared with the previous run of the same model mode, so prompt
+or loop changes that cost more turns or tokens, or lower the score, show up as regressions.
+
+Models (nothing else about the loop is replaced; the agents, tools and run_stage are the real ones):
+    scripted   offline stand-in (default). The evaluator applies the local rubric; the creator's first
+               draft misses what its context doesn't support and fixes up to 2 cited issues per cycle.
+               The outline and core-feature calls of the outline-first creator script the same drafts
+    record     live models, every response saved to a cassette
+    replay     a recorded cassette, offline; needs the same prompts and corpus as the recording
+
+    python feature_bench.py                          # scripted
+    python feature_bench.py --record bench.cassette.json
+    python feature_bench.py --replay bench.cassette.json --check    # exit 1 on regression
+"""
+import argparse
+import ast
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from agents import Model, ModelProvider, ModelResponse, RunConfig, Usage
+from openai.types.responses import (Response, ResponseCompletedEvent, ResponseFunctionToolCall, ResponseOutputItem,
+                                    ResponseOutputMessage, ResponseOutputText)
+from pydantic import TypeAdapter, ValidationError
+
+from feature_agent import (FEATURE_CREATOR_MODE, FEATURE_MAX_TURNS, SYSTEM_PROMPT, CoreFeatureOutline,
+                           FeatureDefinition, FeatureEvaluation, FeatureOutline, core_feature_agent,
+                           feature_creator_agent, feature_evaluator_agent, feature_outline_agent,
+                           handle_feature_request)
+from tracing_setup import configure_tracing
+
+CORPUS_PATH = "feature_bench_corpus.json"
+RESULTS_PATH = os.environ.get("FEATURE_BENCH_RESULTS", "feature_bench_results.jsonl")
+
+# Regression thresholds against the previous run
+TOKEN_REGRESSION = 0.10     # share of extra tokens
+SCORE_REGRESSION = 5.0      # rubric points
+
+AGENT_ROLES = {
+    SYSTEM_PROMPT: "conversation",
+    feature_creator_agent.instructions: "creator",
+    feature_evaluator_agent.instructions: "evaluator",
+    feature_outline_agent.instructions: "outline",
+    core_feature_agent.instructions: "core",
+}
+
+# ============================
+# Local rubric
+# ============================
+TEMPLATE_SECTIONS = ["## User Flow", "## Technical Scope", "## Acceptance Criteria", "## Workflow Inspiration",
+                     "## Success Metric"]
+RUBRIC_CHECKS = 7
+
+
+def rubric(definition: FeatureDefinition) -> List[Tuple[str, str]]:
+    """ Failed checks as (field, feedback), highest impact first; the creator prompt's mandatory outputs """
+    failures = []
+    core = definition.core_features
+    if not definition.target_users:
+        failures.append(("target_users", "name at least one persona and the pain point addressed"))
+    if not 5 <= len(core) <= 7:
+        failures.append(("core_features", f"give 5-7 scoped capabilities (has {len(core)})"))
+    missing = [section for section in TEMPLATE_SECTIONS if any(section not in feature for feature in core)]
+    if not core or missing:
+        failures.append(("core_features_template", "add the missing template sections: " + ", ".join(missing)))
+    # The template's "Technical Scope (MVP)" heading doesn't count as a tag
+    if not 1 <= sum("MVP" in feature.replace("Technical Scope (MVP)", "") for feature in core) <= 3:
+        failures.append(("mvp_scope", "tag 1-3 core features as MVP"))
+    if not definition.competition or all("TBD" in entry for entry in definition.competition):
+        failures.append(("competition", "name the competitors and the differentiation"))
+    for field in ("acceptance_criteria", "success_metrics"):
+        values = getattr(definition, field)
+        if len(values) < 3 or not all(re.search(r"\d", value) for value in values):
+            failures.append((field, "give at least 3 entries, each with a numeric threshold"))
+    return failures
+
+
+def rubric_score(definition: FeatureDefinition) -> float:
+    return round(100 * (RUBRIC_CHECKS - len(rubric(definition))) / RUBRIC_CHECKS, 1)
+
+
+def parse_output(model, text: str):
+    """
+    A structured output as it appears in the conversation: JSON from a model, or the pydantic repr
+    (field='...' field=[...]) that agent tools return. None if it isn't one.
+    """
+    try:
+        return model.model_validate_json(text[text.find("{"):text.rfind("}") + 1])
+    except ValidationError:
+        pass
+    fields = list(model.model_fields)
+    starts = [text.find(f"{fields[0]}=")]
+    for field in fields[1:]:
+        starts.append(text.find(f" {field}=", starts[-1]) + 1 if starts[-1] >= 0 else -1)
+    if min(starts) < 0:
+        return None
+    values = {}
+    for field, start, end in zip(fields, starts, starts[1:] + [len(text)]):
+        try:
+            values[field] = ast.literal_eval(text[start + len(field) + 1:end].strip())
+        except (ValueError, SyntaxError):
+            return None
+    try:
+        return model.model_validate(values)
+    except ValidationError:
+        return None
+
+
+# ============================
+# Models
+# ============================
+class CallRecord(NamedTuple):
+    role: str               # conversation / creator / evaluator / outline / core
+    input_tokens: int
+    output_tokens: int
+    seconds: float          # model latency: measured (live), recorded (replay) or modelled (scripted)
+    tool_calls: List[str]
+    text: str
+    drafts: List[str]       # create_feature_definition results in the call's input
+
+
+def _jsonable(value: Any) -> Any:
+    if hasattr(value, "model_dump"):
+        return value.model_dump(exclude_none=True)
+    if isinstance(value, list):
+        return [_jsonable(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _jsonable(item) for key, item in value.items()}
+    return value
+
+
+def _tool_outputs(items: List[Dict]) -> List[Tuple[Optional[str], str]]:
+    """ (tool name, output) of the tool results in a conversation input, in order """
+    names, outputs = {}, []
+    for item in items:
+        if item.get("type") == "function_call":
+            names[item["call_id"]] = item["name"]
+        elif item.get("type") == "function_call_output":
+            outputs.append((names.get(item["call_id"]), str(item["output"])))
+    return outputs
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _message(text: str) -> ResponseOutputMessage:
+    return ResponseOutputMessage(id="msg_bench", type="message", role="assistant", status="completed",
+                                 content=[ResponseOutputText(type="output_text", text=text, annotations=[])])
+
+
+def _function_call(name: str, tool_input: str, call_id: str) -> ResponseFunctionToolCall:
+    return ResponseFunctionToolCall(id=f"fc_{call_id}", call_id=call_id, name=name, type="function_call",
+                                    arguments=json.dumps({"input": tool_input}), status="completed")
+
+
+class BenchModel(Model):
+    """ Records every call; streamed calls (the nested creator/evaluator tools) get one completed event """
+
+    def __init__(self, calls: List[CallRecord]):
+        self.calls = calls
+
+    async def respond(self, system_instructions, input, **call) -> Tuple[List[Any], Usage, float]:
+        raise NotImplementedError
+
+    async def get_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs,
+                           tracing, **kwargs) -> ModelResponse:
+        output, usage, seconds = await self.respond(
+            system_instructions, input, model_settings=model_settings, tools=tools, output_schema=output_schema,
+            handoffs=handoffs, tracing=tracing, **kwargs)
+        text = "".join(part.text for item in output if item.type == "message"
+                       for part in item.content if part.type == "output_text")
+        items = _jsonable(input) if isinstance(input, list) else []
+        drafts = [result for name, result in _tool_outputs(items) if name == "create_feature_definition"]
+        self.calls.append(CallRecord(AGENT_ROLES.get(system_instructions, "other"), usage.input_tokens,
+                                     usage.output_tokens, seconds,
+                                     [item.name for item in output if item.type == "function_call"], text, drafts))
+        return ModelResponse(output=output, usage=usage, response_id=None)
+
+    async def stream_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs,
+                              tracing, **kwargs):
+        response = await self.get_response(system_instructions, input, model_settings, tools, output_schema,
+                                           handoffs, tracing, **kwargs)
+        # Usage is left out of the event: the tokens are already in self.calls
+        yield ResponseCompletedEvent(type="response.completed", sequence_number=0, response=Response(
+            id="resp_bench", object="response", created_at=time.time(), model="bench", output=response.output,
+            parallel_tool_calls=False, tool_choice="auto", tools=[]))
+
+
+class ScriptedModel(BenchModel):
+    """
+    Offline stand-in following the conversation prompt: questions on a first turn without history,
+    otherwise create -> evaluate until "Go ahead" or MAX_CYCLES drafts, then present the result.
+    """
+    MAX_CYCLES = 3              # first draft + the 2 refinement cycles the prompt allows
+    FIXES_PER_CYCLE = 2
+    SECONDS_BASE = 0.4          # modelled latency: fixed overhead + output tokens at TOKENS_PER_SECOND
+    TOKENS_PER_SECOND = 60
+
+    async def respond(self, system_instructions, input, **call):
+        role = AGENT_ROLES.get(system_instructions, "other")
+        items = _jsonable(input) if isinstance(input, list) else [{"role": "user", "content": input}]
+        context = next((item["content"] for item in items if item.get("role") == "user"), "")
+        if not isinstance(context, str):
+            context = " ".join(part.get("text", "") for part in context)
+        if role == "creator":
+            output = [_message(self._draft(context).model_dump_json())]
+        elif role == "outline":
+            output = [_message(self._outline(context).model_dump_json())]
+        elif role == "core":
+            tool_input, assignment = context.split("\n\nFeature outline:\n", 1)
+            number = int(re.search(r"Write core feature (\d+):", assignment).group(1))
+            output = [_message(self._draft(tool_input).core_features[number - 1])]
+        elif role == "evaluator":
+            output = [_message(self._evaluate(context).model_dump_json())]
+        else:
+            output = [self._conversation_step(context, items)]
+        text = json.dumps([_jsonable(item) for item in output])
+        usage = Usage(requests=1, input_tokens=_estimate_tokens((system_instructions or "") + json.dumps(items)),
+                      output_tokens=_estimate_tokens(text))
+        usage.total_tokens = usage.input_tokens + usage.output_tokens
+        return output, usage, self.SECONDS_BASE + usage.output_tokens / self.TOKENS_PER_SECOND
+
+    def _conversation_step(self, context: str, items: List[Dict]):
+        outputs = _tool_outputs(items)
+        drafts = [output for name, output in outputs if name == "create_feature_definition"]
+        evaluations = [output for name, output in outputs if name == "evaluate_feature_definition"]
+        call_id = "call_" + hashlib.sha1(f"{context}:{len(outputs)}".encode()).hexdigest()[:12]
+
+        if not outputs and "Complete Conversation History:" not in context:
+            return _message("Q1: Which users feel this problem most?\nQ2: What do they do today instead?\n"
+                            "Q3: What outcome would make this a success for them?")
+        if len(evaluations) < len(drafts):
+            return _function_call("evaluate_feature_definition", f"Evaluate this FeatureDefinition:\n{drafts[-1]}",
+                                  call_id)
+        last = parse_output(FeatureEvaluation, evaluations[-1]) if evaluations else None
+        if not drafts or (last is not None and last.decision != "Go ahead" and len(drafts) < self.MAX_CYCLES):
+            rounds = "".join(f"\n\nEvaluator feedback, round {i + 1}:\n" + "\n".join(
+                f"- {line}" for line in (parse_output(FeatureEvaluation, evaluation) or FeatureEvaluation(
+                    decision="Needs improvement", feedback=[])).feedback)
+                for i, evaluation in enumerate(evaluations))
+            return _function_call("create_feature_definition", context + rounds, call_id)
+        return _message(f"Here is the final feature definition:\n\n{drafts[-1]}")
+
+    def _draft(self, tool_input: str) -> FeatureDefinition:
+        context, *rounds = tool_input.split("\n\nEvaluator feedback, round ")
+        fixed = set()
+        for feedback in rounds:
+            cited = re.findall(r"^- (\w+):", feedback, flags=re.MULTILINE)
+            fixed.update(cited[:self.FIXES_PER_CYCLE])
+        gaps = [gap for gap in self._initial_gaps(context) if gap not in fixed]
+        topic = re.search(r"Research (?:an? )?([^\n.]+)", context)
+        topic = topic.group(1).strip() if topic else "the requested feature"
+
+        def core_feature(i: int) -> str:
+            return (f"# {topic.capitalize()}: capability {i + 1}{' (MVP)' if i < 2 else ' (Phase 2)'}\n"
+                    f"Lets the target users handle step {i + 1} of their workflow without manual work.\n\n"
+                    "## User Flow\n1. User opens the feature\n2. User configures it\n3. System shows the result\n\n"
+                    "## Technical Scope (MVP)\n- p95 latency under 2 seconds\n- Audit log of every action\n\n"
+                    "## Acceptance Criteria\n- ✅ Setup completes within 2 minutes\n\n"
+                    + ("" if "core_features_template" in gaps else
+                       "## Workflow Inspiration (Reference)\n- Comparable product from the research\n\n")
+                    + "## Success Metric\n- 30% less time spent on the task")
+
+        numeric = "acceptance_criteria" not in gaps
+        return FeatureDefinition(
+            feature_name=topic.title(),
+            target_users=[f"Primary users of {topic} who lose hours to manual work"],
+            core_features=[core_feature(i) for i in range(3 if "core_features" in gaps else 5)],
+            competition=["TBD"] if "competition" in gaps else ["Incumbents named in the research; differentiate on "
+                                                               "explanations and setup time"],
+            acceptance_criteria=[f"Criterion {i + 1} holds for 95% of requests within {i + 2} seconds" if numeric
+                                 else f"Criterion {i + 1} works reliably" for i in range(3)],
+            success_metrics=[f"Metric {i + 1} improves by {10 * (i + 1)}% within 90 days"
+                             if "success_metrics" not in gaps else f"Metric {i + 1} improves" for i in range(3)],
+        )
+
+    def _outline(self, tool_input: str) -> FeatureOutline:
+        """ The outline of the draft _draft() would write in one call """
+        draft = self._draft(tool_input)
+        core_features = []
+        for feature in draft.core_features:
+            heading, scope = feature.split("\n")[:2]
+            title = heading.lstrip("# ").replace(" (MVP)", "").replace(" (Phase 2)", "")
+            core_features.append(CoreFeatureOutline(title=title, mvp="(MVP)" in heading, scope=scope))
+        return FeatureOutline(**draft.model_dump(exclude={"core_features"}), core_features=core_features)
+
+    @staticmethod
+    def _initial_gaps(context: str) -> List[str]:
+        """ What the first draft gets wrong, from what its context supports """
+        gaps = ["core_features_template"]    # first drafts always drop a template section
+        if len(context.split()) < 120:
+            gaps.append("core_features")
+        if not re.search(r"\d", context):
+            gaps += ["acceptance_criteria", "success_metrics"]
+        if "compet" not in context.lower():
+            gaps.append("competition")
+        return gaps
+
+    def _evaluate(self, tool_input: str) -> FeatureEvaluation:
+        definition = parse_output(FeatureDefinition, tool_input)
+        if definition is None:
+            return FeatureEvaluation(decision="Needs improvement", feedback=["feature_name: return a FeatureDefinition"])
+        failures = rubric(definition)
+        if not failures:
+            return FeatureEvaluation(decision="Go ahead", feedback=[])
+        return FeatureEvaluation(decision="Needs improvement", feedback=[f"{field}: {text}" for field, text in failures])
+
+
+def _cassette_key(system_instructions: Optional[str], input: Any, output_schema: Any) -> str:
+    schema = output_schema.name() if output_schema is not None else ""
+    payload = json.dumps([system_instructions, _jsonable(input), schema], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+class RecordingModel(BenchModel):
+    """ Live model whose responses are saved to the cassette """
+
+    def __init__(self, calls: List[CallRecord], inner: Model, cassette: Dict[str, Dict]):
+        super().__init__(calls)
+        self.inner = inner
+        self.cassette = cassette
+
+    async def respond(self, system_instructions, input, **call):
+        start = time.perf_counter()
+        response = await self.inner.get_response(system_instructions, input, call.pop("model_settings"),
+                                                 call.pop("tools"), call["output_schema"], call.pop("handoffs"),
+                                                 call.pop("tracing"), **{k: v for k, v in call.items()
+                                                                          if k != "output_schema"})
+        seconds = time.perf_counter() - start
+        self.cassette[_cassette_key(system_instructions, input, call["output_schema"])] = {
+            "output": [item.model_dump(exclude_none=True) for item in response.output],
+            "input_tokens": response.usage.input_tokens, "output_tokens": response.usage.output_tokens,
+            "seconds": seconds,
+        }
+        return response.output, response.usage, seconds
+
+
+class ReplayModel(BenchModel):
+    """ Serves recorded responses; a call missing from the cassette means the prompts or loop changed """
+    _items = TypeAdapter(ResponseOutputItem)
+
+    def __init__(self, calls: List[CallRecord], cassette: Dict[str, Dict]):
+        super().__init__(calls)
+        self.cassette = cassette
+
+    async def respond(self, system_instructions, input, **call):
+        key = _cassette_key(system_instructions, input, call["output_schema"])
+        if key not in self.cassette:
+            raise KeyError(f"No recorded response for this {AGENT_ROLES.get(system_instructions, 'other')} call; "
+                           "re-record the cassette")
+        entry = self.cassette[key]
+        usage = Usage(requests=1, input_tokens=entry["input_tokens"], output_tokens=entry["output_tokens"],
+                      total_tokens=entry["input_tokens"] + entry["output_tokens"])
+        return [self._items.validate_python(item) for item in entry["output"]], usage, entry["seconds"]
+
+
+class BenchProvider(ModelProvider):
+    """ Resolves every model name to the benchmark model of the chosen mode """
+
+    def __init__(self, mode: str = "scripted", cassette_path: Optional[str] = None):
+        self.mode = mode
+        self.cassette_path = cassette_path
+        self.cassette: Dict[str, Dict] = {}
+        if mode == "replay":
+            with open(cassette_path) as f:
+                self.cassette = json.load(f)
+        self.calls: List[CallRecord] = []
+        self._live = None
+
+    def get_model(self, model_name: Optional[str]) -> Model:
+        if self.mode == "scripted":
+            return ScriptedModel(self.calls)
+        if self.mode == "replay":
+            return ReplayModel(self.calls, self.cassette)
+        if self._live is None:
+            from agents.models.openai_provider import OpenAIProvider
+            self._live = OpenAIProvider()
+        return RecordingModel(self.calls, self._live.get_model(model_name), self.cassette)
+
+    def save(self) -> None:
+        if self.mode == "record":
+            with open(self.cassette_path, "w") as f:
+                json.dump(self.cassette, f)
+
+
+# ============================
+# Harness
+# ============================
+def loop_version() -> str:
+    """ Fingerprint of the loop under test: the prompts, the creator mode and the turn limit """
+    payload = "\n".join([SYSTEM_PROMPT, feature_creator_agent.instructions, feature_evaluator_agent.instructions,
+                         feature_outline_agent.instructions, core_feature_agent.instructions, FEATURE_CREATOR_MODE,
+                         str(FEATURE_MAX_TURNS)])
+    return hashlib.sha1(payload.encode()).hexdigest()[:12]
+
+
+def first_draft_seconds(calls: List[CallRecord]) -> Optional[float]:
+    """ Model time until the first draft: the creator call, or the outline call plus its slowest core feature """
+    for i, call in enumerate(calls):
+        if call.role == "creator":
+            return round(call.seconds, 2)
+        if call.role == "outline":
+            core = []
+            for later in calls[i + 1:]:
+                if later.role != "core":
+                    break
+                core.append(later.seconds)
+            return round(call.seconds + max(core, default=0.0), 2)
+    return None
+
+
+async def run_case(case: Dict, provider: BenchProvider) -> Dict:
+    provider.calls.clear()
+    start = time.perf_counter()
+    response = await handle_feature_request(case["message"], case.get("history", []),
+                                            run_config=RunConfig(model_provider=provider, tracing_disabled=True))
+    wall = time.perf_counter() - start
+    calls = list(provider.calls)
+    conversation = [call for call in calls if call.role == "conversation"]
+    # The last draft the conversation agent got; the outline-first creator assembles it outside any model call
+    drafts = [call.drafts for call in conversation if call.drafts]
+    drafts = drafts[-1] if drafts else [call.text for call in calls if call.role == "creator"]
+    score = None
+    if drafts:
+        definition = parse_output(FeatureDefinition, drafts[-1])
+        score = rubric_score(definition) if definition is not None else 0.0
+    return {
+        "id": case["id"],
+        "turns": len(conversation),
+        "tool_calls": sum(len(call.tool_calls) for call in conversation),
+        "creator_calls": sum(call.tool_calls.count("create_feature_definition") for call in conversation),
+        "evaluator_calls": sum(1 for call in calls if call.role == "evaluator"),
+        "tokens": sum(call.input_tokens + call.output_tokens for call in calls),
+        "model_seconds": round(sum(call.seconds for call in calls), 2),
+        "first_draft_seconds": first_draft_seconds(calls),
+        "wall_seconds": round(wall, 3),
+        "hit_max_turns": "max turns" in str(response).lower(),
+        "error": str(response) if str(response).startswith("Error processing") else None,
+        "score": score,
+    }
+
+
+def load_previous(mode: str, path: str = RESULTS_PATH) -> Optional[Dict]:
+    if not os.path.exists(path):
+        return None
+    previous = None
+    with open(path) as f:
+        for line in f:
+            record = json.loads(line)
+            if record["mode"] == mode:
+                previous = record
+    return previous
+
+
+def regressions(current: Dict, previous: Dict) -> List[str]:
+    """ Cases that got slower to converge, more expensive or worse than in the previous run """
+    before = {row["id"]: row for row in previous["cases"]}
+    found = []
+    for row in current["cases"]:
+        old = before.get(row["id"])
+        if old is None:
+            continue
+        if row["turns"] > old["turns"]:
+            found.append(f"{row['id']}: turns {old['turns']} -> {row['turns']}")
+        if row["tool_calls"] > old["tool_calls"]:
+            found.append(f"{row['id']}: tool calls {old['tool_calls']} -> {row['tool_calls']}")
+        if row["tokens"] > old["tokens"] * (1 + TOKEN_REGRESSION):
+            found.append(f"{row['id']}: tokens {old['tokens']:,} -> {row['tokens']:,}")
+        if row["hit_max_turns"] and not old["hit_max_turns"]:
+            found.append(f"{row['id']}: now hits max_turns={FEATURE_MAX_TURNS}")
+        if old["score"] is not None and (row["score"] or 0) < old["score"] - SCORE_REGRESSION:
+            found.append(f"{row['id']}: score {old['score']} -> {row['score']}")
+    return found
+
+
+def print_report(record: Dict) -> None:
+    print(f"{'case':<30} {'turns':>5} {'tools':>5} {'c/e':>5} {'tokens':>8} {'model s':>8} {'draft s':>8} "
+          f"{'wall s':>7} {'max':>4} {'score':>6}")
+    for row in record["cases"]:
+        score = f"{row['score']:.0f}" if row["score"] is not None else "-"
+        draft = f"{row['first_draft_seconds']:.1f}" if row.get("first_draft_seconds") is not None else "-"
+        print(f"{row['id']:<30} {row['turns']:>5} {row['tool_calls']:>5} "
+              f"{row['creator_calls']}/{row['evaluator_calls']:<3} {row['tokens']:>8,} {row['model_seconds']:>8.1f} "
+              f"{draft:>8} {row['wall_seconds']:>7.2f} {'yes' if row['hit_max_turns'] else '':>4} {score:>6}")
+        if row["error"] and not row["hit_max_turns"]:
+            print(f"    {row['error']}")
+    summary = record["summary"]
+    print(f"\nmean turns {summary['mean_turns']:.1f}, max_turns hit {summary['max_turns_hit']}/{len(record['cases'])}, "
+          f"mean tokens {summary['mean_tokens']:,.0f}, mean first draft {summary.get('mean_first_draft_seconds')}s, "
+          f"mean score {summary['mean_score']}")
+
+
+async def main(args) -> int:
+    with open(args.corpus) as f:
+        corpus = json.load(f)
+    if args.cases:
+        corpus = [case for case in corpus if case["id"] in args.cases]
+    mode = "record" if args.record else "replay" if args.replay else "scripted"
+    # handle_feature_request opens its own trace; benchmark runs shouldn't be exported
+    configure_tracing(mode="off", force=True)
+    provider = BenchProvider(mode, args.record or args.replay)
+
+    rows = []
+    for case in corpus:
+        rows.append(await run_case(case, provider))
+    provider.save()
+
+    scores = [row["score"] for row in rows if row["score"] is not None]
+    draft_seconds = [row["first_draft_seconds"] for row in rows if row["first_draft_seconds"] is not None]
+    record = {
+        # Recorded and replayed runs of the same cassette are comparable with each other
+        "mode": "scripted" if mode == "scripted" else f"cassette:{os.path.basename(args.record or args.replay)}",
+        "timestamp": time.time(),
+        "loop_version": loop_version(),
+        "max_turns": FEATURE_MAX_TURNS,
+        "cases": rows,
+        "summary": {
+            "mean_turns": sum(row["turns"] for row in rows) / len(rows),
+            "max_turns_hit": sum(row["hit_max_turns"] for row in rows),
+            "mean_tokens": sum(row["tokens"] for row in rows) / len(rows),
+            "mean_score": round(sum(scores) / len(scores), 1) if scores else None,
+            "mean_first_draft_seconds": round(sum(draft_seconds) / len(draft_seconds), 1) if draft_seconds else None,
+        },
+    }
+    print_report(record)
+
+    previous = load_previous(record["mode"], args.results)
+    found = []
+    if previous is not None:
+        if previous["loop_version"] != record["loop_version"]:
+            print(f"\nLoop changed since the previous run ({previous['loop_version']} -> {record['loop_version']})")
+        found = regressions(record, previous)
+        if found:
+            print("\n❌ Regressions against the previous run:")
+            for line in found:
+                print(f"  - {line}")
+        else:
+            print("\n✅ No regressions against the previous run")
+    if not args.no_save:
+        with open(args.results, "a") as f:
+            f.write(json.dumps(record) + "\n")
+    return 1 if args.check and found else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the feature creator/evaluator loop")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--record", metavar="CASSETTE", help="Run live models and record their responses")
+    source.add_argument("--replay", metavar="CASSETTE", help="Replay recorded responses offline")
+    parser.add_argument("--corpus", default=CORPUS_PATH)
+    parser.add_argument("--results", default=RESULTS_PATH)
+    parser.add_argument("--cases", nargs="+", help="Only these case ids")
+    parser.add_argument("--check", action="store_true", help="Exit 1 if any case regressed")
+    parser.add_argument("--no-save", action="store_true", help="Don't append this run to the results")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,106 @@
+import asyncio
+import concurrent.futures
+import os
+from concurrent.futures import Future
+from typing import Any, List, Optional
+
+from pydantic import BaseModel, Field
+
+import background_loop
+
+# Agent modules are imported inside the functions that need them, so the UI can import this module
+# at startup without loading the Agents SDK (see startup.py)
+
+# The research agent's handoff question (see research_agent instructions in app.py)
+HANDOFF_QUESTION = "ready to proceed to feature development"
+DIGEST_WORDS = 400
+
+
+class FeaturePrewarm(BaseModel):
+    digest: str = Field(description="Compressed research digest that replaces the full research history")
+    questions: str = Field(description="The 3 clarifying questions for the first feature-phase turn")
+    draft: Optional[Any] = Field(default=None, description="Speculative first draft (FeatureDefinition), if requested")
+
+
+def is_handoff_question(text: str) -> bool:
+    return HANDOFF_QUESTION in str(text).lower()
+
+
+def research_digest(history: List[dict], max_words: int = DIGEST_WORDS) -> str:
+    """ Query-focused extractive digest of the research conversation """
+    from extractive_summarizer import summarize
+    user_messages = [msg["content"] for msg in history if msg["role"] == "user"]
+    assistant_messages = [str(msg["content"]) for msg in history if msg["role"] == "assistant"]
+    idea = user_messages[0] if user_messages else ""
+    summary = summarize(idea, assistant_messages, max_words=max_words)
+    return f"Product idea: {idea}\n\nResearch digest:\n{summary}" if summary else f"Product idea: {idea}"
+
+
+async def prepare_feature_phase(history: List[dict], with_draft: bool = False) -> FeaturePrewarm:
+    """ Everything the first feature-phase turn needs, computed ahead of the user's confirmation """
+    from feature_agent import (FEATURE_CREATOR_MODE, FeatureDefinition, create_feature_in_parallel,
+                               feature_creator_agent)
+    from model_router import run_stage
+    from query_clarifying_agent import template_questions, format_questions
+    print("Pre-warming feature phase...")
+    digest = research_digest(history)
+    idea = next((msg["content"] for msg in history if msg["role"] == "user"), "")
+    questions = format_questions(template_questions(idea, count=3, framework="mvp_definition"))
+    draft = None
+    if with_draft and FEATURE_CREATOR_MODE == "outline":
+        draft = await create_feature_in_parallel(digest)
+    elif with_draft:
+        result = await run_stage("feature_creator", feature_creator_agent, digest)
+        draft = result.final_output_as(FeatureDefinition)
+    print("Feature phase pre-warmed")
+    return FeaturePrewarm(digest=digest, questions=questions, draft=draft)
+
+
+class FeaturePrewarmer:
+    """
+    Holds the background preparation for one session. start() replaces any previous run,
+    cancel() stops it (e.g. on reset), ready() returns the result if it finished.
+    """
+
+    def __init__(self):
+        self._future: Optional[Future] = None
+
+    def start(self, history: List[dict], with_draft: Optional[bool] = None) -> None:
+        if with_draft is None:
+            with_draft = os.environ.get("FEATURE_PREWARM_DRAFT") == "1"
+        self.cancel()
+        self._future = background_loop.submit(prepare_feature_phase(list(history), with_draft))
+
+    def cancel(self) -> None:
+        if self._future is not None and not self._future.done():
+            self._future.cancel()
+        self._future = None
+
+    async def ready(self, timeout: float = 0.0) -> Optional[FeaturePrewarm]:
+        """
+        The prepared work, waiting at most `timeout` seconds; None if unavailable, cancelled or failed.
+        Cancelling the caller while it waits still cancels the caller.
+        """
+        future = self._future
+        if future is None:
+            return None
+        if not timeout and not future.done():
+            return None
+        try:
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout or None)
+        except (asyncio.TimeoutError, concurrent.futures.CancelledError):
+            return None
+        except asyncio.CancelledError:
+            # A cancelled pre-warm surfaces as asyncio.CancelledError too; only that one means "no result"
+            if future.cancelled():
+                return None
+            raise
+        except Exception as e:
+            print(f"Feature pre-warm failed: {e}")
+            return None
+
+
+def first_turn_response(prewarm: FeaturePrewarm) -> str:
+    """ The opening feature-phase message, served without a model call """
+    return ("Great, let's define the MVP. Based on the research so far, a few questions first:\n\n"
+            f"{prewarm.questions}")
@@ -0,0 +1,146 @@
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, TypeVar
+
+from cancellation import current_token
+
+T = TypeVar("T")
+
+HISTORY_SIZE = 200   # latency samples kept for the rolling percentile
+MIN_SAMPLES = 10     # no hedging until the percentile means something
+
+
+def _spawn(coro: Awaitable[T]) -> asyncio.Task:
+    """ Start an attempt under the current request's CancelToken, so cancelling the request stops it too """
+    token = current_token()
+    return token.spawn(coro) if token is not None else asyncio.create_task(coro)
+
+
+class HedgePolicy:
+    """
+    Hedged requests for one stage.
+    A call that runs longer than the rolling p90 latency of the stage gets a duplicate;
+    whichever finishes first wins and the other is cancelled. Hedges are capped at
+    `budget` extra requests per primary request (0.1 = at most 10% extra).
+    """
+
+    def __init__(self, stage: str, budget: float = 0.1, percentile: float = 0.9, measure_losers: bool = False):
+        self.stage = stage
+        self.budget = budget
+        self.percentile = percentile
+        # Let a losing primary finish in the background to measure what hedging saved (benchmarks only)
+        self.measure_losers = measure_losers
+        self.latencies: Deque[float] = deque(maxlen=HISTORY_SIZE)
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.observed: List[float] = []
+        # Latency each call would have had without hedging
+        self.unhedged: List[float] = []
+
+    def threshold(self) -> Optional[float]:
+        """ Rolling latency percentile after which a hedge is fired """
+        if len(self.latencies) < MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[int(self.percentile * (len(ordered) - 1))]
+
+    def _budget_allows(self) -> bool:
+        return self.hedges + 1 <= self.budget * self.requests
+
+    async def run(self, make_call: Callable[[], Awaitable[T]]) -> T:
+        """ Run make_call(), hedging it if it becomes a straggler """
+        self.requests += 1
+        start = time.perf_counter()
+        primary = _spawn(make_call())
+        hedge: Optional[asyncio.Task] = None
+        try:
+            threshold = self.threshold()
+            if threshold is not None:
+                await asyncio.wait({primary}, timeout=threshold)
+            if threshold is None or primary.done() or not self._budget_allows():
+                try:
+                    return await primary
+                finally:
+                    elapsed = time.perf_counter() - start
+                    self._record(elapsed)
+                    self.unhedged.append(elapsed)
+
+            self.hedges += 1
+            print(f"Hedging slow {self.stage} call after {threshold:.2f}s")
+            hedge = _spawn(make_call())
+            pending = {primary, hedge}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = done.pop()
+                # A failed attempt only loses if the other one can still succeed
+                if winner.exception() is not None and pending:
+                    continue
+                elapsed = time.perf_counter() - start
+                self._record(elapsed)
+                if winner is primary:
+                    self.unhedged.append(elapsed)
+                else:
+                    self.hedge_wins += 1
+                    if self.measure_losers:
+                        primary.add_done_callback(lambda _: self.unhedged.append(time.perf_counter() - start))
+                    else:
+                        # The primary was still running, so this is a lower bound
+                        self.unhedged.append(elapsed)
+                return winner.result()
+        except asyncio.CancelledError:
+            # The caller gave up: no attempt keeps running (and billing), measured loser or not
+            for task in (primary, hedge):
+                if task is not None:
+                    task.cancel()
+            raise
+        finally:
+            for task in (primary, hedge):
+                if task is None or task.done() or (task is primary and self.measure_losers):
+                    continue
+                task.cancel()
+
+    def _record(self, elapsed: float) -> None:
+        self.latencies.append(elapsed)
+        self.observed.append(elapsed)
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        """ Hedge rate, hedge win rate and observed vs unhedged tail latency """
+        def p99(values: List[float]) -> Optional[float]:
+            if not values:
+                return None
+            ordered = sorted(values)
+            return ordered[int(0.99 * (len(ordered) - 1))]
+
+        return {
+            "requests": self.requests,
+            "hedges": self.hedges,
+            "hedge_rate": self.hedges / self.requests if self.requests else 0.0,
+            "win_rate": self.hedge_wins / self.hedges if self.hedges else 0.0,
+            "p90_threshold": self.threshold(),
+            "p99_latency": p99(self.observed),
+            "p99_latency_unhedged": p99(self.unhedged),
+        }
+
+
+search_hedge_policy = HedgePolicy("search")
+
+
+if __name__ == "__main__":
+    # Offline check on a heavy-tailed latency distribution like the search stage's
+    import random
+
+    async def simulated_search() -> str:
+        await asyncio.sleep(random.lognormvariate(-3.5, 0.4) * (8 if random.random() < 0.08 else 1))
+        return "summary"
+
+    async def main():
+        policy = HedgePolicy("simulated_search", measure_losers=True)
+        for _ in range(40):
+            await asyncio.gather(*[policy.run(simulated_search) for _ in range(5)])
+        await asyncio.sleep(1)
+        for key, value in policy.stats().items():
+            print(f"{key:>24}: {value:.3f}" if isinstance(value, float) else f"{key:>24}: {value}")
+
+    asyncio.run(main())
@@ -0,0 +1,498 @@
+import abc
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+# Handle optional redis dependency
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+DEFAULT_QUEUE_PATH = os.environ.get("JOB_QUEUE_PATH", "research_jobs.db")
+DEFAULT_VISIBILITY_TIMEOUT = float(os.environ.get("JOB_VISIBILITY_TIMEOUT", "60"))
+DEFAULT_MAX_ATTEMPTS = 3
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+# ----------------------------
+# Job schema
+# ----------------------------
+class Job(BaseModel):
+    job_id: str = Field(description="Unique job id")
+    kind: str = Field(description="Handler name the worker dispatches on, e.g. 'research'")
+    payload: Dict = Field(default_factory=dict, description="JSON-serializable job arguments")
+    status: str = Field(default=QUEUED, description="queued, running, done, failed or cancelled")
+    attempts: int = Field(default=0, description="How many times a worker has claimed this job")
+    worker_id: Optional[str] = Field(default=None, description="Worker currently holding the lease")
+    lease_expires: float = Field(default=0.0, description="Epoch seconds after which the lease is considered dead")
+    result: Optional[str] = Field(default=None, description="Final output of the job")
+    error: Optional[str] = Field(default=None, description="Last error message, if any")
+    created_at: float = Field(default_factory=time.time)
+    updated_at: float = Field(default_factory=time.time)
+
+
+class JobQueue(abc.ABC):
+    """
+    Interface shared by the queue backends.
+    Workers claim a job with a lease, extend it with heartbeats and either complete or fail it.
+    Jobs whose lease has expired (the worker died) are requeued on the next claim.
+    A cancelled job is never claimed again, and its worker's next heartbeat fails so it stops.
+    """
+
+    @abc.abstractmethod
+    def enqueue(self, kind: str, payload: Dict) -> str:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def claim(self, worker_id: str, visibility_timeout: float = DEFAULT_VISIBILITY_TIMEOUT) -> Optional[Job]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def heartbeat(self, job_id: str, worker_id: str, visibility_timeout: float = DEFAULT_VISIBILITY_TIMEOUT) -> bool:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def complete(self, job_id: str, worker_id: str, result: str) -> None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def fail(self, job_id: str, worker_id: str, error: str) -> None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def cancel(self, job_id: str, reason: str = "cancelled") -> bool:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get(self, job_id: str) -> Optional[Job]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def requeue_expired(self) -> int:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def counts(self) -> Dict[str, int]:
+        raise NotImplementedError
+
+
+# ============================
+# SQLite backend
+# ============================
+class SQLiteJobQueue(JobQueue):
+    """ Local job queue backed by a single SQLite file, safe to share between processes """
+
+    def __init__(self, path: str = DEFAULT_QUEUE_PATH, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    worker_id TEXT,
+                    lease_expires REAL NOT NULL DEFAULT 0,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread; sqlite3 connections must not cross threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _row_to_job(self, row: sqlite3.Row) -> Job:
+        data = dict(row)
+        data["payload"] = json.loads(data["payload"])
+        return Job(**data)
+
+    def enqueue(self, kind: str, payload: Dict) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._connect().execute(
+            "INSERT INTO jobs (job_id, kind, payload, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, kind, json.dumps(payload), QUEUED, now, now),
+        )
+        return job_id
+
+    def requeue_expired(self) -> int:
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            failed = conn.execute(
+                "UPDATE jobs SET status = ?, worker_id = NULL, error = 'lease expired', updated_at = ? "
+                "WHERE status = ? AND lease_expires < ? AND attempts >= ?",
+                (FAILED, now, RUNNING, now, self.max_attempts),
+            ).rowcount
+            requeued = conn.execute(
+                "UPDATE jobs SET status = ?, worker_id = NULL, updated_at = ? "
+                "WHERE status = ? AND lease_expires < ?",
+                (QUEUED, now, RUNNING, now),
+            ).rowcount
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if requeued or failed:
+            print(f"Requeued {requeued} expired jobs, failed {failed}")
+        return requeued
+
+    def claim(self, worker_id: str, visibility_timeout: float = DEFAULT_VISIBILITY_TIMEOUT) -> Optional[Job]:
+        self.requeue_expired()
+        now = time.time()
+        conn = self._connect()
+        # BEGIN IMMEDIATE takes the write lock so two workers never claim the same row
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT job_id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1",
+                (QUEUED,),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker_id = ?, attempts = attempts + 1, "
+                "lease_expires = ?, updated_at = ? WHERE job_id = ?",
+                (RUNNING, worker_id, now + visibility_timeout, now, row["job_id"]),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(row["job_id"])
+
+    def heartbeat(self, job_id: str, worker_id: str, visibility_timeout: float = DEFAULT_VISIBILITY_TIMEOUT) -> bool:
+        now = time.time()
+        updated = self._connect().execute(
+            "UPDATE jobs SET lease_expires = ?, updated_at = ? WHERE job_id = ? AND worker_id = ? AND status = ?",
+            (now + visibility_timeout, now, job_id, worker_id, RUNNING),
+        ).rowcount
+        # False means the lease was lost (expired and requeued, or the job cancelled) and the worker should stop
+        return updated == 1
+
+    def complete(self, job_id: str, worker_id: str, result: str) -> None:
+        self._connect().execute(
+            "UPDATE jobs SET status = ?, result = ?, updated_at = ? WHERE job_id = ? AND worker_id = ? AND status = ?",
+            (DONE, result, time.time(), job_id, worker_id, RUNNING),
+        )
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> None:
+        # One statement, so a job requeued and reclaimed meanwhile is never touched
+        self._connect().execute(
+            "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, error = ?, worker_id = NULL, "
+            "updated_at = ? WHERE job_id = ? AND worker_id = ? AND status = ?",
+            (self.max_attempts, FAILED, QUEUED, error, time.time(), job_id, worker_id, RUNNING),
+        )
+
+    def cancel(self, job_id: str, reason: str = "cancelled") -> bool:
+        # Whoever holds the lease finds out on its next heartbeat; complete/fail then match no row
+        updated = self._connect().execute(
+            "UPDATE jobs SET status = ?, worker_id = NULL, error = ?, updated_at = ? "
+            "WHERE job_id = ? AND status IN (?, ?)",
+            (CANCELLED, reason, time.time(), job_id, QUEUED, RUNNING),
+        ).rowcount
+        return updated == 1
+
+    def get(self, job_id: str) -> Optional[Job]:
+        row = self._connect().execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def counts(self) -> Dict[str, int]:
+        rows = self._connect().execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+
+# ============================
+# Redis-protocol backend
+# ============================
+# Every state change of a claimed job runs as one Lua script, so a claim, heartbeat, reap,
+# complete, fail or cancel can never interleave with another on the same job.
+# Job hashes are addressed as ARGV[1] .. job_id: on Redis Cluster give the prefix a {hash tag}.
+CLAIM_SCRIPT = """
+local job_id = redis.call('RPOP', KEYS[1])
+if not job_id then return false end
+local key = ARGV[1] .. job_id
+redis.call('HSET', key, 'status', 'running', 'worker_id', ARGV[2], 'lease_expires', ARGV[3], 'updated_at', ARGV[4])
+redis.call('HINCRBY', key, 'attempts', 1)
+redis.call('ZADD', KEYS[2], ARGV[3], job_id)
+return job_id
+"""
+
+HEARTBEAT_SCRIPT = """
+local key = ARGV[1] .. ARGV[2]
+if not redis.call('ZSCORE', KEYS[1], ARGV[2]) then return 0 end
+if redis.call('HGET', key, 'worker_id') ~= ARGV[3] then return 0 end
+redis.call('HSET', key, 'lease_expires', ARGV[4], 'updated_at', ARGV[5])
+redis.call('ZADD', KEYS[1], ARGV[4], ARGV[2])
+return 1
+"""
+
+REAP_SCRIPT = """
+local requeued = 0
+for _, job_id in ipairs(redis.call('ZRANGEBYSCORE', KEYS[1], 0, ARGV[2])) do
+  redis.call('ZREM', KEYS[1], job_id)
+  local key = ARGV[1] .. job_id
+  if tonumber(redis.call('HGET', key, 'attempts') or '0') >= tonumber(ARGV[3]) then
+    redis.call('HSET', key, 'status', 'failed', 'worker_id', '', 'error', 'lease expired', 'updated_at', ARGV[2])
+  else
+    redis.call('HSET', key, 'status', 'queued', 'worker_id', '', 'updated_at', ARGV[2])
+    redis.call('LPUSH', KEYS[2], job_id)
+    requeued = requeued + 1
+  end
+end
+return requeued
+"""
+
+FINISH_SCRIPT = """
+local key = ARGV[1] .. ARGV[2]
+if redis.call('HGET', key, 'worker_id') ~= ARGV[3] then return 0 end
+if redis.call('ZREM', KEYS[1], ARGV[2]) == 0 then return 0 end
+if ARGV[4] == 'done' then
+  redis.call('HSET', key, 'status', 'done', 'result', ARGV[5], 'updated_at', ARGV[6])
+elseif tonumber(redis.call('HGET', key, 'attempts') or '0') >= tonumber(ARGV[7]) then
+  redis.call('HSET', key, 'status', 'failed', 'worker_id', '', 'error', ARGV[5], 'updated_at', ARGV[6])
+else
+  redis.call('HSET', key, 'status', 'queued', 'worker_id', '', 'error', ARGV[5], 'updated_at', ARGV[6])
+  redis.call('LPUSH', KEYS[2], ARGV[2])
+end
+return 1
+"""
+
+CANCEL_SCRIPT = """
+local key = ARGV[1] .. ARGV[2]
+local status = redis.call('HGET', key, 'status')
+if status ~= 'queued' and status ~= 'running' then return 0 end
+redis.call('LREM', KEYS[2], 0, ARGV[2])
+redis.call('ZREM', KEYS[1], ARGV[2])
+redis.call('HSET', key, 'status', 'cancelled', 'worker_id', '', 'error', ARGV[3], 'updated_at', ARGV[4])
+return 1
+"""
+
+
+class LocalRedisStandIn:
+    """
+    In-process stand-in for the handful of Redis commands RedisJobQueue uses.
+    Lets the Redis backend run without a broker; it is not shared between processes.
+    Scripts run as their Python twins below, under the same lock, so they stay atomic.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hashes: Dict[str, Dict[str, str]] = {}
+        self._lists: Dict[str, List[str]] = {}
+        self._zsets: Dict[str, Dict[str, float]] = {}
+
+    def hset(self, key: str, mapping: Dict[str, str]) -> None:
+        with self._lock:
+            self._hashes.setdefault(key, {}).update({k: str(v) for k, v in mapping.items()})
+
+    def hgetall(self, key: str) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._hashes.get(key, {}))
+
+    def lpush(self, key: str, value: str) -> None:
+        with self._lock:
+            self._lists.setdefault(key, []).insert(0, value)
+
+    def llen(self, key: str) -> int:
+        with self._lock:
+            return len(self._lists.get(key, []))
+
+    def zcard(self, key: str) -> int:
+        with self._lock:
+            return len(self._zsets.get(key, {}))
+
+    def register_script(self, script: str):
+        twin = self._SCRIPTS[script]
+
+        def run(keys: List[str], args: List):
+            with self._lock:
+                return twin(self, keys, [str(arg) for arg in args])
+        return run
+
+    # ----------------------------
+    # Script twins (caller holds the lock)
+    # ----------------------------
+    def _claim(self, keys: List[str], args: List[str]) -> Optional[str]:
+        queued = self._lists.get(keys[0])
+        if not queued:
+            return None
+        job_id = queued.pop()
+        job = self._hashes.setdefault(args[0] + job_id, {})
+        job.update(status=RUNNING, worker_id=args[1], lease_expires=args[2], updated_at=args[3])
+        job["attempts"] = str(int(job.get("attempts", "0")) + 1)
+        self._zsets.setdefault(keys[1], {})[job_id] = float(args[2])
+        return job_id
+
+    def _heartbeat(self, keys: List[str], args: List[str]) -> int:
+        running = self._zsets.get(keys[0], {})
+        job = self._hashes.get(args[0] + args[1], {})
+        if args[1] not in running or job.get("worker_id") != args[2]:
+            return 0
+        job.update(lease_expires=args[3], updated_at=args[4])
+        running[args[1]] = float(args[3])
+        return 1
+
+    def _reap(self, keys: List[str], args: List[str]) -> int:
+        running = self._zsets.get(keys[0], {})
+        requeued = 0
+        for job_id in [m for m, score in sorted(running.items(), key=lambda kv: kv[1]) if score <= float(args[1])]:
+            del running[job_id]
+            job = self._hashes.setdefault(args[0] + job_id, {})
+            if int(job.get("attempts", "0")) >= int(args[2]):
+                job.update(status=FAILED, worker_id="", error="lease expired", updated_at=args[1])
+            else:
+                job.update(status=QUEUED, worker_id="", updated_at=args[1])
+                self._lists.setdefault(keys[1], []).insert(0, job_id)
+                requeued += 1
+        return requeued
+
+    def _finish(self, keys: List[str], args: List[str]) -> int:
+        job = self._hashes.get(args[0] + args[1], {})
+        if job.get("worker_id") != args[2] or self._zsets.get(keys[0], {}).pop(args[1], None) is None:
+            return 0
+        if args[3] == DONE:
+            job.update(status=DONE, result=args[4], updated_at=args[5])
+        elif int(job.get("attempts", "0")) >= int(args[6]):
+            job.update(status=FAILED, worker_id="", error=args[4], updated_at=args[5])
+        else:
+            job.update(status=QUEUED, worker_id="", error=args[4], updated_at=args[5])
+            self._lists.setdefault(keys[1], []).insert(0, args[1])
+        return 1
+
+    def _cancel(self, keys: List[str], args: List[str]) -> int:
+        job = self._hashes.get(args[0] + args[1], {})
+        if job.get("status") not in (QUEUED, RUNNING):
+            return 0
+        self._lists[keys[1]] = [job_id for job_id in self._lists.get(keys[1], []) if job_id != args[1]]
+        self._zsets.get(keys[0], {}).pop(args[1], None)
+        job.update(status=CANCELLED, worker_id="", error=args[2], updated_at=args[3])
+        return 1
+
+    _SCRIPTS = {CLAIM_SCRIPT: _claim, HEARTBEAT_SCRIPT: _heartbeat, REAP_SCRIPT: _reap, FINISH_SCRIPT: _finish,
+                CANCEL_SCRIPT: _cancel}
+
+
+class RedisJobQueue(JobQueue):
+    """
+    Job queue on a Redis-protocol broker (Redis, Valkey, KeyDB...).
+    Pending ids live in a list, running ids in a sorted set scored by lease expiry,
+    and job bodies in one hash per job. Pass a LocalRedisStandIn as client to run without a broker.
+    """
+
+    def __init__(self, url: Optional[str] = None, client=None, prefix: str = "pmjobs",
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        if client is None:
+            if not REDIS_AVAILABLE:
+                raise RuntimeError("redis package not installed - use SQLiteJobQueue or LocalRedisStandIn")
+            client = redis.Redis.from_url(url or os.environ.get("REDIS_URL", "redis://localhost:6379/0"),
+                                          decode_responses=True)
+        self.client = client
+        self.prefix = prefix
+        self.max_attempts = max_attempts
+        self._claim = client.register_script(CLAIM_SCRIPT)
+        self._heartbeat = client.register_script(HEARTBEAT_SCRIPT)
+        self._reap = client.register_script(REAP_SCRIPT)
+        self._finish = client.register_script(FINISH_SCRIPT)
+        self._cancel = client.register_script(CANCEL_SCRIPT)
+
+    def _key(self, *parts: str) -> str:
+        return ":".join((self.prefix,) + parts)
+
+    def _save(self, job: Job) -> None:
+        job.updated_at = time.time()
+        data = job.model_dump()
+        data["payload"] = json.dumps(job.payload)
+        self.client.hset(self._key("job", job.job_id),
+                         mapping={k: ("" if v is None else v) for k, v in data.items()})
+
+    def get(self, job_id: str) -> Optional[Job]:
+        data = self.client.hgetall(self._key("job", job_id))
+        if not data:
+            return None
+        data = {k: (None if v == "" and k in ("worker_id", "result", "error") else v) for k, v in data.items()}
+        data["payload"] = json.loads(data["payload"])
+        return Job(**data)
+
+    def enqueue(self, kind: str, payload: Dict) -> str:
+        job = Job(job_id=uuid.uuid4().hex, kind=kind, payload=payload)
+        self._save(job)
+        self.client.lpush(self._key("queued"), job.job_id)
+        return job.job_id
+
+    def requeue_expired(self) -> int:
+        return int(self._reap(keys=[self._key("running"), self._key("queued")],
+                              args=[self._key("job", ""), time.time(), self.max_attempts]))
+
+    def claim(self, worker_id: str, visibility_timeout: float = DEFAULT_VISIBILITY_TIMEOUT) -> Optional[Job]:
+        self.requeue_expired()
+        now = time.time()
+        job_id = self._claim(keys=[self._key("queued"), self._key("running")],
+                             args=[self._key("job", ""), worker_id, now + visibility_timeout, now])
+        return self.get(job_id) if job_id else None
+
+    def heartbeat(self, job_id: str, worker_id: str, visibility_timeout: float = DEFAULT_VISIBILITY_TIMEOUT) -> bool:
+        now = time.time()
+        # False means the lease was lost (expired and requeued, or the job cancelled) and the worker should stop
+        return bool(self._heartbeat(keys=[self._key("running")],
+                                    args=[self._key("job", ""), job_id, worker_id, now + visibility_timeout, now]))
+
+    def complete(self, job_id: str, worker_id: str, result: str) -> None:
+        self._finish(keys=[self._key("running"), self._key("queued")],
+                     args=[self._key("job", ""), job_id, worker_id, DONE, result, time.time(), self.max_attempts])
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> None:
+        self._finish(keys=[self._key("running"), self._key("queued")],
+                     args=[self._key("job", ""), job_id, worker_id, FAILED, error, time.time(), self.max_attempts])
+
+    def cancel(self, job_id: str, reason: str = "cancelled") -> bool:
+        return bool(self._cancel(keys=[self._key("running"), self._key("queued")],
+                                 args=[self._key("job", ""), job_id, reason, time.time()]))
+
+    def counts(self) -> Dict[str, int]:
+        # Finished jobs are only kept as hashes, so report what the index structures know
+        return {QUEUED: self.client.llen(self._key("queued")), RUNNING: self.client.zcard(self._key("running"))}
+
+
+def get_job_queue(url: Optional[str] = None) -> JobQueue:
+    """
+    Build a queue from a URL: 'redis://...' uses RedisJobQueue, 'local-redis://' the in-process
+    stand-in (single process only), and anything else is treated as a SQLite file path.
+    """
+    url = url or os.environ.get("JOB_QUEUE_URL", DEFAULT_QUEUE_PATH)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisJobQueue(url=url)
+    if url.startswith("local-redis://"):
+        return RedisJobQueue(client=LocalRedisStandIn())
+    if url.startswith("sqlite:///"):
+        url = url[len("sqlite:///"):]
+    return SQLiteJobQueue(url)
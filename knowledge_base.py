@@ -0,0 +1,284 @@
+"""
+Market-intelligence knowledge base built from search results.
+
+Every search result is mined for facts (market size, pricing, adoption figures, competitors) that are
+stored with their entity, source, tenant and timestamp in a local SQLite full-text index. Before a
+planned search is dispatched, ProductAnalysisManager asks the knowledge base first: a query with
+enough fresh, relevant facts of the same tenant is answered from them and the search is skipped.
+Repeat research in the same domain gets cheaper and faster as the base fills up. Only web results
+are mined; hits from the internal document index never become facts.
+
+Extraction is rule-based (sentence patterns, no model calls). Coverage (share of planned queries
+with any fresh fact) and skip rate (share answered without searching) are logged per lookup.
+
+    python knowledge_base.py                   # facts, entities, coverage and skip rate
+    python knowledge_base.py --query "..."     # what the base knows for a search query
+    python knowledge_base.py --entities        # most documented entities
+    python knowledge_base.py --tenant acme ... # scope --query / --entities to one tenant
+"""
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from extractive_summarizer import split_sentences, tokenize
+
+DEFAULT_KB_PATH = os.environ.get("KNOWLEDGE_BASE_PATH", "knowledge_base.db")
+FRESH_DAYS = float(os.environ.get("KB_FRESH_DAYS", "30"))
+MIN_FACTS = int(os.environ.get("KB_MIN_FACTS", "4"))        # relevant fresh facts needed to skip a search
+MIN_TERM_COVERAGE = 0.7     # share of the query's terms the facts must mention between them
+MAX_FACTS_PER_ANSWER = 8
+CANDIDATES = 40
+
+# ============================
+# Extraction
+# ============================
+_MONEY = r"(?:\$|€|£|USD\s?)\s?\d[\d,.]*\s?(?:k|m|b|bn|million|billion|trillion)?\b"
+# First match wins, so the narrower patterns come first
+_PATTERNS = [
+    ("pricing", re.compile(rf"{_MONEY}\s*(?:/|per|a|an)\s*(?:seat|user|month|year|mo|yr|license|agent)"
+                           rf"|\b(?:priced|pricing|charges?|costs?|subscription)\b.*{_MONEY}", re.IGNORECASE)),
+    ("market_size", re.compile(rf"{_MONEY}.*\b(?:market|industry|TAM|revenue)\b"
+                               rf"|\b(?:market|industry|TAM)\b.*{_MONEY}|\bCAGR\b", re.IGNORECASE)),
+    ("adoption", re.compile(r"\d+(?:\.\d+)?\s?%.*\b(?:adopt\w*|use|using|users|customers|teams|companies|"
+                            r"respondents|organizations|enterprises)\b"
+                            r"|\b(?:adopt\w*|users|customers)\b.*\d+(?:\.\d+)?\s?%", re.IGNORECASE)),
+    # Bare "leader" or "players" also match "team leaders" or "players in Europe", so they need a market qualifier
+    ("competitor", re.compile(r"\b(?:competitors?|competing|rivals?|incumbents|alternatives?\s+(?:to|such as|like|include))\b"
+                              r"|\b(?:market|category|industry)\s+leaders?\b"
+                              r"|\b(?:key|major|leading|established)\s+(?:players|vendors)\b", re.IGNORECASE)),
+]
+# Capitalized names: "Gong", "Otter.ai", "New Relic"; sentence-initial words are filtered by _NOT_NAMES
+_NAME = re.compile(r"\b([A-Z][\w.]*[a-z0-9][\w.]*(?:\s[A-Z][\w.]+)?)")
+_NOT_NAMES = {"The", "This", "These", "That", "Their", "They", "There", "It", "Its", "In", "On", "For", "By", "As",
+              "Most", "Many", "Some", "Main", "Major", "Key", "Our", "We", "Users", "Teams", "Customers", "Companies",
+              "Pricing", "Market", "According", "Based", "While", "However", "Overall", "Today", "AI", "API", "SaaS",
+              "CRM", "MVP", "KPI", "ROI", "US", "EU", "UK", "CAGR", "TAM", "B2B", "B2C", "Competitors", "Competitor",
+              "Competing", "Rivals", "Incumbents", "Alternatives", "Leading", "Established", "Players", "Vendors"}
+
+
+class Fact(NamedTuple):
+    kind: str               # market_size / pricing / adoption / competitor
+    entity: str             # main named entity of the fact, "" if none
+    text: str
+
+
+def _names(sentence: str) -> List[str]:
+    names = []
+    for match in _NAME.findall(sentence):
+        # "Otter.ai" keeps its dot, a name ending the sentence doesn't
+        words = match.rstrip(".").split()
+        while words and words[0] in _NOT_NAMES:
+            words.pop(0)
+        if words:
+            names.append(" ".join(words))
+    return names
+
+
+def extract_facts(text: str) -> List[Fact]:
+    """ Fact sentences of a search result, classified by the first matching pattern """
+    facts = []
+    for sentence in split_sentences(text):
+        for kind, pattern in _PATTERNS:
+            if pattern.search(sentence):
+                names = _names(sentence)
+                # Competitor sentences need named competitors to be worth keeping
+                if kind == "competitor" and not names:
+                    continue
+                facts.append(Fact(kind, names[0] if names else "", sentence))
+                break
+    return facts
+
+
+# ============================
+# Store
+# ============================
+def _fact_hash(text: str, tenant: str) -> str:
+    """ Dedup key of a fact within its tenant; the default tenant keeps the keys of pre-tenant bases """
+    normalized = " ".join(text.lower().split())
+    return hashlib.sha1((normalized if tenant == "default" else f"{tenant}\n{normalized}").encode()).hexdigest()
+
+class StoredFact(NamedTuple):
+    kind: str
+    entity: str
+    text: str
+    source: str
+    created_at: float
+
+
+class KnowledgeBase:
+    """ Facts in a local SQLite file with an FTS5 index over their text and entity """
+
+    def __init__(self, path: str = DEFAULT_KB_PATH):
+        """ Facts and lookups carry the tenant that produced them; bases without the column are migrated """
+        self.path = path
+        self._local = threading.local()
+        conn = self._connect()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS facts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                hash TEXT UNIQUE NOT NULL,
+                kind TEXT NOT NULL,
+                entity TEXT NOT NULL,
+                text TEXT NOT NULL,
+                query TEXT NOT NULL,
+                source TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_facts_entity ON facts (entity);
+            CREATE VIRTUAL TABLE IF NOT EXISTS facts_fts USING fts5(text, entity, content='facts', content_rowid='id');
+            CREATE TRIGGER IF NOT EXISTS facts_ai AFTER INSERT ON facts BEGIN
+                INSERT INTO facts_fts (rowid, text, entity) VALUES (new.id, new.text, new.entity);
+            END;
+            CREATE TRIGGER IF NOT EXISTS facts_au AFTER UPDATE ON facts BEGIN
+                INSERT INTO facts_fts (facts_fts, rowid, text, entity) VALUES ('delete', old.id, old.text, old.entity);
+                INSERT INTO facts_fts (rowid, text, entity) VALUES (new.id, new.text, new.entity);
+            END;
+            CREATE TABLE IF NOT EXISTS lookups (
+                created_at REAL NOT NULL,
+                query TEXT NOT NULL,
+                facts INTEGER NOT NULL,
+                skipped INTEGER NOT NULL
+            );
+        """)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(facts)")}
+        if "tenant" not in columns:
+            conn.execute("ALTER TABLE facts ADD COLUMN tenant TEXT NOT NULL DEFAULT 'default'")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_facts_tenant ON facts (tenant, created_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread; sqlite3 connections must not cross threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, query: str, text: str, source: str, tenant: str = "default") -> int:
+        """ Extract and store the facts of one search result for a tenant; returns how many it had """
+        facts = extract_facts(text)
+        if not facts:
+            return 0
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN")
+        try:
+            for fact in facts:
+                # A fact seen again by the same tenant is refreshed rather than duplicated
+                conn.execute(
+                    "INSERT INTO facts (hash, kind, entity, text, query, source, created_at, tenant) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (hash) DO UPDATE SET created_at = excluded.created_at, source = excluded.source",
+                    (_fact_hash(fact.text, tenant), fact.kind, fact.entity, fact.text, query, source, now, tenant))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return len(facts)
+
+    def relevant(self, query: str, tenant: str = "default", fresh_days: float = None) -> List[StoredFact]:
+        """ Fresh facts of the tenant sharing at least two of the query's terms (one for one-term queries), best first """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        cutoff = time.time() - (FRESH_DAYS if fresh_days is None else fresh_days) * 86400
+        match = " OR ".join('"' + term.replace('"', "") + '"' for term in terms)
+        rows = self._connect().execute(
+            "SELECT f.kind, f.entity, f.text, f.source, f.created_at "
+            "FROM facts_fts JOIN facts f ON f.id = facts_fts.rowid "
+            "WHERE facts_fts MATCH ? AND f.tenant = ? AND f.created_at >= ? ORDER BY bm25(facts_fts) LIMIT ?",
+            (match, tenant, cutoff, CANDIDATES)).fetchall()
+        needed = min(2, len(terms))
+        facts = []
+        for row in rows:
+            fact = StoredFact(*row)
+            fact_terms = set(tokenize(f"{fact.text} {fact.entity}"))
+            if sum(term in fact_terms for term in terms) >= needed:
+                facts.append(fact)
+        return facts
+
+    def check(self, query: str, tenant: str = "default") -> Tuple[List[StoredFact], bool]:
+        """ (relevant fresh facts, whether they are enough to skip the search) """
+        facts = self.relevant(query, tenant)
+        terms = set(tokenize(query))
+        mentioned = set()
+        for fact in facts[:MAX_FACTS_PER_ANSWER]:
+            mentioned |= terms & set(tokenize(f"{fact.text} {fact.entity}"))
+        return facts, len(facts) >= MIN_FACTS and bool(terms) and len(mentioned) / len(terms) >= MIN_TERM_COVERAGE
+
+    def answer(self, query: str, tenant: str = "default") -> Optional[str]:
+        """
+        A search-result-shaped answer to a planned search query from fresh facts, or None if the
+        base doesn't know enough and the search should run. Every call is logged for the stats.
+        """
+        facts, skip = self.check(query, tenant)
+        self._connect().execute("INSERT INTO lookups (created_at, query, facts, skipped) VALUES (?, ?, ?, ?)",
+                                (time.time(), query, len(facts), int(skip)))
+        if not skip:
+            return None
+        lines = [f"- {fact.text} (source: {fact.source}, {time.strftime('%Y-%m-%d', time.localtime(fact.created_at))})"
+                 for fact in facts[:MAX_FACTS_PER_ANSWER]]
+        return f"Known facts for '{query}' from earlier research:\n" + "\n".join(lines)
+
+    def entities(self, limit: int = 20, tenant: Optional[str] = None) -> List[Dict]:
+        """ Most documented entities, of one tenant or (tenant=None) all of them """
+        rows = self._connect().execute(
+            "SELECT entity, COUNT(*), GROUP_CONCAT(DISTINCT kind), MAX(created_at) FROM facts WHERE entity != '' "
+            "AND (? IS NULL OR tenant = ?) GROUP BY entity ORDER BY COUNT(*) DESC LIMIT ?",
+            (tenant, tenant, limit)).fetchall()
+        return [{"entity": row[0], "facts": row[1], "kinds": row[2].split(","), "updated_at": row[3]} for row in rows]
+
+    def stats(self, since: float = 0.0) -> Dict:
+        """ Size, coverage (lookups with any fresh fact) and skip rate (lookups answered without searching) """
+        conn = self._connect()
+        cutoff = time.time() - FRESH_DAYS * 86400
+        facts, fresh, entities = conn.execute(
+            "SELECT COUNT(*), SUM(created_at >= ?), COUNT(DISTINCT NULLIF(entity, '')) FROM facts",
+            (cutoff,)).fetchone()
+        lookups, covered, skipped = conn.execute(
+            "SELECT COUNT(*), SUM(facts > 0), SUM(skipped) FROM lookups WHERE created_at >= ?", (since,)).fetchone()
+        return {
+            "facts": facts, "fresh_facts": fresh or 0, "entities": entities,
+            "lookups": lookups,
+            "coverage": round((covered or 0) / lookups, 3) if lookups else 0.0,
+            "skip_rate": round((skipped or 0) / lookups, 3) if lookups else 0.0,
+        }
+
+
+_knowledge_base: Optional[KnowledgeBase] = None
+
+
+def knowledge_base() -> KnowledgeBase:
+    """ Shared knowledge base for this process """
+    global _knowledge_base
+    if _knowledge_base is None:
+        _knowledge_base = KnowledgeBase()
+    return _knowledge_base
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Market-intelligence knowledge base")
+    parser.add_argument("--query", help="Show what the base knows for this search query")
+    parser.add_argument("--entities", action="store_true", help="List the most documented entities")
+    parser.add_argument("--tenant", default="default", help="Tenant whose facts --query and --entities show")
+    parser.add_argument("--days", type=float, default=0, help="Stats over the last N days (default: all time)")
+    args = parser.parse_args()
+    kb = KnowledgeBase()
+    if args.query:
+        facts, skip = kb.check(args.query, args.tenant)
+        for fact in facts:
+            print(f"[{fact.kind}] {fact.entity or '-'}: {fact.text}  ({fact.source})")
+        print(f"\n{len(facts)} relevant fresh facts; {'enough to skip the search' if skip else 'the search would run'}")
+    elif args.entities:
+        for entity in kb.entities(tenant=args.tenant):
+            print(f"{entity['facts']:>4}  {entity['entity']}  ({', '.join(entity['kinds'])})")
+    else:
+        stats = kb.stats(since=time.time() - args.days * 86400 if args.days else 0.0)
+        print(f"{stats['facts']} facts ({stats['fresh_facts']} fresh) about {stats['entities']} entities")
+        print(f"{stats['lookups']} planned searches looked up: coverage {stats['coverage']:.1%}, "
+              f"skipped {stats['skip_rate']:.1%}")
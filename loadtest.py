@@ -0,0 +1,156 @@
+"""
+Load test for api_server.py.
+
+Closed-loop clients at increasing concurrency send POST /research and read the SSE stream to the
+end. Reports requests/second, latency percentiles and time to first event per level, and the
+highest throughput whose p95 stays within the target.
+
+    python loadtest.py                              # starts a simulated server (API_SIMULATE=1)
+    python loadtest.py --url http://127.0.0.1:8000  # against a running server
+    python loadtest.py --target-p95 2 --duration 10 --levels 1 4 16 64
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List, NamedTuple, Optional
+from urllib.parse import urlparse
+
+
+class Sample(NamedTuple):
+    status: int
+    latency: float
+    first_event: Optional[float]
+    events: int
+
+
+async def post_sse(host: str, port: int, path: str, body: Dict) -> Sample:
+    """ POST a JSON body and read the event stream until the server closes it """
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection(host, port)
+    payload = json.dumps(body).encode()
+    writer.write(
+        f"POST {path} HTTP/1.1\r\nHost: {host}:{port}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(payload)}\r\nAccept: text/event-stream\r\nConnection: close\r\n\r\n".encode() + payload
+    )
+    await writer.drain()
+    status_line = await reader.readline()
+    status = int(status_line.split()[1]) if status_line else 0
+    while (await reader.readline()) not in (b"\r\n", b""):
+        pass
+    first_event, events = None, 0
+    while True:
+        chunk = await reader.read(65536)
+        if not chunk:
+            break
+        count = chunk.count(b"event: ")
+        if count and first_event is None:
+            first_event = time.perf_counter() - start
+        events += count
+    writer.close()
+    return Sample(status, time.perf_counter() - start, first_event, events)
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[int(p * (len(ordered) - 1))]
+
+
+async def run_level(host: str, port: int, concurrency: int, duration: float) -> Dict:
+    """ `concurrency` clients sending requests back to back for `duration` seconds """
+    samples: List[Sample] = []
+    deadline = time.perf_counter() + duration
+
+    async def client(n: int):
+        i = 0
+        while time.perf_counter() < deadline:
+            # Separate tenants so per-tenant budgets don't cap the test
+            body = {"feature_idea": f"load test idea {n}-{i}", "tenant": f"load-{concurrency}-{n}",
+                    "session": f"load-{concurrency}-{n}-{i}"}
+            try:
+                samples.append(await post_sse(host, port, "/research", body))
+            except OSError:
+                samples.append(Sample(0, 0.0, None, 0))
+            i += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client(n) for n in range(concurrency)])
+    wall = time.perf_counter() - start
+    ok = [s for s in samples if s.status == 200]
+    latencies = [s.latency for s in ok]
+    return {
+        "concurrency": concurrency,
+        "completed": len(ok),
+        "rejected": sum(1 for s in samples if s.status == 429),
+        "errors": sum(1 for s in samples if s.status not in (200, 429)),
+        "rps": len(ok) / wall,
+        "p50": percentile(latencies, 0.5),
+        "p95": percentile(latencies, 0.95),
+        "first_event_p95": percentile([s.first_event for s in ok if s.first_event is not None], 0.95),
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_port(host: str, port: int, timeout: float = 20) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server on {host}:{port} did not start")
+
+
+async def main(args) -> None:
+    server = None
+    if args.url:
+        parsed = urlparse(args.url)
+        host, port = parsed.hostname, parsed.port or 80
+    else:
+        host, port = "127.0.0.1", _free_port()
+        env = dict(os.environ, API_SIMULATE="1", TENANT_REQUEST_BUDGET="100000", SESSION_REQUEST_BUDGET="100000")
+        server = subprocess.Popen([sys.executable, "api_server.py", "--port", str(port)], env=env,
+                                  cwd=os.path.dirname(os.path.abspath(__file__)))
+        _wait_for_port(host, port)
+
+    try:
+        results = []
+        print(f"{'clients':>7} {'ok':>6} {'429':>5} {'err':>5} {'req/s':>8} {'p50':>7} {'p95':>7} {'1st evt p95':>12}")
+        for concurrency in args.levels:
+            row = await run_level(host, port, concurrency, args.duration)
+            results.append(row)
+            fmt = lambda v: f"{v:.2f}s" if v is not None else "-"
+            print(f"{row['concurrency']:>7} {row['completed']:>6} {row['rejected']:>5} {row['errors']:>5} "
+                  f"{row['rps']:>8.1f} {fmt(row['p50']):>7} {fmt(row['p95']):>7} {fmt(row['first_event_p95']):>12}")
+        within = [row for row in results if row["p95"] is not None and row["p95"] <= args.target_p95]
+        if within:
+            best = max(within, key=lambda row: row["rps"])
+            print(f"\n✅ {best['rps']:.1f} req/s at p95 {best['p95']:.2f}s <= {args.target_p95}s "
+                  f"({best['concurrency']} concurrent clients)")
+        else:
+            print(f"\n❌ No level kept p95 within {args.target_p95}s")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the research API")
+    parser.add_argument("--url", help="Running server, e.g. http://127.0.0.1:8000 (default: start a simulated one)")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 4, 16, 64, 128])
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per concurrency level")
+    parser.add_argument("--target-p95", type=float, default=1.5, help="p95 latency target in seconds")
+    asyncio.run(main(parser.parse_args()))
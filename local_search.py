@@ -0,0 +1,284 @@
+"""
+Local fetch-and-extract search backend.
+
+Alternative to the hosted WebSearchTool: finds candidate URLs on a search results page,
+fetches them concurrently over a pooled HTTP session, extracts the main content with
+BeautifulSoup and caches page bodies by URL and ETag.
+
+    python local_search.py     # throughput and per-page latency against a local stand-in
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, quote_plus, urljoin, urlparse
+
+import requests
+from bs4 import BeautifulSoup
+from pydantic import BaseModel, Field
+from requests.adapters import HTTPAdapter
+
+DEFAULT_SEARCH_URL = os.environ.get("LOCAL_SEARCH_URL", "https://html.duckduckgo.com/html/?q={query}")
+USER_AGENT = "Mozilla/5.0 (compatible; ProductMVPAssistant/1.0)"
+MAX_RESULTS = 5
+MAX_CONNECTIONS = 10
+REQUEST_TIMEOUT = 10
+MAX_PAGE_WORDS = 120        # words kept per page in the digest handed to the writer
+CACHE_SIZE = 500
+
+# Tags that never carry the main content of a page
+BOILERPLATE_TAGS = ["script", "style", "noscript", "nav", "header", "footer", "aside", "form", "svg", "iframe"]
+
+
+class PageResult(BaseModel):
+    url: str = Field(description="Fetched URL")
+    title: str = Field(default="", description="Page title")
+    text: str = Field(default="", description="Extracted main content")
+    status: int = Field(default=0, description="HTTP status, 0 if the fetch failed")
+    from_cache: bool = Field(default=False, description="Served from the local page cache (incl. 304 revalidation)")
+    latency: float = Field(default=0.0, description="Fetch + extract time in seconds")
+
+
+# ============================
+# Content extraction
+# ============================
+def extract_main_content(html: str) -> Tuple[str, str]:
+    """ Return (title, main text) of an HTML page, dropping navigation and other boilerplate """
+    soup = BeautifulSoup(html, "html.parser")
+    title = soup.title.get_text(strip=True) if soup.title else ""
+    for tag in soup(BOILERPLATE_TAGS):
+        tag.decompose()
+
+    root = soup.find("article") or soup.find("main") or soup.body or soup
+    blocks = []
+    for element in root.find_all(["h1", "h2", "h3", "p", "li"]):
+        text = " ".join(element.get_text(" ", strip=True).split())
+        # Short fragments are mostly menus, buttons and captions
+        if len(text) >= 40 or (element.name.startswith("h") and text):
+            blocks.append(text)
+    if not blocks:
+        blocks = [" ".join(root.get_text(" ", strip=True).split())]
+    return title, "\n".join(blocks)
+
+
+def parse_result_links(html: str, base_url: str, max_results: int = MAX_RESULTS) -> List[str]:
+    """ Pull result URLs out of a search results page (DuckDuckGo HTML layout) """
+    soup = BeautifulSoup(html, "html.parser")
+    links = soup.select("a.result__a") or soup.select("a[href]")
+    urls: List[str] = []
+    for link in links:
+        href = urljoin(base_url, link.get("href", ""))
+        # DuckDuckGo wraps results in a redirect: /l/?uddg=<target>
+        target = parse_qs(urlparse(href).query).get("uddg")
+        if target:
+            href = target[0]
+        if href.startswith("http") and href not in urls:
+            urls.append(href)
+        if len(urls) >= max_results:
+            break
+    return urls
+
+
+# ============================
+# Page cache
+# ============================
+class PageCache:
+    """ LRU cache of extracted pages keyed by URL, remembering ETag / Last-Modified for revalidation """
+
+    def __init__(self, max_size: int = CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None:
+                self._entries.move_to_end(url)
+            return entry
+
+    def put(self, url: str, title: str, text: str, etag: Optional[str], last_modified: Optional[str]) -> None:
+        with self._lock:
+            self._entries[url] = {"title": title, "text": text, "etag": etag, "last_modified": last_modified}
+            self._entries.move_to_end(url)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+# ============================
+# Backend
+# ============================
+class LocalSearchBackend:
+    """ Search -> concurrent fetch -> extract, on one pooled HTTP session """
+
+    def __init__(self, search_url: str = DEFAULT_SEARCH_URL, max_results: int = MAX_RESULTS,
+                 max_connections: int = MAX_CONNECTIONS, timeout: float = REQUEST_TIMEOUT,
+                 cache: Optional[PageCache] = None):
+        self.search_url = search_url
+        self.max_results = max_results
+        self.timeout = timeout
+        self.cache = cache or PageCache()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_connections, pool_maxsize=max_connections)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["User-Agent"] = USER_AGENT
+        # One thread per pooled connection; requests is blocking, the executor keeps it off the event loop
+        self._executor = ThreadPoolExecutor(max_workers=max_connections, thread_name_prefix="local-search")
+        self.page_latencies: List[float] = []
+        self.cache_hits = 0
+
+    def _fetch_sync(self, url: str) -> PageResult:
+        start = time.perf_counter()
+        cached = self.cache.get(url)
+        headers = {}
+        if cached and cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        elif cached and cached["last_modified"]:
+            headers["If-Modified-Since"] = cached["last_modified"]
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            print(f"Error fetching {url}: {e}")
+            return PageResult(url=url, latency=time.perf_counter() - start)
+
+        if response.status_code == 304 and cached:
+            self.cache_hits += 1
+            return PageResult(url=url, title=cached["title"], text=cached["text"], status=304,
+                              from_cache=True, latency=time.perf_counter() - start)
+        if response.status_code != 200 or "html" not in response.headers.get("Content-Type", "html"):
+            return PageResult(url=url, status=response.status_code, latency=time.perf_counter() - start)
+
+        title, text = extract_main_content(response.text)
+        self.cache.put(url, title, text, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        return PageResult(url=url, title=title, text=text, status=200, latency=time.perf_counter() - start)
+
+    async def fetch(self, url: str) -> PageResult:
+        """ Fetch and extract one page without blocking the event loop """
+        page = await asyncio.get_running_loop().run_in_executor(self._executor, self._fetch_sync, url)
+        self.page_latencies.append(page.latency)
+        return page
+
+    async def find_urls(self, query: str) -> List[str]:
+        """ Candidate URLs for a query from the configured results page """
+        url = self.search_url.format(query=quote_plus(query))
+        response = await asyncio.get_running_loop().run_in_executor(
+            self._executor, lambda: self.session.get(url, timeout=self.timeout))
+        response.raise_for_status()
+        return parse_result_links(response.text, url, self.max_results)
+
+    async def search(self, query: str) -> List[PageResult]:
+        """ Find candidate URLs and fetch them concurrently; pages that failed are dropped """
+        urls = await self.find_urls(query)
+        pages = await asyncio.gather(*[self.fetch(url) for url in urls])
+        return [page for page in pages if page.text]
+
+    def stats(self) -> Dict[str, float]:
+        latencies = sorted(self.page_latencies)
+        return {
+            "pages": len(latencies),
+            "cache_hits": self.cache_hits,
+            "p50_page_latency": latencies[len(latencies) // 2] if latencies else 0.0,
+            "p95_page_latency": latencies[int(0.95 * (len(latencies) - 1))] if latencies else 0.0,
+        }
+
+
+def format_pages(query: str, pages: List[PageResult], max_words: int = MAX_PAGE_WORDS) -> str:
+    """ Compact digest of extracted pages, in the shape the writer expects from a search result """
+    if not pages:
+        return f"No results found for: {query}"
+    parts = [f"Search term: {query}"]
+    for page in pages:
+        words = page.text.split()
+        snippet = " ".join(words[:max_words]) + (" ..." if len(words) > max_words else "")
+        parts.append(f"- {page.title or page.url} ({page.url}): {snippet}")
+    return "\n".join(parts)
+
+
+# ============================
+# Local HTTP stand-in
+# ============================
+class LocalHTTPStandIn:
+    """
+    Tiny threaded HTTP server serving a DuckDuckGo-style results page at /html/?q=...
+    and synthetic article pages with ETags, so the search step can run offline.
+
+        with LocalHTTPStandIn() as server:
+            backend = LocalSearchBackend(search_url=server.search_url)
+    """
+
+    def __init__(self, num_pages: int = MAX_RESULTS, delay: float = 0.0):
+        self.num_pages = num_pages
+        self.delay = delay
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                time.sleep(stand_in.delay)
+                path = urlparse(self.path)
+                if path.path.startswith("/html"):
+                    query = parse_qs(path.query).get("q", [""])[0]
+                    links = "".join(
+                        f'<a class="result__a" href="/l/?uddg={quote_plus(stand_in.base_url + f"/page/{quote_plus(query)}/{i}")}">{query} {i}</a>'
+                        for i in range(stand_in.num_pages)
+                    )
+                    return self._send(f"<html><body>{links}</body></html>")
+                etag = f'"{path.path}"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                body = (
+                    f"<html><head><title>Article {path.path}</title></head><body><nav>Home | About</nav>"
+                    f"<article><h1>Market notes {path.path}</h1>"
+                    + "".join(f"<p>Paragraph {i} of {path.path}: the market for this product category grew "
+                              f"steadily and competitors are adding similar capabilities.</p>" for i in range(8))
+                    + "</article><footer>Copyright</footer></body></html>"
+                )
+                self._send(body, etag)
+
+            def _send(self, body: str, etag: Optional[str] = None):
+                data = body.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                if etag:
+                    self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.search_url = self.base_url + "/html/?q={query}"
+
+    def __enter__(self) -> "LocalHTTPStandIn":
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    async def bench(num_queries: int = 20, delay: float = 0.05):
+        with LocalHTTPStandIn(delay=delay) as server:
+            backend = LocalSearchBackend(search_url=server.search_url)
+            for label in ("cold", "warm (ETag revalidation)"):
+                backend.page_latencies.clear()
+                start = time.perf_counter()
+                await asyncio.gather(*[backend.search(f"query {i}") for i in range(num_queries)])
+                wall = time.perf_counter() - start
+                stats = backend.stats()
+                print(f"{label:>26}: {stats['pages']} pages in {wall:.2f}s "
+                      f"({stats['pages'] / wall:.1f} pages/s), p50 {stats['p50_page_latency'] * 1000:.0f}ms, "
+                      f"p95 {stats['p95_page_latency'] * 1000:.0f}ms, cache hits {stats['cache_hits']}")
+
+    asyncio.run(bench())
@@ -0,0 +1,150 @@
+"""
+Per-session message store.
+
+One store per chat session replaces the parallel `messages` / `conversation_history` lists.
+Short messages are kept inline; large payloads (reports, feature definitions) are stored once,
+zlib-compressed and deduplicated by content hash, and referenced by id from every message that
+carries them. Messages are decompressed only when read, by the display view (a window of recent
+messages) or the prompt view (the history sent to an agent).
+"""
+import hashlib
+import sys
+import weakref
+import zlib
+from typing import Dict, Iterator, List, NamedTuple, Optional, Union
+
+COMPRESS_THRESHOLD = 1024   # characters; shorter messages aren't worth compressing
+COMPRESSION_LEVEL = 6
+
+
+class _Entry(NamedTuple):
+    id: str
+    role: str
+    text: Optional[str]     # inline content
+    blob: Optional[str]     # key into the blob table for large content
+
+
+def content_id(role: str, content: str) -> str:
+    return hashlib.sha1(f"{role}:{content}".encode()).hexdigest()[:16]
+
+
+_stores: "weakref.WeakSet[MessageStore]" = weakref.WeakSet()
+
+
+class MessageStore:
+    """
+    Append-only chat history that behaves like a list of {"id", "role", "content"} dicts
+    (len, indexing, slicing, iteration), so it can be passed wherever a history list was.
+    """
+
+    def __init__(self, compress_threshold: int = COMPRESS_THRESHOLD):
+        self.compress_threshold = compress_threshold
+        self._entries: List[_Entry] = []
+        self._blobs: Dict[str, bytes] = {}
+        self._raw_chars = 0
+        _stores.add(self)
+
+    def append(self, message: Dict) -> str:
+        """ list.append-compatible: add a {"role", "content"} message and return its id """
+        return self.add(message["role"], message["content"])
+
+    def add(self, role: str, content) -> str:
+        """ Add a message and return its id """
+        content = str(content)
+        msg_id = content_id(role, content)
+        self._raw_chars += len(content)
+        if len(content) < self.compress_threshold:
+            self._entries.append(_Entry(msg_id, role, content, None))
+            return msg_id
+        key = hashlib.sha1(content.encode()).hexdigest()[:16]
+        if key not in self._blobs:
+            self._blobs[key] = zlib.compress(content.encode(), COMPRESSION_LEVEL)
+        self._entries.append(_Entry(msg_id, role, None, key))
+        return msg_id
+
+    def clear(self) -> None:
+        self._entries = []
+        self._blobs = {}
+        self._raw_chars = 0
+
+    def _message(self, entry: _Entry) -> Dict[str, str]:
+        content = entry.text if entry.blob is None else zlib.decompress(self._blobs[entry.blob]).decode()
+        return {"id": entry.id, "role": entry.role, "content": content}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return [self._message(entry) for entry in self._entries[index]]
+        return self._message(self._entries[index])
+
+    def __iter__(self) -> Iterator[Dict[str, str]]:
+        for entry in self._entries:
+            yield self._message(entry)
+
+    def __add__(self, other: List[Dict]) -> List[Dict]:
+        return list(self) + list(other)
+
+    def role(self, index: int) -> str:
+        """ Role of a message without decompressing it """
+        return self._entries[index].role
+
+    def memory(self) -> Dict[str, int]:
+        """ Approximate bytes held by this store vs the same history kept as two plain lists """
+        inline = sum(sys.getsizeof(entry.text) for entry in self._entries if entry.text is not None)
+        blobs = sum(sys.getsizeof(blob) for blob in self._blobs.values())
+        overhead = sys.getsizeof(self._entries) + len(self._entries) * sys.getsizeof(("", "", None, None))
+        total = inline + blobs + overhead
+        return {
+            "messages": len(self._entries),
+            "blobs": len(self._blobs),
+            "raw_chars": self._raw_chars,
+            "bytes": total,
+            # Two dict-per-message lists holding every string (the previous layout)
+            "two_list_bytes": 2 * (self._raw_chars + len(self._entries) * (sys.getsizeof("") + sys.getsizeof({}))),
+        }
+
+
+def sessions_memory() -> Dict[str, float]:
+    """ Memory of all live stores in this process, for sizing sessions per container """
+    reports = [store.memory() for store in list(_stores)]
+    total = sum(report["bytes"] for report in reports)
+    return {
+        "sessions": len(reports),
+        "total_bytes": total,
+        "mean_bytes": total / len(reports) if reports else 0,
+        "two_list_bytes": sum(report["two_list_bytes"] for report in reports),
+    }
+
+
+def format_bytes(size: float) -> str:
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f}{unit}"
+        size /= 1024
+    return f"{size:.1f}GB"
+
+
+if __name__ == "__main__":
+    import random
+
+    random.seed(0)
+    words = ("market users teams pricing competitors growth meeting notes summary adoption enterprise "
+             "integration latency accuracy compliance revenue churn onboarding workflow feedback").split()
+
+    def report(turn: int) -> str:
+        return "# Product Feature Analysis\n\n" + "\n\n".join(
+            f"## Section {i}\n\n" + " ".join(random.choice(words) for _ in range(250)) for i in range(9))
+
+    store = MessageStore()
+    final_report = report(0)
+    for turn in range(20):
+        store.add("user", f"Follow-up question {turn}")
+        # Every other answer repeats the final report, as the research tool output does
+        store.add("assistant", final_report if turn % 2 else report(turn))
+    memory = store.memory()
+    print(f"{memory['messages']} messages, {memory['raw_chars']:,} chars, {memory['blobs']} stored payloads")
+    print(f"single compressed store: {format_bytes(memory['bytes'])}, "
+          f"two plain lists: {format_bytes(memory['two_list_bytes'])} "
+          f"({memory['two_list_bytes'] / memory['bytes']:.0f}x)")
@@ -0,0 +1,292 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from agents import RunHooks, Runner
+from agents.exceptions import MaxTurnsExceeded
+from pydantic import BaseModel, Field
+
+from admission import controller as admission
+from cancellation import check_cancelled, current_token, record_interrupted_call
+from partial_json import run_streamed_fields
+from structured_repair import OutputRepairNeeded, RepairedResult, repair_mode
+from tracing_setup import configure_tracing
+
+# TRACE_MODE / TRACE_EXPORTER: sampled export by default
+configure_tracing()
+
+# Default SDK model, used for stages that never pinned a model
+SDK_DEFAULT_MODEL = "gpt-4.1"
+
+# Approximate USD per 1M tokens (input, output) used for cost accounting
+MODEL_COSTS = {
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+}
+
+HISTORY_SIZE = 50          # samples kept per (stage, model)
+MIN_SAMPLES = 5            # don't judge a model on fewer samples than this
+SAMPLE_TTL = float(os.environ.get("ROUTER_SAMPLE_TTL", "600"))   # seconds a latency/error sample counts
+PROBE_INTERVAL = float(os.environ.get("ROUTER_PROBE_INTERVAL", "60"))  # an avoided model gets a call this often
+ERROR_RATE_LIMIT = 0.3     # fall back when more than this share of recent calls failed
+DECISION_LOG_SIZE = 500
+
+
+# ----------------------------
+# Stage configuration
+# ----------------------------
+class StageRoute(BaseModel):
+    models: List[str] = Field(description="Candidate models in preference order; the first is the primary")
+    latency_slo: float = Field(description="p90 latency budget in seconds before falling back")
+    critical: bool = Field(default=True, description="Critical stages keep their primary in the fast profile")
+    fast_model: Optional[str] = Field(default=None, description="Model used by the fast profile for non-critical stages")
+
+
+STAGE_ROUTES: Dict[str, StageRoute] = {
+    "planner": StageRoute(models=["gpt-4o-mini", "gpt-4.1-mini"], latency_slo=15, critical=False, fast_model="gpt-4.1-nano"),
+    # Already on the cheapest model that supports the hosted web search tool, so no fast_model
+    "search": StageRoute(models=["gpt-4o-mini", "gpt-4.1-mini"], latency_slo=30, critical=False),
+    "writer": StageRoute(models=["gpt-4o-mini", "gpt-4.1-mini"], latency_slo=120),
+    "report_outline": StageRoute(models=["gpt-4o-mini", "gpt-4.1-mini"], latency_slo=20, critical=False, fast_model="gpt-4.1-nano"),
+    "report_section": StageRoute(models=["gpt-4o-mini", "gpt-4.1-mini"], latency_slo=45),
+    "report_summary": StageRoute(models=["gpt-4o-mini", "gpt-4.1-mini"], latency_slo=20, critical=False, fast_model="gpt-4.1-nano"),
+    "email": StageRoute(models=["gpt-4o-mini", "gpt-4.1-nano"], latency_slo=30, critical=False, fast_model="gpt-4.1-nano"),
+    "clarifier": StageRoute(models=["gpt-4o-mini", "gpt-4.1-mini"], latency_slo=10, critical=False, fast_model="gpt-4.1-nano"),
+    "query_processor": StageRoute(models=["gpt-4o-mini", "gpt-4.1-mini"], latency_slo=10, critical=False, fast_model="gpt-4.1-nano"),
+    "feature_creator": StageRoute(models=[SDK_DEFAULT_MODEL, "gpt-4o"], latency_slo=90),
+    "feature_outline": StageRoute(models=[SDK_DEFAULT_MODEL, "gpt-4o"], latency_slo=30),
+    "core_feature": StageRoute(models=[SDK_DEFAULT_MODEL, "gpt-4o"], latency_slo=45),
+    "feature_evaluator": StageRoute(models=[SDK_DEFAULT_MODEL, "gpt-4.1-mini"], latency_slo=60, critical=False, fast_model="gpt-4.1-mini"),
+    "feature_conversation": StageRoute(models=[SDK_DEFAULT_MODEL, "gpt-4o"], latency_slo=240),
+    "research_agent": StageRoute(models=[SDK_DEFAULT_MODEL, "gpt-4o"], latency_slo=300),
+    "output_repair": StageRoute(models=["gpt-4.1-mini", "gpt-4o-mini"], latency_slo=30, critical=False, fast_model="gpt-4.1-nano"),
+}
+
+
+class RoutingDecision(BaseModel):
+    timestamp: float = Field(default_factory=time.time)
+    stage: str
+    model: str
+    reason: str = Field(description="primary, fast_profile, latency_slo, error_rate or retry_after_error")
+    p90_latency: Optional[float] = None
+    error_rate: Optional[float] = None
+
+
+class _ModelStats:
+    """
+    Rolling latency / error / cost history for one model serving one stage. Samples older than
+    SAMPLE_TTL no longer count, so a model avoided after a bad spell is judged afresh.
+    """
+
+    def __init__(self):
+        self.latencies: Deque[Tuple[float, float]] = deque(maxlen=HISTORY_SIZE)   # (time, seconds)
+        self.errors: Deque[Tuple[float, bool]] = deque(maxlen=HISTORY_SIZE)       # (time, failed)
+        self.calls = 0
+        self.cost = 0.0
+        self.tokens = 0
+        self.last_call = 0.0        # last time the model was chosen, including probes
+
+    @staticmethod
+    def _recent(samples: Deque) -> List:
+        cutoff = time.time() - SAMPLE_TTL
+        return [value for at, value in samples if at >= cutoff]
+
+    def p90(self) -> Optional[float]:
+        latencies = self._recent(self.latencies)
+        if len(latencies) < MIN_SAMPLES:
+            return None
+        ordered = sorted(latencies)
+        return ordered[int(0.9 * (len(ordered) - 1))]
+
+    def error_rate(self) -> Optional[float]:
+        errors = self._recent(self.errors)
+        if len(errors) < MIN_SAMPLES:
+            return None
+        return sum(errors) / len(errors)
+
+
+# ============================
+# Router
+# ============================
+class ModelRouter:
+    """
+    Picks a model per stage from STAGE_ROUTES.
+    The primary is used unless its recent p90 latency breaks the stage SLO or its error rate spikes,
+    in which case the next healthy candidate is used. The "fast" profile downgrades non-critical stages.
+    History is kept per (stage, model): a model slow on long writer calls can still serve short stages.
+    An avoided model gets a probe call every PROBE_INTERVAL seconds, so it is used again once it recovers.
+    """
+
+    def __init__(self, routes: Dict[str, StageRoute] = None, profile: str = None):
+        self.routes = routes or STAGE_ROUTES
+        self.profile = profile or os.environ.get("MODEL_PROFILE", "default")
+        self.stats: Dict[Tuple[str, str], _ModelStats] = {}
+        self.decisions: Deque[RoutingDecision] = deque(maxlen=DECISION_LOG_SIZE)
+
+    def _stats(self, stage: str, model: str) -> _ModelStats:
+        return self.stats.setdefault((stage, model), _ModelStats())
+
+    def _unhealthy_reason(self, stage: str, model: str, route: StageRoute) -> Optional[str]:
+        stats = self._stats(stage, model)
+        p90 = stats.p90()
+        if p90 is not None and p90 > route.latency_slo:
+            return "latency_slo"
+        error_rate = stats.error_rate()
+        if error_rate is not None and error_rate > ERROR_RATE_LIMIT:
+            return "error_rate"
+        return None
+
+    def default_model(self, stage: str) -> str:
+        """ Static model for a stage, used when agents are constructed """
+        return self.routes[stage].models[0]
+
+    def choose(self, stage: str, exclude: Optional[List[str]] = None) -> str:
+        """ Pick the model for the next call of this stage and log the decision """
+        route = self.routes[stage]
+        exclude = exclude or []
+
+        if self.profile == "fast" and not route.critical and route.fast_model and route.fast_model not in exclude:
+            return self._log(stage, route.fast_model, "fast_profile")
+
+        candidates = [m for m in route.models if m not in exclude] or route.models
+        reason = "retry_after_error" if exclude else "primary"
+        for model in candidates:
+            unhealthy = self._unhealthy_reason(stage, model, route)
+            if unhealthy is None:
+                return self._log(stage, model, reason)
+            if time.time() - self._stats(stage, model).last_call >= PROBE_INTERVAL:
+                # Without calls an avoided model gets no new samples; probe it to see if it recovered
+                return self._log(stage, model, "probe")
+            reason = unhealthy
+        # Every candidate is unhealthy: use the one with the lowest recent p90
+        model = min(candidates, key=lambda m: self._stats(stage, m).p90() or 0.0)
+        return self._log(stage, model, reason)
+
+    def record(self, stage: str, model: str, latency: float, error: bool = False,
+               input_tokens: int = 0, output_tokens: int = 0) -> None:
+        """ Record the outcome of one call """
+        stats = self._stats(stage, model)
+        now = time.time()
+        stats.latencies.append((now, latency))
+        stats.errors.append((now, error))
+        stats.calls += 1
+        stats.tokens += input_tokens + output_tokens
+        input_cost, output_cost = MODEL_COSTS.get(model, (0.0, 0.0))
+        stats.cost += (input_tokens * input_cost + output_tokens * output_cost) / 1_000_000
+
+    def _log(self, stage: str, model: str, reason: str) -> str:
+        stats = self._stats(stage, model)
+        stats.last_call = time.time()
+        decision = RoutingDecision(stage=stage, model=model, reason=reason,
+                                   p90_latency=stats.p90(), error_rate=stats.error_rate())
+        self.decisions.append(decision)
+        if reason != "primary":
+            print(f"🔀 Routing {stage} -> {model} ({reason})")
+        return model
+
+    def report(self) -> Dict[str, Dict]:
+        """ Per-model calls and cost, with recent latency and error rate per stage """
+        report: Dict[str, Dict] = {}
+        for (stage, model), stats in self.stats.items():
+            entry = report.setdefault(model, {"calls": 0, "tokens": 0, "cost_usd": 0.0, "stages": {}})
+            entry["calls"] += stats.calls
+            entry["tokens"] += stats.tokens
+            entry["cost_usd"] = round(entry["cost_usd"] + stats.cost, 4)
+            entry["stages"][stage] = {"calls": stats.calls, "p90_latency": stats.p90(),
+                                      "error_rate": stats.error_rate()}
+        return report
+
+
+router = ModelRouter()
+
+
+def stage_model(stage: str) -> str:
+    """ Model an agent for this stage should be constructed with """
+    return router.default_model(stage)
+
+
+class _ToolCallWatch(RunHooks):
+    """ Notes whether a run got as far as calling one of its agent's tools or handing off """
+
+    def __init__(self):
+        self.started = False
+
+    async def on_tool_start(self, context, agent, tool) -> None:
+        self.started = True
+
+    async def on_handoff(self, context, from_agent, to_agent) -> None:
+        self.started = True
+
+
+async def run_stage(stage: str, agent, input, on_field=None, **kwargs):
+    """
+    Runner.run through the router: picks the model for the stage, records latency, tokens and errors,
+    and retries once on the next candidate model if the call fails before any tool ran (a retry starts
+    the agent from scratch, so tools with side effects would run twice). Tokens are also charged to the
+    admission ticket of the request the call runs under.
+    A structured output that could not be repaired locally gets one repair call for its broken fields.
+    With on_field, the run is streamed and on_field gets each structured-output field as it closes.
+    No call is started for a request whose cancel token (see cancellation.py) is cancelled.
+    """
+    tried: List[str] = []
+    while True:
+        check_cancelled()
+        model = router.choose(stage, exclude=tried)
+        routed_agent = agent if agent.model == model else agent.clone(model=model)
+        tool_calls = _ToolCallWatch()
+        start = time.perf_counter()
+        admission.call_started()
+        try:
+            if on_field is not None:
+                result = await run_streamed_fields(routed_agent, input, on_field, hooks=tool_calls, **kwargs)
+            else:
+                result = await Runner.run(routed_agent, input, hooks=tool_calls, **kwargs)
+        except MaxTurnsExceeded:
+            # Not a model fault; retrying on another model would just repeat the same turns
+            admission.call_finished()
+            router.record(stage, model, time.perf_counter() - start)
+            raise
+        except OutputRepairNeeded as e:
+            # The model answered, just not in shape: fix the broken fields instead of rerunning the stage
+            usage = e.run_data.context_wrapper.usage if e.run_data is not None else None
+            tokens = (usage.input_tokens, usage.output_tokens) if usage is not None else (0, 0)
+            admission.call_finished(tokens=sum(tokens))
+            router.record(stage, model, time.perf_counter() - start, error=True,
+                          input_tokens=tokens[0], output_tokens=tokens[1])
+            if stage == "output_repair" or repair_mode() != "1":
+                raise
+            return await repair_stage_output(stage, e, run_config=kwargs.get("run_config"))
+        except Exception:
+            admission.call_finished()
+            router.record(stage, model, time.perf_counter() - start, error=True)
+            tried.append(model)
+            # e.g. the research agent's research tool already ran a whole research pipeline
+            if tool_calls.started or len(tried) >= 2 or len(router.routes[stage].models) < 2:
+                raise
+            continue
+        except BaseException as e:
+            admission.call_finished()
+            if isinstance(e, asyncio.CancelledError):
+                record_interrupted_call()
+            raise
+        usage = result.context_wrapper.usage
+        admission.call_finished(tokens=usage.input_tokens + usage.output_tokens)
+        cancel_token = current_token()
+        if cancel_token is not None:
+            cancel_token.tokens_spent += usage.input_tokens + usage.output_tokens
+        router.record(stage, model, time.perf_counter() - start,
+                      input_tokens=usage.input_tokens, output_tokens=usage.output_tokens)
+        return result
+
+
+async def repair_stage_output(stage: str, failure: OutputRepairNeeded, run_config=None) -> RepairedResult:
+    """ Regenerate only the fields of a stage's output that local repair could not fix """
+    print(f"🩹 Repairing {failure.model.__name__} fields from {stage}: {', '.join(failure.outcome.invalid)}")
+    result = await run_stage("output_repair", failure.repair_agent(stage_model("output_repair")),
+                             failure.repair_input(), run_config=run_config)
+    return RepairedResult(failure.merge(result.final_output), result.context_wrapper)
@@ -0,0 +1,204 @@
+"""
+Incremental, tolerant JSON parsing for structured outputs that are still being generated.
+
+StreamingJSONParser is fed text deltas and reports every top-level field and every item of a
+top-level list as soon as it closes, e.g. ('feature_name',) then ('core_features', 0), so a UI can
+render a FeatureDefinition field by field. parse_partial() turns an unfinished JSON text into the
+largest valid object it can.
+"""
+import json
+from typing import Any, Callable, List, NamedTuple, Optional, Tuple
+
+from agents import Runner
+
+# Report values up to this depth: 1 = top-level fields, 2 = items of top-level lists/objects
+MAX_EVENT_DEPTH = 2
+
+
+class FieldEvent(NamedTuple):
+    path: Tuple  # e.g. ("feature_name",) or ("core_features", 0)
+    value: Any
+
+
+class _Frame:
+    __slots__ = ("kind", "start", "key", "index", "expect_key", "value_start")
+
+    def __init__(self, kind: str, start: int):
+        self.kind = kind            # "{" or "["
+        self.start = start
+        self.key = None
+        self.index = 0
+        self.expect_key = kind == "{"
+        self.value_start: Optional[int] = None
+
+
+class StreamingJSONParser:
+    """ Feed text deltas, get FieldEvents for values that have closed """
+
+    def __init__(self, max_depth: int = MAX_EVENT_DEPTH):
+        self.max_depth = max_depth
+        self.buffer = ""
+        self.done = False
+        self._stack: List[_Frame] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._events: List[FieldEvent] = []
+
+    def feed(self, delta: str) -> List[FieldEvent]:
+        """ Append a chunk of generated text; returns the fields completed by it """
+        start = len(self.buffer)
+        self.buffer += delta
+        self._events = []
+        self._scan(start)
+        return self._events
+
+    def _scan(self, start: int) -> None:
+        buf = self.buffer
+        for i in range(start, len(buf)):
+            if self.done:
+                return
+            ch = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._close_string(i)
+                continue
+
+            top = self._stack[-1] if self._stack else None
+            if top is None:
+                # Skip anything before the root object (code fences, preamble)
+                if ch in "{[":
+                    self._stack.append(_Frame(ch, i))
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+                if not (top.kind == "{" and top.expect_key) and top.value_start is None:
+                    top.value_start = i
+            elif ch in "{[":
+                if top.value_start is None:
+                    top.value_start = i
+                self._stack.append(_Frame(ch, i))
+            elif ch in "}]":
+                self._finish_scalar(i)
+                frame = self._stack.pop()
+                if self._stack:
+                    self._value_done(frame.start, i + 1)
+                else:
+                    self.done = True
+            elif ch == ":":
+                top.expect_key = False
+            elif ch == ",":
+                self._finish_scalar(i)
+                if top.kind == "{":
+                    top.expect_key = True
+                    top.key = None
+                else:
+                    top.index += 1
+                top.value_start = None
+            elif not ch.isspace() and top.value_start is None and not (top.kind == "{" and top.expect_key):
+                top.value_start = i
+
+    def _close_string(self, end: int) -> None:
+        top = self._stack[-1]
+        text = self.buffer[self._string_start:end + 1]
+        if top.kind == "{" and top.expect_key:
+            top.key = json.loads(text)
+        else:
+            self._value_done(self._string_start, end + 1)
+
+    def _finish_scalar(self, end: int) -> None:
+        top = self._stack[-1]
+        if top.value_start is not None and self.buffer[top.value_start] not in '"{[':
+            self._value_done(top.value_start, end)
+
+    def _value_done(self, start: int, end: int) -> None:
+        top = self._stack[-1]
+        top.value_start = None
+        if len(self._stack) > self.max_depth:
+            return
+        try:
+            value = json.loads(self.buffer[start:end])
+        except json.JSONDecodeError:
+            return
+        path = tuple(frame.key if frame.kind == "{" else frame.index for frame in self._stack)
+        self._events.append(FieldEvent(path, value))
+
+
+def _close_open_json(text: str) -> str:
+    """ Close an unfinished string and any open containers; drop a dangling key or separator """
+    stack = []
+    in_string = escape = False
+    for ch in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+    if in_string:
+        # A cut right after a backslash would escape the closing quote
+        text = (text[:-1] if escape else text) + '"'
+    text = text.rstrip()
+    while text and text[-1] in ",:":
+        text = text[:-1].rstrip()
+    return text + "".join(reversed(stack))
+
+
+def parse_partial(text: str, max_attempts: int = 50) -> Optional[Any]:
+    """
+    Best-effort parse of truncated JSON. Closes what is open and, if that is still invalid,
+    backs off to the previous separator. Returns None if nothing usable is found.
+    """
+    start = min([i for i in (text.find("{"), text.find("[")) if i >= 0], default=-1)
+    if start < 0:
+        return None
+    candidate = text[start:]
+    for _ in range(max_attempts):
+        try:
+            return json.loads(_close_open_json(candidate))
+        except json.JSONDecodeError:
+            pass
+        cut = max(candidate.rfind(","), candidate.rfind("{", 0, len(candidate) - 1), candidate.rfind("[", 0, len(candidate) - 1))
+        if cut <= 0:
+            return None
+        candidate = candidate[:cut] if candidate[cut] == "," else candidate[:cut + 1]
+    return None
+
+
+def stream_text_deltas(event) -> Optional[str]:
+    """ Output text delta carried by an Agents SDK stream event, if any """
+    if getattr(event, "type", None) != "raw_response_event":
+        return None
+    data = event.data
+    if getattr(data, "type", None) == "response.output_text.delta":
+        return data.delta
+    return None
+
+
+async def run_streamed_fields(agent, input, on_field: Callable[[FieldEvent], Any], **kwargs):
+    """
+    Runner.run_streamed for an agent with a structured output_type, calling on_field for each
+    field as it closes. Returns the finished RunResultStreaming.
+    """
+    parser = StreamingJSONParser()
+    result = Runner.run_streamed(agent, input, **kwargs)
+    async for event in result.stream_events():
+        delta = stream_text_deltas(event)
+        if delta:
+            for field in parser.feed(delta):
+                on_field(field)
+    return result
@@ -1,5 +1,7 @@
 from pydantic import BaseModel, Field
 from agents import Agent
+from model_router import stage_model
+from structured_repair import TolerantOutputSchema
 
 HOW_MANY_SEARCHES = 5
 
@@ -18,6 +20,6 @@ class WebSearchPlan(BaseModel):
 planner_agent = Agent(
     name="PlannerAgent",
     instructions=INSTRUCTIONS,
-    model="gpt-4o-mini",
-    output_type=WebSearchPlan,
+    model=stage_model("planner"),
+    output_type=TolerantOutputSchema(WebSearchPlan),
 )
\ No newline at end of file
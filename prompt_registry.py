@@ -0,0 +1,367 @@
+"""
+Central registry of the prompts sent to every agent.
+
+Each template has a static part that never changes between calls and a variable part that is
+appended after it, so the agent instructions plus the static part form a stable prefix that the
+provider's prompt cache can reuse. Token counts of the static parts are precomputed.
+
+    python prompt_registry.py            # cacheable-prefix report per stage
+    python prompt_registry.py --check    # fail if a prompt edit broke prefix stability
+    python prompt_registry.py --update   # accept the current static prefixes into the lock file
+"""
+import hashlib
+import json
+import os
+import string
+import sys
+from typing import Dict, List, Optional
+
+# Handle optional tiktoken dependency
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("o200k_base")
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    _ENCODING = None
+    TIKTOKEN_AVAILABLE = False
+
+LOCK_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompt_registry.lock.json")
+
+# OpenAI only caches prompts of at least this many tokens
+MIN_CACHEABLE_TOKENS = 1024
+
+
+def count_tokens(text: str) -> int:
+    """ Token count with tiktoken, or a ~4 characters per token estimate without it """
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return max(1, len(text) // 4) if text else 0
+
+
+class PromptTemplate:
+    """ A versioned prompt: static text first, then the variable part rendered with str.format """
+
+    def __init__(self, name: str, stage: str, version: int, static: str, variable: str):
+        self.name = name
+        self.stage = stage
+        self.version = version
+        self.static = static
+        self.variable = variable
+        self.fields = [field for _, field, _, _ in string.Formatter().parse(variable) if field]
+        self.static_tokens = count_tokens(static)
+        self.static_hash = hashlib.sha256(static.encode()).hexdigest()[:16]
+
+    def render(self, **values) -> str:
+        return self.static + self.variable.format(**values)
+
+
+PROMPTS: Dict[str, PromptTemplate] = {}
+
+
+def register(name: str, stage: str, version: int, static: str, variable: str) -> PromptTemplate:
+    if "{" in static or "}" in static:
+        raise ValueError(f"Prompt {name}: static part must not contain placeholders")
+    PROMPTS[name] = PromptTemplate(name, stage, version, static, variable)
+    return PROMPTS[name]
+
+
+def render(name: str, **values) -> str:
+    """ Render a registered prompt """
+    return PROMPTS[name].render(**values)
+
+
+# ============================
+# Research pipeline prompts
+# ============================
+register(
+    "planner.query", stage="planner", version=2,
+    static="Focus on market research, competitive analysis, user research, and technical feasibility.\n\n",
+    variable="Product Feature Analysis Query: {query}",
+)
+
+register(
+    "search.item", stage="search", version=1,
+    static="",
+    variable="Search term: {query}\nReason for searching: {reason}",
+)
+
+register(
+    "writer.report", stage="writer", version=2,
+    static="""
+        Create a comprehensive product analysis report including:
+        1. Executive Summary
+        2. Market Opportunity Assessment
+        3. Technical Feasibility Analysis
+        4. Business Impact and ROI
+        5. Competitive Analysis
+        6. Recommended MVP Scope
+        7. Implementation Roadmap
+        8. Risk Assessment
+        9. Next Steps and Recommendations
+        """,
+    variable="""
+        Product Feature Analysis Report for: {feature_idea}
+
+        Market Research Results: {search_results}
+        Technical Analysis: {technical_analysis}
+        Business Analysis: {business_analysis}
+        """,
+)
+
+register(
+    "writer.outline", stage="report_outline", version=1,
+    static="",
+    variable="""
+        Sections: {sections}
+
+        Product Feature Analysis Report for: {feature_idea}
+
+        Market Research Results: {search_results}
+        Technical Analysis: {technical_analysis}
+        Business Analysis: {business_analysis}
+        """,
+)
+
+register(
+    "writer.section", stage="report_section", version=1,
+    static="",
+    variable="""
+        Product Feature Analysis Report for: {feature_idea}
+
+        Section: {title}
+        Key points: {key_points}
+
+        Relevant research: {evidence}
+        """,
+)
+
+# ============================
+# Clarifier prompts
+# ============================
+register(
+    "clarifier.questions", stage="clarifier", version=1,
+    static="Generate exactly 3 clarifying questions for this research query: ",
+    variable="{query}",
+)
+
+register(
+    "clarifier.mvp_questions", stage="clarifier", version=2,
+    static="""
+    Generate exactly 5 clarifying questions for MVP development.
+
+    Focus on these areas:
+    1. Target users and problem definition
+    2. Core features and capabilities
+    3. Competitive landscape and differentiation
+    4. Success metrics and KPIs
+    5. Technical constraints and timeline
+
+    Generate questions that will help create a comprehensive MVP definition, based on:
+    """,
+    variable="""
+    Research Context: {research_context}
+    User Input: {user_input}
+    """,
+)
+
+register(
+    "query_processor.answers", stage="query_processor", version=2,
+    static="Create a clarified query from the original query and the user's answers below.\n\n",
+    variable="Original query: '{query}'\nUser answers:\n{answers}",
+)
+
+# ============================
+# Conversation prompts
+# ============================
+# History is append-only, so each turn's prompt extends the previous one and stays cacheable
+register(
+    "conversation.feature", stage="feature_conversation", version=1,
+    static="Complete Conversation History:\n",
+    variable="{history}\nCurrent user message: {message}",
+)
+
+register(
+    "conversation.research", stage="research_agent", version=1,
+    static="Conversation History:\n",
+    variable="{history}\nCurrent user message: {message}",
+)
+
+
+# Context first: the concurrent core-feature calls of one draft share everything but the assignment
+register(
+    "feature.core", stage="core_feature", version=1,
+    static="",
+    variable="{context}\n\nFeature outline:\n{outline}\nWrite core feature {number}: {title}",
+)
+
+
+# Instructions of the research agent of both front-ends (app.py, deep_research.py). They live here so
+# the prefix check reads them without running either UI script.
+RESEARCH_AGENT_INSTRUCTIONS = """
+You are Alex, a senior Product Manager specializing in research and initial product assessment.
+
+YOUR ROLE:
+- Greet users and understand their product ideas
+- Assess if research is needed and conduct it when appropriate
+- Handoff to MVP development when research is complete
+
+CONVERSATION FLOW:
+1. GREETING: Welcome users and ask about their product ideas
+2. RESEARCH ASSESSMENT: Determine if research is needed
+   - If user wants research: Use research_report tool to conduct comprehensive market research
+   - If user provides research: Accept and summarize their research
+   - If no research needed: Proceed directly to handoff
+3. HANDOFF: When research is complete, ask "Are you ready to proceed to feature development?" and wait for user confirmation before saying "Ready for MVP development"
+
+TOOL USAGE:
+- research_report: Use when user wants market research or when you determine research is needed
+
+CONVERSATION STYLE:
+- Be conversational, professional, and context-aware
+- Focus on research phase only
+- When research is complete, clearly indicate readiness for MVP development
+- Don't handle MVP questions - handoff to MVP agent
+
+HANDOFF CRITERIA:
+- Research is complete (either automatic or user-provided)
+- User explicitly confirms they are ready for feature development
+- Only after user confirmation, say "Ready for MVP development" to trigger handoff
+"""
+
+
+def format_history(history: List[dict]) -> str:
+    """ One 'role: content' line per message, as used by the conversation prompts """
+    return "".join(f"{msg['role']}: {msg['content']}\n" for msg in history)
+
+
+# ============================
+# Reporting and regression check
+# ============================
+# Stage -> "module:agent" whose instructions precede the prompt (or "module:CONSTANT" holding them)
+STAGE_AGENTS = {
+    "planner": "planner_agent:planner_agent",
+    "search": "search_agent:search_agent",
+    "writer": "writer_agent:writer_agent",
+    "report_outline": "writer_agent:outline_agent",
+    "report_section": "writer_agent:section_writer_agent",
+    "report_summary": "writer_agent:report_summary_agent",
+    "clarifier": "query_clarifying_agent:clarifier",
+    "query_processor": "query_clarifying_agent:query_processor",
+    "feature_conversation": "feature_agent:feature_conversation_agent",
+    "feature_creator": "feature_agent:feature_creator_agent",
+    "feature_outline": "feature_agent:feature_outline_agent",
+    "core_feature": "feature_agent:core_feature_agent",
+    "feature_evaluator": "feature_agent:feature_evaluator_agent",
+    "research_agent": "prompt_registry:RESEARCH_AGENT_INSTRUCTIONS",
+}
+
+# Rough size of the variable part in a typical call, for the cacheable-ratio estimate
+TYPICAL_VARIABLE_TOKENS = {
+    "planner": 40, "search": 30, "writer": 2500, "report_outline": 2500, "report_section": 800,
+    "report_summary": 3000, "clarifier": 40, "query_processor": 150, "feature_conversation": 4000,
+    "research_agent": 1500, "feature_creator": 4000, "feature_evaluator": 1500, "feature_outline": 4000,
+    "core_feature": 4000,
+}
+
+
+def _agent_instructions(stage: str) -> Optional[str]:
+    """ Instructions of the stage's agent: "" when it has none, None when they could not be loaded """
+    target = STAGE_AGENTS.get(stage)
+    if target is None:
+        return ""
+    module_name, attr = target.split(":")
+    try:
+        module = __import__(module_name)
+        target = getattr(module, attr)
+        instructions = target if isinstance(target, str) else target.instructions
+        return instructions if isinstance(instructions, str) else ""
+    except Exception as e:
+        print(f"⚠️  Could not load instructions for {stage}: {e}")
+        return None
+
+
+def prefix_report() -> List[Dict]:
+    """ Cacheable-prefix tokens and ratio for every registered prompt """
+    rows = []
+    # Tool agents are prompted by the conversation agent, so only their instructions are ours
+    templated_stages = {template.stage for template in PROMPTS.values()}
+    entries = [(t.name, t.stage, t.version, t.static_tokens) for t in PROMPTS.values()]
+    entries += [(f"{stage} (instructions)", stage, 0, 0) for stage in STAGE_AGENTS if stage not in templated_stages]
+    for name, stage, version, static_tokens in entries:
+        instruction_tokens = count_tokens(_agent_instructions(stage) or "")
+        prefix = instruction_tokens + static_tokens
+        total = prefix + TYPICAL_VARIABLE_TOKENS.get(stage, 100)
+        rows.append({
+            "prompt": name,
+            "stage": stage,
+            "version": version,
+            "prefix_tokens": prefix,
+            "total_tokens": total,
+            "cacheable_ratio": prefix / total,
+            "cache_eligible": prefix >= MIN_CACHEABLE_TOKENS,
+        })
+    return rows
+
+
+def check_prefix_stability(update: bool = False) -> List[str]:
+    """
+    Compare cached prefixes with the lock file. A static part that changed without a version bump,
+    a template whose rendering doesn't start with its static part, or agent instructions (the start
+    of every prefix of their stage) that changed since the last --update are reported as problems.
+    """
+    problems = []
+    locked = {}
+    if os.path.exists(LOCK_FILE):
+        with open(LOCK_FILE) as f:
+            locked = json.load(f)
+
+    for template in PROMPTS.values():
+        samples = [template.render(**{field: f"<{field}-{n}>" for field in template.fields}) for n in (1, 2)]
+        common = os.path.commonprefix(samples)
+        if not common.startswith(template.static):
+            problems.append(f"{template.name}: rendered prompt does not start with its static part")
+        entry = locked.get(template.name)
+        if entry and entry["static_hash"] != template.static_hash and entry["version"] == template.version:
+            problems.append(f"{template.name}: static prefix changed without a version bump (v{template.version})")
+
+    locked_instructions = locked.get("_instructions", {})
+    instruction_hashes = {}
+    for stage in STAGE_AGENTS:
+        instructions = _agent_instructions(stage)
+        if instructions is None:
+            # Module not importable here (optional UI dependency): keep whatever was locked
+            if stage in locked_instructions:
+                instruction_hashes[stage] = locked_instructions[stage]
+            continue
+        instruction_hashes[stage] = hashlib.sha256(instructions.encode()).hexdigest()[:16]
+        if stage in locked_instructions and locked_instructions[stage] != instruction_hashes[stage]:
+            problems.append(f"{stage}: agent instructions changed, which invalidates every cached prefix of the "
+                            f"stage (accept with --update)")
+        elif stage not in locked_instructions and locked:
+            problems.append(f"{stage}: agent instructions are not in the lock file (add them with --update)")
+
+    if update:
+        lock = {t.name: {"version": t.version, "static_hash": t.static_hash, "static_tokens": t.static_tokens}
+                for t in PROMPTS.values()}
+        lock["_instructions"] = instruction_hashes
+        with open(LOCK_FILE, "w") as f:
+            json.dump(lock, f, indent=2, sort_keys=True)
+            f.write("\n")
+    return problems
+
+
+if __name__ == "__main__":
+    if "--check" in sys.argv or "--update" in sys.argv:
+        problems = check_prefix_stability(update="--update" in sys.argv)
+        for problem in problems:
+            print(f"❌ {problem}")
+        if not problems:
+            print("✅ All prompt prefixes are stable")
+        sys.exit(1 if problems and "--update" not in sys.argv else 0)
+
+    if not TIKTOKEN_AVAILABLE:
+        print("⚠️  tiktoken not installed - token counts are estimates")
+    print(f"{'prompt':<34} {'stage':<22} {'v':>2} {'prefix':>7} {'total':>7} {'cacheable':>9}  cache-eligible")
+    for row in prefix_report():
+        print(f"{row['prompt']:<34} {row['stage']:<22} {row['version']:>2} {row['prefix_tokens']:>7} "
+              f"{row['total_tokens']:>7} {row['cacheable_ratio']:>9.0%}  {'yes' if row['cache_eligible'] else 'no'}")
@@ -2,6 +2,11 @@ from pydantic import BaseModel, Field
 from agents import Agent, Runner, function_tool
 from typing import List, Dict, Optional
 import asyncio
+import os
+import re
+import threading
+from model_router import stage_model, run_stage
+from prompt_registry import render
 
 # Template definitions for product analysis frameworks
 TEMPLATE_FRAMEWORKS = {
@@ -75,6 +80,127 @@ class ClarifiedQuery(BaseModel):
     class Config:
         extra = "forbid"
 
+# ============================
+# Template question engine (no LLM call)
+# ============================
+# Words that point a query at one of the TEMPLATE_FRAMEWORKS
+FRAMEWORK_KEYWORDS = {
+    "product_feature_analysis": ["feature", "idea", "users", "value", "problem", "research", "analyze", "analysis", "product"],
+    "mvp_definition": ["mvp", "prototype", "launch", "minimum", "v1", "first version", "scope", "pilot"],
+    "technical_implementation": ["architecture", "api", "integrate", "integration", "implement", "stack", "scale",
+                                 "database", "infrastructure", "security", "latency", "backend", "model"],
+    "business_strategy": ["market", "revenue", "pricing", "monetize", "strategy", "competitor", "competitive",
+                          "go-to-market", "gtm", "business", "roi", "positioning"],
+}
+
+# Words that make a thinking category especially relevant to a query
+CATEGORY_KEYWORDS = {
+    "user_value": ["user", "users", "customer", "problem", "pain", "need"],
+    "market_opportunity": ["market", "growth", "demand", "opportunity", "size"],
+    "technical_feasibility": ["technical", "api", "data", "implement", "implementation", "feasible"],
+    "business_impact": ["revenue", "roi", "cost", "impact", "business", "value"],
+    "competitive_landscape": ["competitor", "competitors", "competition", "alternative", "vs", "differentiate"],
+    "core_features": ["feature", "features", "capability", "core"],
+    "user_stories": ["user", "story", "stories", "workflow", "persona"],
+    "success_metrics": ["metric", "metrics", "kpi", "success", "measure"],
+    "technical_constraints": ["constraint", "dependency", "limit", "legacy", "compliance"],
+    "timeline": ["timeline", "deadline", "quarter", "weeks", "months", "resources", "team"],
+    "architecture": ["architecture", "design", "system", "service", "microservice"],
+    "data_requirements": ["data", "storage", "database", "dataset", "pipeline"],
+    "integration_points": ["integrate", "integration", "api", "crm", "slack", "salesforce"],
+    "scalability": ["scale", "scalability", "performance", "latency", "load"],
+    "security": ["security", "privacy", "gdpr", "hipaa", "compliance", "healthcare", "finance"],
+    "market_positioning": ["position", "positioning", "differentiate", "brand"],
+    "revenue_model": ["revenue", "pricing", "subscription", "monetize", "freemium"],
+    "go_to_market": ["launch", "go-to-market", "gtm", "channel", "sales"],
+    "risk_assessment": ["risk", "risks", "regulation", "compliance", "threat"],
+    "strategic_alignment": ["strategy", "strategic", "vision", "roadmap", "portfolio"],
+}
+
+# Leading phrases that carry intent rather than topic
+_TOPIC_PREFIXES = re.compile(
+    r"^(?:(?:please|can you|could you|help me|i want to|i'd like to|we want to|let's|lets)\s+)*"
+    r"(?:research|analy[sz]e|build|create|develop|explore|evaluate|design|launch|add|make)?\s*"
+    r"(?:an?|the|some|our|my)?\s*(?:(?:new|product)\s+)?(?:feature|idea|mvp|product|app|tool)?\s*"
+    r"(?:idea\s+)?(?:for|about|on|of|that|to|around)?\s+",
+    re.IGNORECASE,
+)
+# "pricing and competitors for X" -> "X"
+_ASPECT_LEAD = re.compile(
+    r"^[\w\s,&\-]*?\b(?:pricing|competitors?|competition|market|architecture|strategy|roi|revenue|risks?|"
+    r"metrics|kpis|feasibility|security|scalability|timeline)\b[\w\s,&\-]*?\s+(?:for|of|about|behind|in)\s+",
+    re.IGNORECASE,
+)
+_LEADING_ARTICLE = re.compile(r"^(?:an?|the|our|my)\s+", re.IGNORECASE)
+
+
+def _words(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9][a-z0-9\-]*", text.lower())
+
+
+def classify_framework(query: str) -> str:
+    """ Pick the TEMPLATE_FRAMEWORKS entry whose keywords best match the query """
+    text = " " + " ".join(_words(query)) + " "
+    scores = {
+        framework: sum(text.count(f" {keyword} ") for keyword in keywords)
+        for framework, keywords in FRAMEWORK_KEYWORDS.items()
+    }
+    best = max(scores, key=scores.get)
+    return best if scores[best] > 0 else "product_feature_analysis"
+
+
+def extract_topic(query: str, max_words: int = 8) -> str:
+    """ The subject of the query, stripped of request phrasing, for the {topic} templates """
+    topic = query.strip().split("\n")[0]
+    topic = re.split(r"[?.!;]", topic)[0]
+    stripped = _TOPIC_PREFIXES.sub("", topic, count=1).strip(" ,:-")
+    stripped = _ASPECT_LEAD.sub("", stripped, count=1)
+    stripped = _LEADING_ARTICLE.sub("", stripped).strip(" ,:-")
+    topic = stripped or topic
+    words = topic.split()
+    return " ".join(words[:max_words]) if words else "this feature"
+
+
+_REPEATED_WORD = re.compile(r"\b(\w+)(?:\s+\1\b)+", re.IGNORECASE)
+
+
+def fill_template(question_template: str, topic: str) -> str:
+    """ Put the topic into a question, without doubling words it shares with the slot ("the MVP MVP") """
+    return _REPEATED_WORD.sub(r"\1", question_template.format(topic=topic))
+
+
+def template_questions(query: str, count: int = 3, framework: Optional[str] = None) -> ClarifyingQuestionsOutput:
+    """ Rank the chosen framework's thinking categories against the query and render the top `count` """
+    framework = framework or classify_framework(query)
+    template = TEMPLATE_FRAMEWORKS[framework]
+    topic = extract_topic(query)
+    query_words = set(_words(query))
+
+    def relevance(item):
+        position, category = item
+        overlap = len(query_words & set(CATEGORY_KEYWORDS.get(category, [])))
+        # Earlier categories are the framework's own priority order and break ties
+        return (-overlap, position)
+
+    ranked = [category for _, category in sorted(enumerate(template["thinking_categories"]), key=relevance)]
+    questions = [
+        ClarifyingQuestion(
+            question=fill_template(template["question_templates"][category], topic),
+            reasoning=f"Clarifies {category.replace('_', ' ')} for the {template['name'].lower()}",
+        )
+        for category in ranked[:count]
+    ]
+    return ClarifyingQuestionsOutput(
+        questions=questions,
+        template_used=framework,
+        reasoning=f"Matched the {template['name']} framework for topic '{topic}'",
+    )
+
+
+def format_questions(output: ClarifyingQuestionsOutput) -> str:
+    """ Numbered questions as shown in the UIs """
+    return "\n".join(f"{i}. {q.question}" for i, q in enumerate(output.questions, start=1))
+
 # Note: Function tools removed to avoid schema issues
 # The agents will handle the logic directly through their instructions
 
@@ -114,7 +240,7 @@ Always generate questions that will lead to better product feature analysis and
 clarifier = Agent(
     name="Agent_GenerateQuestions",
     instructions=CLARIFYING_AGENT_INSTRUCTIONS,
-    model="gpt-4o-mini"
+    model=stage_model("clarifier")
 )
 
 # Enhanced agent for processing clarified queries
@@ -139,46 +265,61 @@ query_processor = Agent(
     Always create clarified queries that are specific, comprehensive, and actionable
     for product decision-making.
     """,
-    model="gpt-4o-mini"
+    model=stage_model("query_processor")
 )
 
 # Function to generate clarifying questions for UI
 async def gen_questions_ui(user_query: str) -> str:
     """
     Generate clarifying questions for display in Gradio UI.
-    Returns a formatted string with exactly 3 questions.
+    Returns a formatted string with exactly 3 questions, instantly from TEMPLATE_FRAMEWORKS.
+    To refine them with the LLM, start refine_questions() as a background task and swap its output in.
+    """
+    return format_questions(template_questions(user_query))
+
+async def refine_questions(user_query: str) -> str:
+    """
+    Optional LLM refinement of the template questions. Start it with asyncio.create_task()
+    after showing the template questions and swap them in if it finishes in time.
     """
-    result = await Runner.run(
+    result = await run_stage(
+        "clarifier",
         clarifier,
-        f"Generate exactly 3 clarifying questions for this research query: {user_query}"
+        render("clarifier.questions", query=user_query)
     )
     return result.final_output
 
+# Research outputs name the idea on their first line
+_IDEA_LINE = re.compile(r"^\s*(?:product idea|#+\s*product feature analysis)\s*:\s*(.+)$", re.IGNORECASE | re.MULTILINE)
+
+
+def mvp_idea(research_context: str, user_input: str) -> str:
+    """
+    The idea the MVP questions are about. In the feature phase user_input is usually a confirmation
+    ("Yes, proceed"), so the idea comes from the research context, like feature_prewarm does.
+    """
+    match = _IDEA_LINE.search(research_context or "")
+    if match:
+        return match.group(1).strip()
+    first_line = next((line.strip(" #") for line in (research_context or "").splitlines() if line.strip(" #")), "")
+    return first_line or user_input
+
 # Function to generate MVP-specific clarifying questions (5 questions max)
 async def gen_mvp_questions(research_context: str, user_input: str) -> str:
     """
     Generate 5 clarifying questions specifically for MVP development.
-    Returns a formatted string with exactly 5 questions.
-    """
-    mvp_prompt = f"""
-    Generate exactly 5 clarifying questions for MVP development based on:
-    
-    Research Context: {research_context}
-    User Input: {user_input}
-    
-    Focus on these areas:
-    1. Target users and problem definition
-    2. Core features and capabilities
-    3. Competitive landscape and differentiation
-    4. Success metrics and KPIs
-    5. Technical constraints and timeline
-    
-    Generate questions that will help create a comprehensive MVP definition.
+    Returns a formatted string with exactly 5 questions from the MVP Definition template;
+    start refine_mvp_questions() as a background task for the LLM version.
     """
-    
-    result = await Runner.run(
+    idea = mvp_idea(research_context, user_input)
+    return format_questions(template_questions(idea, count=5, framework="mvp_definition"))
+
+async def refine_mvp_questions(research_context: str, user_input: str) -> str:
+    """ Optional LLM version of gen_mvp_questions, meant to run in the background like refine_questions """
+    result = await run_stage(
+        "clarifier",
         clarifier,
-        mvp_prompt
+        render("clarifier.mvp_questions", research_context=research_context, user_input=user_input)
     )
     return result.final_output
 
@@ -189,44 +330,108 @@ async def create_query(original_query: str, answers: list[str]) -> str:
     """
     answers_text = "\n".join([f"Answer {i+1}: {answer}" for i, answer in enumerate(answers)])
     
-    result = await Runner.run(
+    result = await run_stage(
+        "query_processor",
         query_processor,
-        f"Create clarified query from original: '{original_query}' with user answers:\n{answers_text}"
+        render("query_processor.answers", query=original_query, answers=answers_text)
     )
     return result.final_output
 
+# ============================
+# Async clarification protocol
+# ============================
+class ClarificationSession:
+    """
+    Non-blocking clarification exchange. Questions are available immediately; answers arrive
+    later through submit_answers(), which may be called from any thread (UI callback, HTTP handler).
+    Work that doesn't need the answers can run while wait_answers() is pending.
+    """
+
+    def __init__(self, user_query: str, questions: Optional[ClarifyingQuestionsOutput] = None):
+        self.user_query = user_query
+        self.questions = questions or template_questions(user_query)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._answers: Optional[asyncio.Future] = None
+        self._early_answers: Optional[List[str]] = None
+        self._submitted = False
+        # Guards the hand-off between the waiting loop and a submitting thread
+        self._lock = threading.Lock()
+
+    def _future(self) -> asyncio.Future:
+        with self._lock:
+            if self._answers is None:
+                self._loop = asyncio.get_running_loop()
+                self._answers = self._loop.create_future()
+                if self._early_answers is not None:
+                    self._answers.set_result(self._early_answers)
+            return self._answers
+
+    def submit_answers(self, answers: List[str]) -> None:
+        """ Deliver the user's answers; safe to call before anyone waits and from other threads """
+        answers = list(answers)
+        with self._lock:
+            self._submitted = True
+            if self._answers is None:
+                self._early_answers = answers
+                return
+            future, loop = self._answers, self._loop
+
+        def _resolve():
+            if not future.done():
+                future.set_result(answers)
+        loop.call_soon_threadsafe(_resolve)
+
+    @property
+    def answered(self) -> bool:
+        """ True once answers were submitted, even before the waiting loop has picked them up """
+        return self._submitted
+
+    async def wait_answers(self, timeout: Optional[float] = None) -> List[str]:
+        """ Wait for the answers without blocking the event loop """
+        return await asyncio.wait_for(asyncio.shield(self._future()), timeout)
+
+    async def clarified_query(self, timeout: Optional[float] = None) -> str:
+        """ Wait for the answers and turn them into the clarified query """
+        answers = await self.wait_answers(timeout)
+        return await create_query(self.user_query, answers)
+
+
+async def ask_in_console(session: ClarificationSession, refinement: Optional[asyncio.Task] = None) -> None:
+    """ Console answer channel: reads the answer in a worker thread so the event loop keeps running """
+    print(f"\nClarifying Questions ({TEMPLATE_FRAMEWORKS[session.questions.template_used]['name']}):")
+    print(format_questions(session.questions))
+    if refinement is not None:
+        try:
+            refined = await asyncio.wait_for(asyncio.shield(refinement), timeout=5)
+            print("\nRefined questions:")
+            print(refined)
+        except Exception:
+            refinement.cancel()
+    print("\nPlease provide your clarifications:")
+    clarifications = await asyncio.to_thread(input, "Enter your clarifications: ")
+    session.submit_answers([clarifications.strip()])
+
 # Main function to run the clarifying process
-async def run_process(user_query: str) -> ClarifiedQuery:
+async def run_process(user_query: str, session: Optional[ClarificationSession] = None) -> ClarifiedQuery:
     """
     Run the complete clarifying process:
     1. Generate clarifying questions
-    2. Collect user answers (simulated for now)
+    2. Collect user answers (from the session's answer channel, or the console)
     3. Create clarified query
     """
-    
-    # Step 1: Generate clarifying questions
-    print(f"Analyzing query: {user_query}")
-    questions_result = await Runner.run(
-        clarifier,
-        f"Generate clarifying questions for this research query: {user_query}"
-    )
-    
-    # Step 2: Display questions to user (in real implementation, this would be interactive)
-    print("\nClarifying Questions:")
-    print(questions_result.final_output)
-    
-    # Step 3: Collect real user answers (simplified for now)
-    print("\nPlease provide your clarifications:")
-    clarifications = input("Enter your clarifications: ").strip()
-    user_answers = {"clarifications": clarifications}
-    
-    # Step 4: Create clarified query
-    clarified_result = await Runner.run(
-        query_processor,
-        f"Create clarified query from original: '{user_query}' with clarifications: {user_answers}"
-    )
-    
-    return clarified_result.final_output
+    if session is None:
+        # Step 1: Generate clarifying questions from the templates, refining with the LLM in the background
+        print(f"Analyzing query: {user_query}")
+        session = ClarificationSession(user_query)
+        refinement = None
+        if os.environ.get("CLARIFIER_REFINE") == "1":
+            refinement = asyncio.create_task(refine_questions(user_query))
+
+        # Step 2: Display questions and collect answers without blocking the event loop
+        await ask_in_console(session, refinement)
+
+    # Step 3: Create clarified query
+    return await session.clarified_query()
 
 # Example usage
 if __name__ == "__main__":
@@ -0,0 +1,273 @@
+"""
+Archive of completed research reports with a local embedding index over their queries.
+
+ProductAnalysisManager looks a request up before running anything: if an archived report was
+written for a near-identical idea ("AI meeting summarizer" vs "meeting notes summarization with
+AI"), it is served immediately with a freshness badge, and a report older than REPORT_FRESH_DAYS
+is refreshed in the background. Every completed report is archived. Lookups are logged, so the
+hit rate can be reported across processes.
+
+Embeddings are hashed word and character n-gram vectors (NumPy only, no model calls), which
+match rephrasings and word-form changes but not synonyms; the threshold is set conservatively.
+Bag-of-words similarity stays high when one word is swapped ("pricing optimization for
+ecommerce" vs "... for hotels"), so a hit also needs the words of one query to all appear in the
+other: a rephrasing or an added qualifier is reused, a replaced word is not.
+
+Reports are archived and looked up per tenant: a report may quote another tenant's internal
+documents (the "docs" search provider).
+
+    python report_archive.py                   # archive size and hit rate
+    python report_archive.py --query "..."     # nearest archived queries with their similarity
+"""
+import argparse
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from extractive_summarizer import tokenize
+
+DEFAULT_ARCHIVE_PATH = os.environ.get("REPORT_ARCHIVE_PATH", "report_archive.db")
+REUSE_THRESHOLD = float(os.environ.get("REPORT_REUSE_THRESHOLD", "0.8"))
+LOOKUP_CANDIDATES = 5         # nearest archived queries checked for a hit
+DUPLICATE_SIMILARITY = 0.97   # a new report for a query this close replaces the archived one
+FRESH_DAYS = float(os.environ.get("REPORT_FRESH_DAYS", "7"))
+STALE_DAYS = 30
+
+EMBEDDING_DIM = 2048
+CHAR_NGRAMS = (3, 4)
+CHAR_WEIGHT = 0.25            # relative to a whole-word match
+_SUFFIXES = ("izations", "ization", "ations", "ation", "izers", "izer", "ings", "ing", "ers", "er", "es", "s", "ed",
+             "ly")
+
+
+# ============================
+# Embeddings
+# ============================
+def _stem(word: str) -> str:
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[:-len(suffix)]
+    return word
+
+
+def _terms(text: str) -> List[str]:
+    return list(dict.fromkeys(_stem(token) for token in tokenize(text)))
+
+
+def _same_term(a: str, b: str) -> bool:
+    """ Equal stems, or one a plural/short inflection of the other ("crm" / "crms") """
+    short, long = sorted((a, b), key=len)
+    return short == long or (len(short) >= 3 and long.startswith(short) and len(long) - len(short) <= 2)
+
+
+def terms_compatible(query: str, other: str) -> bool:
+    """ Whether every significant word of one query appears in the other, i.e. no word was replaced """
+    mine, theirs = _terms(query), _terms(other)
+
+    def covered(terms: List[str], by: List[str]) -> bool:
+        return all(any(_same_term(term, candidate) for candidate in by) for term in terms)
+
+    return covered(mine, theirs) or covered(theirs, mine)
+
+
+def _bucket(feature: str) -> Tuple[int, float]:
+    value = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+    return value % EMBEDDING_DIM, 1.0 if (value >> 32) & 1 else -1.0
+
+
+def embed(text: str) -> np.ndarray:
+    """ L2-normalized hashed embedding of the significant words of `text` and their character n-grams """
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    for word in (_stem(token) for token in tokenize(text)):
+        index, sign = _bucket(f"w:{word}")
+        vector[index] += sign
+        padded = f"<{word}>"
+        for n in CHAR_NGRAMS:
+            for start in range(len(padded) - n + 1):
+                index, sign = _bucket(f"c{n}:{padded[start:start + n]}")
+                vector[index] += sign * CHAR_WEIGHT
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+# ============================
+# Archive
+# ============================
+class ArchiveHit(NamedTuple):
+    id: int
+    query: str
+    report_json: str        # ReportData JSON
+    similarity: float
+    age_seconds: float
+
+
+def freshness_badge(age_seconds: float) -> str:
+    days = age_seconds / 86400
+    when = "today" if days < 1 else f"{days:.0f} day{'s' if days >= 1.5 else ''} ago"
+    if days <= FRESH_DAYS:
+        return f"🟢 Researched {when}"
+    if days <= STALE_DAYS:
+        return f"🟡 Researched {when}, may be out of date"
+    return f"🔴 Researched {when}, likely out of date"
+
+
+def with_badge(markdown: str, badge: str) -> str:
+    """ Badge as a blockquote under the report title, so the report still starts with its heading """
+    first, _, rest = markdown.partition("\n")
+    if first.lstrip().startswith("#"):
+        return f"{first}\n\n> {badge}\n{rest}"
+    return f"> {badge}\n\n{markdown}"
+
+
+class ReportArchive:
+    """ Reports in a local SQLite file; their query embeddings are kept in memory for search """
+
+    def __init__(self, path: str = DEFAULT_ARCHIVE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS reports (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                tenant TEXT NOT NULL DEFAULT 'default',
+                query TEXT NOT NULL,
+                report TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                created_at REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS lookups (
+                created_at REAL NOT NULL,
+                query TEXT NOT NULL,
+                report_id INTEGER,
+                similarity REAL
+            )
+        """)
+        # Archives created before reports were scoped per tenant
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(reports)")]
+        if "tenant" not in columns:
+            conn.execute("ALTER TABLE reports ADD COLUMN tenant TEXT NOT NULL DEFAULT 'default'")
+        self._ids: List[int] = []
+        self._tenants: List[str] = []
+        self._matrix = np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+        self._reload()
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread; sqlite3 connections must not cross threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _reload(self) -> None:
+        rows = self._connect().execute("SELECT id, embedding, tenant FROM reports ORDER BY id").fetchall()
+        with self._lock:
+            self._ids = [row[0] for row in rows]
+            self._tenants = [row[2] for row in rows]
+            self._matrix = (np.stack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+                            if rows else np.zeros((0, EMBEDDING_DIM), dtype=np.float32))
+
+    def nearest(self, query: str, k: int = 1, tenant: str = "default") -> List[Tuple[int, float]]:
+        """ (report id, cosine similarity) of the k archived queries of `tenant` closest to `query` """
+        # Other processes may have archived reports since we loaded the index
+        count = self._connect().execute("SELECT COUNT(*) FROM reports").fetchone()[0]
+        if count != len(self._ids):
+            self._reload()
+        with self._lock:
+            if not self._ids:
+                return []
+            scores = self._matrix @ embed(query)
+            ids = list(self._ids)
+            own = np.array([owner == tenant for owner in self._tenants])
+        order = [i for i in np.argsort(-scores) if own[i]][:k]
+        return [(ids[i], float(scores[i])) for i in order]
+
+    def lookup(self, query: str, tenant: str = "default", threshold: float = None) -> Optional[ArchiveHit]:
+        """
+        The tenant's archived report for the closest query at or above the threshold whose words
+        are compatible with `query` (see terms_compatible); every lookup is logged
+        """
+        threshold = REUSE_THRESHOLD if threshold is None else threshold
+        nearest = self.nearest(query, k=LOOKUP_CANDIDATES, tenant=tenant)
+        similarity = nearest[0][1] if nearest else None
+        hit = None
+        conn = self._connect()
+        for report_id, score in nearest:
+            if score < threshold:
+                break
+            row = conn.execute("SELECT query, report, created_at FROM reports WHERE id = ?", (report_id,)).fetchone()
+            if row is not None and terms_compatible(query, row[0]):
+                conn.execute("UPDATE reports SET hits = hits + 1 WHERE id = ?", (report_id,))
+                hit = ArchiveHit(report_id, row[0], row[1], score, time.time() - row[2])
+                similarity = score
+                break
+        conn.execute("INSERT INTO lookups (created_at, query, report_id, similarity) VALUES (?, ?, ?, ?)",
+                     (time.time(), query, hit.id if hit else None, similarity))
+        return hit
+
+    def store(self, query: str, report_json: str, tenant: str = "default") -> int:
+        """ Archive a tenant's report; a report for (almost) the same query replaces the older one """
+        vector = embed(query)
+        nearest = self.nearest(query, tenant=tenant)
+        conn = self._connect()
+        if nearest and nearest[0][1] >= DUPLICATE_SIMILARITY:
+            report_id = nearest[0][0]
+            conn.execute("UPDATE reports SET query = ?, report = ?, embedding = ?, created_at = ? WHERE id = ?",
+                         (query, report_json, vector.tobytes(), time.time(), report_id))
+            self._reload()
+            return report_id
+        cursor = conn.execute(
+            "INSERT INTO reports (tenant, query, report, embedding, created_at) VALUES (?, ?, ?, ?, ?)",
+            (tenant, query, report_json, vector.tobytes(), time.time()))
+        with self._lock:
+            self._ids.append(cursor.lastrowid)
+            self._tenants.append(tenant)
+            self._matrix = np.vstack([self._matrix, vector[None, :]])
+        return cursor.lastrowid
+
+    def stats(self, since: float = 0.0) -> dict:
+        conn = self._connect()
+        reports = conn.execute("SELECT COUNT(*) FROM reports").fetchone()[0]
+        lookups, hits = conn.execute(
+            "SELECT COUNT(*), COUNT(report_id) FROM lookups WHERE created_at >= ?", (since,)).fetchone()
+        return {"reports": reports, "lookups": lookups, "hits": hits,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0}
+
+
+_archive: Optional[ReportArchive] = None
+
+
+def report_archive() -> ReportArchive:
+    """ Shared archive for this process """
+    global _archive
+    if _archive is None:
+        _archive = ReportArchive()
+    return _archive
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Research report archive")
+    parser.add_argument("--query", help="Show the archived queries closest to this one")
+    parser.add_argument("--tenant", default="default", help="Tenant whose archive --query searches")
+    parser.add_argument("--days", type=float, default=0, help="Hit rate over the last N days (default: all time)")
+    args = parser.parse_args()
+    archive = ReportArchive()
+    if args.query:
+        for report_id, similarity in archive.nearest(args.query, k=5, tenant=args.tenant):
+            query = archive._connect().execute("SELECT query FROM reports WHERE id = ?", (report_id,)).fetchone()[0]
+            mark = "✅" if similarity >= REUSE_THRESHOLD and terms_compatible(args.query, query) else "  "
+            print(f"{mark} {similarity:.3f}  #{report_id}  {query}")
+    else:
+        stats = archive.stats(since=time.time() - args.days * 86400 if args.days else 0.0)
+        print(f"{stats['reports']} archived reports, {stats['hits']}/{stats['lookups']} lookups served from the "
+              f"archive (hit rate {stats['hit_rate']:.1%})")
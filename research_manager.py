@@ -1,86 +1,481 @@
 from agents import Runner, trace, gen_trace_id
-from search_agent import search_agent
+from search_agent import summary_agent
 from planner_agent import planner_agent, WebSearchItem, WebSearchPlan
-from writer_agent import writer_agent, ReportData
+from writer_agent import (writer_agent, ReportData, REPORT_SECTIONS, ReportOutline, ReportSummary,
+                          outline_agent, section_writer_agent, report_summary_agent, select_section_evidence)
 from email_agent import email_agent
-from query_clarifying_agent import run_process
+from query_clarifying_agent import ClarificationSession, ask_in_console, create_query, format_questions
+from model_router import run_stage
+from prompt_registry import render
+from hedging import search_hedge_policy
+from local_search import PageResult, format_pages
+from partial_json import FieldEvent
+from search_providers import create_providers, provider_names, search_all
+from extractive_summarizer import summarize
+from checkpoints import checkpoint_store, make_run_id, stage_key
+from tracing_setup import trace_url
+from knowledge_base import knowledge_base
+from report_archive import FRESH_DAYS, freshness_badge, report_archive, with_badge
+from cancellation import CancelToken, current_token, record_avoided
+import background_loop
+import admission
+from admission import AdmissionRejected
 import asyncio
-from typing import Union
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import List, Optional, Set, Tuple, Union
+
+# Extractive summaries shorter than this are treated as failed
+MIN_SUMMARY_WORDS = 40
+
+# Speculative research while the user answers clarifying questions
+SPECULATIVE_SEARCHES = 3       # searches launched on the original query before answers arrive
+RECONCILE_SIMILARITY = 0.5     # term overlap at which a speculative search counts as a planned one
+# Seconds to wait for the answers before researching the original idea as planned (CLARIFICATION_TIMEOUT)
+CLARIFICATION_TIMEOUT = float(os.environ.get("CLARIFICATION_TIMEOUT", "300"))
+
+# Stages of a research run, counted as avoided work when the run is cancelled before them
+PIPELINE_STAGES = ["plan", "search", "technical_analysis", "business_analysis", "report", "email"]
+
+STATUS = "status"
+REPORT = "report"
+
+
+class ResearchUpdate(str):
+    """
+    One update yielded by ProductAnalysisManager.run, typed by kind (STATUS or REPORT).
+    Still a str, so consumers that print updates or keep the last one work unchanged.
+    """
+
+    def __new__(cls, text: str, kind: str = STATUS):
+        update = super().__new__(cls, text)
+        update.kind = kind
+        return update
+
+
+def _typed(update: str) -> ResearchUpdate:
+    return update if isinstance(update, ResearchUpdate) else ResearchUpdate(update)
+
+
+def _query_terms(text: str) -> set:
+    return {word for word in re.findall(r"[a-z0-9]+", text.lower()) if len(word) > 2}
+
+
+def query_similarity(a: str, b: str) -> float:
+    """ Jaccard overlap of the significant terms of two search queries """
+    terms_a, terms_b = _query_terms(a), _query_terms(b)
+    if not terms_a or not terms_b:
+        return 0.0
+    return len(terms_a & terms_b) / len(terms_a | terms_b)
+
+# Recent search summaries by query, served when load shedding only allows cached answers
+SEARCH_CACHE_SIZE = 200
+_search_cache: "OrderedDict[str, str]" = OrderedDict()
+
+
+def _search_cache_key(query: str) -> str:
+    return " ".join(sorted(_query_terms(query)))
+
+
+def cached_search(query: str) -> Optional[str]:
+    return _search_cache.get(_search_cache_key(query))
+
+
+def remember_search(query: str, result: str) -> None:
+    _search_cache[_search_cache_key(query)] = result
+    _search_cache.move_to_end(_search_cache_key(query))
+    while len(_search_cache) > SEARCH_CACHE_SIZE:
+        _search_cache.popitem(last=False)
+
+# (tenant, query) of refreshes in flight: archives are per tenant, so each tenant's copy gets its own refresh
+_refreshing: Set[Tuple[str, str]] = set()
+
+
+def schedule_refresh(query: str, tenant: str = "default") -> None:
+    """ Re-research an archived query on the background loop; the new report replaces the archived one """
+    key = (tenant, query)
+    if key in _refreshing:
+        return
+    _refreshing.add(key)
+
+    async def refresh():
+        try:
+            manager = ProductAnalysisManager(reuse_reports=False, send_email=False, tenant=tenant, session="refresh")
+            # A fresh run id, so an old checkpointed run isn't just resumed
+            async for _ in manager.run(query, run_id=make_run_id(query, f"refresh-{time.time():.0f}")):
+                pass
+            print(f"Refreshed archived report for: {query}")
+        finally:
+            _refreshing.discard(key)
+
+    background_loop.submit(refresh())
+
 
 class ProductAnalysisManager:
 
-    async def run(self, feature_idea: str, clarified_query: str = None):
-        """ Run the product analysis process, yielding status updates and deliverables"""
+    def __init__(self, hedge_searches: bool = None, on_report_field=None,
+                 tenant: str = "default", session: str = "default", reuse_reports: bool = True,
+                 send_email: bool = True, cancel_token: CancelToken = None):
+        # Hedging duplicates straggler searches, so it is opt-in (HEDGE_SEARCHES=1)
+        if hedge_searches is None:
+            hedge_searches = os.environ.get("HEDGE_SEARCHES") == "1"
+        self.hedge_searches = hedge_searches
+        # Where searches go: hosted web search, local fetch-and-extract, the local document index
+        # or several of them merged by score (SEARCH_PROVIDERS, see search_providers.py)
+        self.search_providers = create_providers(provider_names(), hedge=hedge_searches)
+        # How local search results are summarized: "extractive" (no LLM call) or "llm"
+        self.summary_mode = os.environ.get("SUMMARY_MODE", "extractive")
+        self.summary_llm_fallback = os.environ.get("SUMMARY_LLM_FALLBACK", "1") == "1"
+        # "parallel" writes an outline then all sections concurrently, "single" asks for one monolithic report
+        self.writer_mode = os.environ.get("WRITER_MODE", "parallel")
+        # Called with each ReportData field as the writer generates it (see partial_json); the parallel
+        # writer reports each finished section as ("markdown_report", index), then the summary fields
+        self.on_report_field = on_report_field
+        # Budgets and load shedding are per tenant and session (see admission.py)
+        self.tenant = tenant
+        self.session = session
+        # Completed stages are checkpointed per run so an interrupted run resumes (CHECKPOINTS=0 disables)
+        self.checkpoints = checkpoint_store() if os.environ.get("CHECKPOINTS", "1") == "1" else None
+        self.run_id = None
+        # Completed reports are archived per tenant and near-duplicate requests are served from the archive
+        # (opt-in: REPORT_REUSE=1)
+        self.archive = report_archive() if os.environ.get("REPORT_REUSE", "0") == "1" else None
+        self.reuse_reports = reuse_reports
+        self.send_report_email = send_email
+        # Set when load shedding cut searches; such reports aren't archived for reuse
+        self.degraded = False
+        # Facts from search results are kept; planned searches they already answer are skipped (KNOWLEDGE_BASE=0 disables)
+        self.knowledge = knowledge_base() if os.environ.get("KNOWLEDGE_BASE", "1") == "1" else None
+        self.searches_skipped = 0
+        # Searches and stages run under the request's cancel token (see cancellation.py); a reset or
+        # disconnect cancels them all. Defaults to the token of the request this runs under.
+        self.cancel_token = cancel_token or current_token() or CancelToken("research run")
+        self.stages_done: List[str] = []
+        self.searches_planned = 0
+        self.searches_done = 0
+
+    async def run(self, feature_idea: str, clarified_query: str = None, clarification: ClarificationSession = None,
+                  run_id: str = None):
+        """
+        Run the product analysis process, yielding ResearchUpdates: status lines, then the report.
+        With a pending clarification session, planning and the most answer-independent searches
+        start on the original idea while the user answers, and are reconciled once the answers arrive.
+        The run is admitted first; under load it is degraded or rejected with a retry-after message.
+        run_id defaults to one derived from the request, tenant and session, so rerunning the same
+        request in the same session resumes it if it did not finish; a finished run clears its checkpoints.
+        A request close enough to an archived one is answered from the archive without admission.
+        Cancelling the run (its task or its cancel token) also cancels the searches it started.
+        """
+        self.run_id = run_id or make_run_id(self.tenant, self.session, feature_idea, clarified_query)
+        if self.archive is not None and self.reuse_reports and clarification is None:
+            hit = self.archive.lookup(clarified_query or feature_idea, tenant=self.tenant)
+            if hit is not None:
+                async for update in self.serve_archived(hit):
+                    yield _typed(update)
+                return
+        try:
+            async with admission.controller.admit(self.tenant, self.session, "research"):
+                async for update in self._run(feature_idea, clarified_query, clarification):
+                    yield _typed(update)
+        except AdmissionRejected as e:
+            yield _typed(f"⚠️ Research is unavailable under the current load, please retry in {e.retry_after:.0f}s.")
+        except asyncio.CancelledError:
+            self.cancel_token.cancel("cancelled")
+            self.record_cancellation()
+            raise
+
+    def record_cancellation(self) -> None:
+        """ Count the stages and searches a cancelled run never got to """
+        stages = [stage for stage in PIPELINE_STAGES if stage not in self.stages_done
+                  and (stage != "email" or self.send_report_email)]
+        searches = self.searches_planned - self.searches_done
+        print(f"Research run cancelled: skipped {len(stages)} stages and {searches} searches")
+        record_avoided(stages=len(stages), searches=searches)
+
+    async def serve_archived(self, hit):
+        """ Yield an archived report with its freshness badge, refreshing it in the background if old """
+        print(f"Reusing archived report #{hit.id} ({hit.similarity:.2f} similar to: {hit.query})")
+        yield f"♻️ Found earlier research on a near-identical idea: \"{hit.query}\" ({hit.similarity:.0%} match)"
+        if hit.age_seconds > FRESH_DAYS * 86400:
+            schedule_refresh(hit.query, self.tenant)
+            yield "🔄 Refreshing it in the background; later requests will get the updated report."
+        report = ReportData.model_validate_json(hit.report_json)
+        yield "✅ Product analysis complete!"
+        yield ResearchUpdate(with_badge(report.markdown_report, freshness_badge(hit.age_seconds)), REPORT)
+
+    async def _run(self, feature_idea: str, clarified_query: str = None, clarification: ClarificationSession = None):
         trace_id = gen_trace_id()
         with trace("Product Analysis trace", trace_id=trace_id):
-            print(f"View trace: https://platform.openai.com/traces/trace?trace_id={trace_id}")
-            yield f"View trace: https://platform.openai.com/traces/trace?trace_id={trace_id}"
+            # Only link traces that will actually reach the dashboard (see tracing_setup.TRACE_MODE)
+            url = trace_url(trace_id)
+            if url:
+                print(f"View trace: {url}")
+                yield f"View trace: {url}"
             print("Starting product analysis...")
-            
-            # Use clarified query if provided, otherwise use original feature idea
-            analysis_query = clarified_query if clarified_query else feature_idea
-            print(f"Analyzing feature: {analysis_query}")
+            if self.checkpoints is not None:
+                completed = self.checkpoints.stages(self.run_id)
+                if completed:
+                    print(f"Resuming run {self.run_id}: {len(completed)} stages already completed")
+                    yield f"♻️ Resuming earlier run ({len(completed)} completed steps reused)..."
             
             # Step 1: Market & Competitive Research
-            yield "🔍 Conducting market and competitive analysis..."
-            search_plan = await self.plan_product_research(analysis_query)
-            search_results = await self.perform_searches(search_plan)
+            if clarification is not None and not clarified_query:
+                yield "⏳ Researching in the background while you answer the clarifying questions..."
+                analysis_query, search_results = await self.speculative_research(feature_idea, clarification)
+                self.stages_done += ["plan", "search"]
+                if analysis_query == feature_idea:
+                    yield "⌛ No answers to the clarifying questions yet, so the research covers the original idea."
+                yield "🔍 Conducting market and competitive analysis..."
+            else:
+                # Use clarified query if provided, otherwise use original feature idea
+                analysis_query = clarified_query if clarified_query else feature_idea
+                print(f"Analyzing feature: {analysis_query}")
+                yield "🔍 Conducting market and competitive analysis..."
+                search_plan = await self.plan_product_research(analysis_query)
+                self.stages_done.append("plan")
+                search_results = await self.perform_searches(search_plan)
+                self.stages_done.append("search")
             
             # Step 2: Technical Feasibility Analysis
+            self.cancel_token.raise_if_cancelled()
             yield "⚙️ Analyzing technical feasibility and implementation..."
-            technical_analysis = await self.analyze_technical_feasibility(analysis_query, search_results)
+            technical_analysis = await self.checkpointed(
+                "technical_analysis", analysis_query,
+                lambda: self.analyze_technical_feasibility(analysis_query, search_results))
+            self.stages_done.append("technical_analysis")
             
             # Step 3: Business Impact Analysis
+            self.cancel_token.raise_if_cancelled()
             yield "📊 Evaluating business impact and ROI..."
-            business_analysis = await self.analyze_business_impact(analysis_query, search_results)
+            business_analysis = await self.checkpointed(
+                "business_analysis", analysis_query,
+                lambda: self.analyze_business_impact(analysis_query, search_results))
+            self.stages_done.append("business_analysis")
             
             # Step 4: Generate Product Analysis Report
+            self.cancel_token.raise_if_cancelled()
             yield "📝 Generating comprehensive product analysis report..."
-            report = await self.write_product_analysis_report(feature_idea, search_results, technical_analysis, business_analysis)
+            report = self.load_checkpoint("report")
+            if report is not None:
+                report = ReportData.model_validate_json(report)
+            else:
+                report = await self.write_product_analysis_report(feature_idea, search_results, technical_analysis, business_analysis)
+                self.save_checkpoint("report", report.model_dump_json())
+            self.stages_done.append("report")
+            if self.archive is not None and not self.degraded:
+                try:
+                    self.archive.store(analysis_query, report.model_dump_json(), tenant=self.tenant)
+                except Exception as e:
+                    print(f"Could not archive report: {e}")
             
             # Step 5: Send Analysis Report
-            yield "📧 Sending analysis report..."
-            await self.send_email(report)
+            if not self.send_report_email:
+                pass
+            elif admission.current_tier() >= admission.SKIP_EMAIL:
+                yield "📧 Skipping the report email while the service is under load"
+            elif self.load_checkpoint("email") is None:
+                self.cancel_token.raise_if_cancelled()
+                yield "📧 Sending analysis report..."
+                await self.send_email(report)
+                self.save_checkpoint("email", json.dumps(True))
+            # Only unfinished runs are resumed; the next identical request gets fresh research
+            self.clear_checkpoints()
             yield "✅ Product analysis complete!"
-            yield report.markdown_report
+            yield ResearchUpdate(report.markdown_report, REPORT)
         
 
+    # ----------------------------
+    # Checkpoints
+    # ----------------------------
+    def load_checkpoint(self, stage: str, detail: str = "") -> Optional[str]:
+        if self.checkpoints is None or self.run_id is None:
+            return None
+        return self.checkpoints.load(self.run_id, stage_key(stage, detail))
+
+    def save_checkpoint(self, stage: str, data: str, detail: str = "") -> None:
+        if self.checkpoints is None or self.run_id is None:
+            return
+        try:
+            self.checkpoints.save(self.run_id, stage_key(stage, detail), data)
+        except Exception as e:
+            # A checkpoint is an optimization; never fail the run over it
+            print(f"Could not checkpoint {stage}: {e}")
+
+    def clear_checkpoints(self) -> None:
+        if self.checkpoints is None or self.run_id is None:
+            return
+        try:
+            self.checkpoints.delete_run(self.run_id)
+        except Exception as e:
+            print(f"Could not clear checkpoints of run {self.run_id}: {e}")
+
+    async def checkpointed(self, stage: str, detail: str, compute) -> str:
+        """ Text output of a stage from its checkpoint, or computed with compute() and checkpointed """
+        checkpoint = self.load_checkpoint(stage, detail)
+        if checkpoint is not None:
+            return json.loads(checkpoint)
+        value = await compute()
+        self.save_checkpoint(stage, json.dumps(value), detail)
+        return value
+
     async def plan_product_research(self, query: str) -> WebSearchPlan:
         """ Plan the product research searches to perform for the feature analysis """
-        print("Planning product research searches...")
-        result = await Runner.run(
-            planner_agent,
-            f"Product Feature Analysis Query: {query}. Focus on market research, competitive analysis, user research, and technical feasibility.",
-        )
-        print(f"Will perform {len(result.final_output.searches)} product research searches")
-        return result.final_output_as(WebSearchPlan)
+        checkpoint = self.load_checkpoint("plan", query)
+        if checkpoint is not None:
+            search_plan = WebSearchPlan.model_validate_json(checkpoint)
+        else:
+            print("Planning product research searches...")
+            result = await run_stage(
+                "planner",
+                planner_agent,
+                render("planner.query", query=query),
+            )
+            search_plan = result.final_output_as(WebSearchPlan)
+            self.save_checkpoint("plan", search_plan.model_dump_json(), query)
+        if admission.current_tier() >= admission.REDUCED_SEARCH:
+            self.degraded = self.degraded or len(search_plan.searches) > admission.REDUCED_SEARCHES
+            search_plan.searches = search_plan.searches[:admission.REDUCED_SEARCHES]
+        print(f"Will perform {len(search_plan.searches)} product research searches")
+        return search_plan
 
     async def perform_searches(self, search_plan: WebSearchPlan) -> list[str]:
         """ Perform the searches to perform for the query """
         print("Searching...")
         num_completed = 0
-        tasks = [asyncio.create_task(self.search(item)) for item in search_plan.searches]
+        self.searches_planned += len(search_plan.searches)
+        tasks = [self.cancel_token.spawn(self.search(item)) for item in search_plan.searches]
         results = []
         for task in asyncio.as_completed(tasks):
             result = await task
             if result is not None:
                 results.append(result)
             num_completed += 1
+            self.searches_done += 1
             print(f"Searching... {num_completed}/{len(tasks)} completed")
         print("Finished searching")
+        if self.knowledge is not None:
+            print(f"Knowledge base answered {self.searches_skipped}/{len(tasks)} searches")
+        if self.hedge_searches:
+            print(f"Search hedging stats: {search_hedge_policy.stats()}")
         return results
 
+    async def speculative_research(self, feature_idea: str, clarification: ClarificationSession) -> Tuple[str, list[str]]:
+        """
+        Plan and start searches on the original idea while the clarification is pending, then
+        re-plan on the clarified query and launch only the searches the speculative ones don't cover.
+        Without answers within CLARIFICATION_TIMEOUT the speculative plan is run as the plan of
+        the original idea, so an abandoned session doesn't hold its admission slot forever.
+        Returns the clarified query (the original idea after a timeout) and the search results.
+        """
+        print("Speculatively planning on the original query...")
+        speculative_plan = await self.plan_product_research(feature_idea)
+        # Searches closest to the bare idea are the least likely to change with the answers
+        ranked = sorted(speculative_plan.searches, key=lambda item: -query_similarity(item.query, feature_idea))
+        speculative = [(item, self.cancel_token.spawn(self.search(item))) for item in ranked[:SPECULATIVE_SEARCHES]]
+
+        try:
+            try:
+                answers = await clarification.wait_answers(timeout=CLARIFICATION_TIMEOUT)
+            except asyncio.TimeoutError:
+                print(f"No clarification answers after {CLARIFICATION_TIMEOUT:.0f}s, researching the original idea")
+                analysis_query, search_plan = feature_idea, speculative_plan
+            else:
+                analysis_query = await create_query(feature_idea, answers)
+                print(f"Analyzing feature: {analysis_query}")
+                search_plan = await self.plan_product_research(analysis_query)
+        except BaseException:
+            for _, task in speculative:
+                task.cancel()
+            raise
+
+        tasks = []
+        reused = 0
+        for item in search_plan.searches:
+            best = max(speculative, key=lambda pair: query_similarity(pair[0].query, item.query), default=None)
+            if best is not None and query_similarity(best[0].query, item.query) >= RECONCILE_SIMILARITY:
+                speculative.remove(best)
+                tasks.append(best[1])
+                reused += 1
+            else:
+                tasks.append(self.cancel_token.spawn(self.search(item)))
+        for _, task in speculative:
+            task.cancel()
+        print(f"Reusing {reused} speculative searches, launching {len(tasks) - reused} delta searches")
+
+        self.searches_planned += len(tasks)
+        results = [result for result in await asyncio.gather(*tasks) if result is not None]
+        self.searches_done += len(tasks)
+        print("Finished searching")
+        return analysis_query, results
+
     async def search(self, item: WebSearchItem) -> Union[str, None]:
         """ Perform a search for the query """
-        input = f"Search term: {item.query}\nReason for searching: {item.reason}"
+        checkpoint = self.load_checkpoint("search", item.query)
+        if checkpoint is not None:
+            return json.loads(checkpoint)
+        known = self.knowledge.answer(item.query, self.tenant) if self.knowledge is not None else None
+        if known is not None:
+            print(f"Answered from the knowledge base: {item.query}")
+            self.searches_skipped += 1
+            return known
+        if admission.current_tier() >= admission.CACHED_ONLY:
+            self.degraded = True
+            return cached_search(item.query)
         try:
-            result = await Runner.run(
-                search_agent,
-                input,
-            )
-            return str(result.final_output)
+            hits = await search_all(self.search_providers, item.query, item.reason)
+            if hits is None:
+                return None
+            if len(hits) == 1 and hits[0].provider == "web":
+                # The hosted search agent already returns a summary
+                summary, pages, web_pages = hits[0].text, None, None
+            else:
+                pages = [PageResult(url=hit.source, title=hit.title, text=hit.text, status=200) for hit in hits]
+                # Internal documents are not market facts and must not answer later searches
+                web_pages = [page for page, hit in zip(pages, hits) if hit.provider != "docs"]
+                summary = await self.summarize_pages(item.query, pages)
         except Exception:
             return None
+        if summary:
+            remember_search(item.query, summary)
+            self.save_checkpoint("search", json.dumps(summary), item.query)
+            self.learn(item.query, summary, web_pages)
+        return summary
+
+    def learn(self, query: str, summary: str, pages: Optional[List[PageResult]] = None) -> None:
+        """
+        Store the facts of a search result for this tenant. Fetched pages are mined directly so facts keep
+        their URL; the summary is only mined when there were no pages (hosted web search).
+        """
+        if self.knowledge is None:
+            return
+        try:
+            if pages is not None:
+                for page in pages:
+                    if page.text:
+                        self.knowledge.add(query, page.text, page.url, self.tenant)
+            else:
+                self.knowledge.add(query, summary, f"web search: {query}", self.tenant)
+        except Exception as e:
+            print(f"Could not update the knowledge base: {e}")
+
+    async def summarize_pages(self, query: str, pages: List[PageResult]) -> Union[str, None]:
+        """ Compress fetched pages into a search summary, locally unless the LLM is needed """
+        if not pages:
+            return None
+        if self.summary_mode == "extractive":
+            summary = summarize(query, [page.text for page in pages])
+            if len(summary.split()) >= MIN_SUMMARY_WORDS or not self.summary_llm_fallback:
+                return summary or None
+            print(f"Extractive summary too short for '{query}', falling back to LLM summary")
+        result = await run_stage(
+            "search",
+            summary_agent,
+            format_pages(query, pages, max_words=400),
+        )
+        return str(result.final_output)
 
     async def analyze_technical_feasibility(self, query: str, search_results: list[str]) -> str:
         """ Analyze technical feasibility and implementation approach """
@@ -130,39 +525,152 @@ class ProductAnalysisManager:
 
     async def write_product_analysis_report(self, feature_idea: str, search_results: list[str], technical_analysis: str, business_analysis: str) -> ReportData:
         """ Write the comprehensive product analysis report """
+        if self.writer_mode == "parallel":
+            try:
+                return await self.write_report_in_parallel(feature_idea, search_results, technical_analysis, business_analysis)
+            except Exception as e:
+                print(f"Parallel report writing failed, falling back to single writer: {e}")
         print("Writing product analysis report...")
-        input = f"""
-        Product Feature Analysis Report for: {feature_idea}
+        input = render("writer.report", feature_idea=feature_idea, search_results=search_results,
+                       technical_analysis=technical_analysis, business_analysis=business_analysis)
         
-        Market Research Results: {search_results}
-        Technical Analysis: {technical_analysis}
-        Business Analysis: {business_analysis}
-        
-        Create a comprehensive product analysis report including:
-        1. Executive Summary
-        2. Market Opportunity Assessment
-        3. Technical Feasibility Analysis
-        4. Business Impact and ROI
-        5. Competitive Analysis
-        6. Recommended MVP Scope
-        7. Implementation Roadmap
-        8. Risk Assessment
-        9. Next Steps and Recommendations
-        """
-        
-        result = await Runner.run(
+        result = await run_stage(
+            "writer",
             writer_agent,
             input,
+            on_field=self.on_report_field,
         )
 
         print("Finished writing product analysis report")
         return result.final_output_as(ReportData)
     
+    async def write_report_in_parallel(self, feature_idea: str, search_results: list[str], technical_analysis: str, business_analysis: str) -> ReportData:
+        """ Outline call, then every section written concurrently, then a short summary pass """
+        print("Outlining product analysis report...")
+        section_titles = list(REPORT_SECTIONS)
+        outline_result = await run_stage(
+            "report_outline",
+            outline_agent,
+            render("writer.outline", sections=section_titles, feature_idea=feature_idea, search_results=search_results,
+                   technical_analysis=technical_analysis, business_analysis=business_analysis),
+        )
+        outline = outline_result.final_output_as(ReportOutline)
+        key_points = {section.title: section.key_points for section in outline.sections}
+
+        print(f"Writing {len(section_titles)} report sections in parallel...")
+
+        async def write_and_stream(index: int, title: str) -> str:
+            section = await self.write_report_section(feature_idea, title, key_points.get(title, []), search_results,
+                                                      technical_analysis, business_analysis)
+            # Sections finish out of order; the index places each one in markdown_report
+            if self.on_report_field is not None:
+                self.on_report_field(FieldEvent(("markdown_report", index), section))
+            return section
+
+        sections = await asyncio.gather(*[write_and_stream(index, title) for index, title in enumerate(section_titles)])
+        markdown_report = f"# Product Feature Analysis: {feature_idea}\n\n" + "\n\n".join(sections)
+
+        summary_result = await run_stage("report_summary", report_summary_agent, markdown_report,
+                                         on_field=self.on_report_field)
+        summary = summary_result.final_output_as(ReportSummary)
+        print("Finished writing product analysis report")
+        return ReportData(
+            short_summary=summary.short_summary,
+            markdown_report=markdown_report,
+            follow_up_questions=summary.follow_up_questions,
+        )
+
+    async def write_report_section(self, feature_idea: str, title: str, key_points: list[str], search_results: list[str],
+                                   technical_analysis: str, business_analysis: str) -> str:
+        """ Write one report section from the research relevant to it """
+        evidence = select_section_evidence(title, search_results)
+        if title in ("Technical Feasibility Analysis", "Implementation Roadmap", "Risk Assessment"):
+            evidence = evidence + [technical_analysis]
+        if title in ("Business Impact and ROI", "Market Opportunity Assessment", "Executive Summary"):
+            evidence = evidence + [business_analysis]
+        result = await run_stage(
+            "report_section",
+            section_writer_agent,
+            render("writer.section", feature_idea=feature_idea, title=title, key_points=key_points, evidence=evidence),
+        )
+        section = str(result.final_output).strip()
+        if not section.startswith("#"):
+            section = f"## {title}\n\n{section}"
+        return section
+
     async def send_email(self, report: ReportData) -> None:
         print("Writing email...")
-        result = await Runner.run(
+        result = await run_stage(
+            "email",
             email_agent,
             report.markdown_report,
         )
         print("Email sent")
-        return report
\ No newline at end of file
+        return report
+
+
+# ============================
+# Research that starts while the user answers the clarifying questions
+# ============================
+class ClarifiedResearch:
+    """
+    A research run started on the bare idea while its clarifying questions are being answered (see
+    speculative_research). It runs on the background loop, so it outlives the UI turn that asked the
+    questions: answer() delivers the answers, report() waits for the report, cancel() stops it (e.g. on reset).
+    """
+
+    def __init__(self, feature_idea: str, tenant: str = "default", session: str = "default"):
+        self.clarification = ClarificationSession(feature_idea)
+        self.cancel_token = CancelToken(f"clarified research {session[:8]}")
+        manager = ProductAnalysisManager(tenant=tenant, session=session, cancel_token=self.cancel_token)
+        self._future = background_loop.submit(self._report(manager, feature_idea))
+
+    async def _report(self, manager: "ProductAnalysisManager", feature_idea: str) -> str:
+        last = None
+        async for update in manager.run(feature_idea, clarification=self.clarification):
+            if update.kind == REPORT:
+                return str(update)
+            last = update
+        raise RuntimeError(str(last) if last is not None else "No analysis report generated.")
+
+    @property
+    def questions(self) -> str:
+        return format_questions(self.clarification.questions)
+
+    def answer(self, answers: List[str]) -> None:
+        self.clarification.submit_answers(answers)
+
+    async def report(self) -> str:
+        """ The report markdown; cancelling the caller cancels the research """
+        return await asyncio.wrap_future(self._future)
+
+    def cancel(self) -> None:
+        self.cancel_token.cancel("reset")
+        self._future.cancel()
+
+
+async def research_in_console(feature_idea: str) -> str:
+    """ Console flow: the research starts while the clarifying questions are answered on stdin """
+    session = ClarificationSession(feature_idea)
+    asking = asyncio.create_task(ask_in_console(session))
+    report = None
+    try:
+        async for update in ProductAnalysisManager().run(feature_idea, clarification=session):
+            if update.kind == REPORT:
+                report = str(update)
+            else:
+                print(update)
+    finally:
+        asking.cancel()
+    return report or "No analysis report generated."
+
+
+if __name__ == "__main__":
+    import argparse
+    from dotenv import load_dotenv
+
+    load_dotenv(override=True)
+    parser = argparse.ArgumentParser(description="Research a product idea, answering its clarifying questions")
+    parser.add_argument("feature_idea")
+    args = parser.parse_args()
+    print(asyncio.run(research_in_console(args.feature_idea)))
\ No newline at end of file
@@ -0,0 +1,253 @@
+"""
+Research worker tier.
+
+Runs ProductAnalysisManager jobs pulled from a job queue in separate processes, so research
+no longer competes with the UI process for its event loop. Scale across cores with --workers
+and across hosts by pointing every host at the same Redis-protocol broker. The API server hands
+research to the pool when started with RESEARCH_QUEUE=1 and the same JOB_QUEUE_URL.
+
+    python research_worker.py --workers 4                        # SQLite queue in ./research_jobs.db
+    python research_worker.py --workers 4 --queue redis://host:6379/0
+    python research_worker.py --benchmark                         # offline throughput vs worker count
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Optional
+
+from cancellation import CancelToken, run_cancellable
+from job_queue import CANCELLED, DEFAULT_VISIBILITY_TIMEOUT, DONE, FAILED, Job, JobQueue, get_job_queue
+
+POLL_INTERVAL = 0.5
+
+
+# ============================
+# Job handlers
+# ============================
+def run_research_job(payload: Dict, token: CancelToken) -> str:
+    """ Run a full product analysis and return the final report markdown; cancelling `token` stops it """
+    # Imported here so the benchmark and the queue tooling don't need the Agents SDK
+    from research_manager import REPORT, ProductAnalysisManager
+
+    async def _run() -> str:
+        last = None
+        manager = ProductAnalysisManager(tenant=payload.get("tenant", "default"), session=payload.get("session", "default"))
+        async for update in manager.run(payload["feature_idea"], payload.get("clarified_query")):
+            if update.kind == REPORT:
+                return str(update)
+            last = update
+        # No report (e.g. rejected under load): fail the job so it is retried
+        raise RuntimeError(str(last) if last is not None else "No analysis report generated.")
+
+    return asyncio.run(run_cancellable(_run(), token))
+
+
+def run_simulated_job(payload: Dict, token: CancelToken) -> str:
+    """ Offline stand-in for a research run: waits like the network-bound pipeline does """
+    deadline = time.time() + float(payload.get("seconds", 0.2))
+    while time.time() < deadline and not token.cancelled:
+        time.sleep(min(0.05, max(0.0, deadline - time.time())))
+    token.raise_if_cancelled()
+    return f"simulated report {payload.get('n', '')}"
+
+
+JOB_HANDLERS: Dict[str, Callable[[Dict, CancelToken], str]] = {
+    "research": run_research_job,
+    "simulated": run_simulated_job,
+}
+
+
+# ============================
+# Worker loop
+# ============================
+class _Heartbeat(threading.Thread):
+    """
+    Extends the job lease in the background while the handler runs.
+    When the lease is lost (reaped, or the job cancelled by its submitter) it cancels the handler's token.
+    """
+
+    def __init__(self, queue: JobQueue, job: Job, worker_id: str, visibility_timeout: float,
+                 token: CancelToken):
+        super().__init__(daemon=True)
+        self.queue = queue
+        self.job = job
+        self.worker_id = worker_id
+        self.visibility_timeout = visibility_timeout
+        self.token = token
+        self.lease_lost = False
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.visibility_timeout / 3):
+            if not self.queue.heartbeat(self.job.job_id, self.worker_id, self.visibility_timeout):
+                job = self.queue.get(self.job.job_id)
+                cancelled = job is not None and job.status == CANCELLED
+                print(f"⚠️  Worker {self.worker_id} lost lease on job {self.job.job_id}"
+                      f"{' (cancelled by its submitter)' if cancelled else ''}")
+                self.lease_lost = True
+                self.token.cancel("job cancelled" if cancelled else "lease lost")
+                return
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def process_one(queue: JobQueue, worker_id: str,
+                visibility_timeout: float = DEFAULT_VISIBILITY_TIMEOUT) -> Optional[Job]:
+    """ Claim and run a single job. Returns the claimed job, or None when the queue is empty """
+    job = queue.claim(worker_id, visibility_timeout)
+    if job is None:
+        return None
+
+    handler = JOB_HANDLERS.get(job.kind)
+    if handler is None:
+        queue.fail(job.job_id, worker_id, f"Unknown job kind: {job.kind}")
+        return job
+
+    token = CancelToken(f"job {job.job_id}")
+    heartbeat = _Heartbeat(queue, job, worker_id, visibility_timeout, token)
+    heartbeat.start()
+    try:
+        result = handler(job.payload, token)
+        if not heartbeat.lease_lost:
+            queue.complete(job.job_id, worker_id, result)
+    except asyncio.CancelledError:
+        # Stopped by the heartbeat: the job is cancelled or someone else holds it now, nothing to record
+        print(f"🛑 Worker {worker_id} stopped job {job.job_id} ({token.reason})")
+    except Exception as e:
+        print(f"Error in job {job.job_id}: {e}")
+        queue.fail(job.job_id, worker_id, str(e))
+    finally:
+        heartbeat.stop()
+    return job
+
+
+def worker_main(queue_url: str, visibility_timeout: float = DEFAULT_VISIBILITY_TIMEOUT,
+                exit_when_empty: bool = False) -> None:
+    """ Entry point of one worker process """
+    worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    queue = get_job_queue(queue_url)
+    print(f"Worker {worker_id} started")
+    while True:
+        job = process_one(queue, worker_id, visibility_timeout)
+        if job is None:
+            if exit_when_empty:
+                break
+            time.sleep(POLL_INTERVAL)
+
+
+def run_pool(num_workers: int, queue_url: str, visibility_timeout: float = DEFAULT_VISIBILITY_TIMEOUT,
+             exit_when_empty: bool = False) -> None:
+    """ Start num_workers worker processes and wait for them """
+    if queue_url.startswith("local-redis://"):
+        # Each process would get its own empty stand-in and nothing would reach the workers
+        raise ValueError("local-redis:// is in-process only; give workers a SQLite path or a redis:// URL")
+    processes = [
+        multiprocessing.Process(target=worker_main, args=(queue_url, visibility_timeout, exit_when_empty))
+        for _ in range(num_workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
+
+# ============================
+# Client helpers
+# ============================
+_queue: Optional[JobQueue] = None
+
+
+def shared_queue() -> JobQueue:
+    """ Queue client shared by this process's helpers (JOB_QUEUE_URL) """
+    global _queue
+    if _queue is None:
+        _queue = get_job_queue()
+    return _queue
+
+
+def submit_research(feature_idea: str, clarified_query: Optional[str] = None,
+                    queue: Optional[JobQueue] = None, tenant: str = "default", session: str = "default") -> str:
+    """
+    Enqueue a research run and return its job id.
+    Raises admission.AdmissionRejected when the tenant is over budget or the queue is too deep.
+    Blocks on the queue; call it with asyncio.to_thread from a running event loop.
+    """
+    from admission import controller as admission_controller
+    queue = queue or shared_queue()
+    admission_controller.watch_queue(queue)
+    admission_controller.check(tenant, session, "research_job")
+    return queue.enqueue("research", {"feature_idea": feature_idea, "clarified_query": clarified_query,
+                                      "tenant": tenant, "session": session})
+
+
+def cancel_job(job_id: str, queue: Optional[JobQueue] = None, reason: str = "cancelled") -> bool:
+    """ Cancel a queued or running job; the worker running it stops at its next heartbeat """
+    queue = queue or shared_queue()
+    return queue.cancel(job_id, reason)
+
+
+async def wait_for_job(job_id: str, queue: Optional[JobQueue] = None, timeout: float = 900) -> Job:
+    """ Poll until the job is done, failed or cancelled, without blocking the caller's event loop """
+    queue = queue or shared_queue()
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        # queue.get is a blocking SQLite / Redis call
+        job = await asyncio.to_thread(queue.get, job_id)
+        if job is not None and job.status in (DONE, FAILED, CANCELLED):
+            return job
+        await asyncio.sleep(POLL_INTERVAL)
+    raise TimeoutError(f"Job {job_id} did not finish within {timeout}s")
+
+
+# ============================
+# Offline benchmark
+# ============================
+def benchmark(worker_counts=(1, 2, 4, 8), jobs_per_worker: int = 8, job_seconds: float = 0.25) -> Dict[int, float]:
+    """ Measure simulated research throughput as the worker count grows """
+    print(f"{'workers':>8} {'jobs':>6} {'wall_s':>8} {'jobs/s':>8} {'scaling':>8}")
+    throughput: Dict[int, float] = {}
+    for num_workers in worker_counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            queue_url = os.path.join(tmp, "bench_jobs.db")
+            queue = get_job_queue(queue_url)
+            num_jobs = num_workers * jobs_per_worker
+            for n in range(num_jobs):
+                queue.enqueue("simulated", {"seconds": job_seconds, "n": n})
+            start = time.perf_counter()
+            run_pool(num_workers, queue_url, exit_when_empty=True)
+            wall = time.perf_counter() - start
+            done = queue.counts().get(DONE, 0)
+        throughput[num_workers] = done / wall
+        scaling = throughput[num_workers] / (throughput[worker_counts[0]] * num_workers / worker_counts[0])
+        print(f"{num_workers:>8} {done:>6} {wall:>8.2f} {throughput[num_workers]:>8.2f} {scaling:>8.0%}")
+    return throughput
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Research worker pool")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes to start")
+    parser.add_argument("--queue", default=None, help="SQLite path or redis:// URL shared with the API server")
+    parser.add_argument("--visibility-timeout", type=float, default=DEFAULT_VISIBILITY_TIMEOUT)
+    parser.add_argument("--benchmark", action="store_true", help="Run the offline scaling benchmark")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark()
+    else:
+        from dotenv import load_dotenv
+        load_dotenv(override=True)
+        queue_url = args.queue or os.environ.get("JOB_QUEUE_URL", "research_jobs.db")
+        if queue_url.startswith("local-redis://"):
+            parser.error("local-redis:// is in-process only; use a SQLite path or a redis:// URL")
+        run_pool(args.workers, queue_url, args.visibility_timeout)
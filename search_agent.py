@@ -1,4 +1,5 @@
 from agents import Agent, WebSearchTool, ModelSettings
+from model_router import stage_model
 
 INSTRUCTIONS = (
     "You are a research assistant. Given a search term, you search the web for that term and "
@@ -12,6 +13,21 @@ search_agent = Agent(
     name="Search agent",
     instructions=INSTRUCTIONS,
     tools=[WebSearchTool(search_context_size="low")],
-    model="gpt-4o-mini",
+    model=stage_model("search"),
     model_settings=ModelSettings(tool_choice="required"),
-)
\ No newline at end of file
+)
+
+SUMMARY_INSTRUCTIONS = (
+    "You are a research assistant. Given a search term and the text of pages found for it, "
+    "produce a concise summary of the results. The summary must 2-3 paragraphs and less than 300 "
+    "words. Capture the main points. Write succintly, no need to have complete sentences or good "
+    "grammar. This will be consumed by someone synthesizing a report, so its vital you capture the "
+    "essence and ignore any fluff. Do not include any additional commentary other than the summary itself."
+)
+
+# Summarizes already-fetched pages; only used as a fallback to the local extractive summarizer
+summary_agent = Agent(
+    name="Summary agent",
+    instructions=SUMMARY_INSTRUCTIONS,
+    model=stage_model("search"),
+)
@@ -0,0 +1,162 @@
+"""
+Search providers behind ProductAnalysisManager.search.
+
+A provider turns one planned search into scored hits. SEARCH_PROVIDERS selects them (comma
+separated, default: SEARCH_BACKEND, i.e. "web"):
+
+    web    hosted WebSearchTool via search_agent; one hit, its summary of the results
+    local  fetch-and-extract web search (local_search.py); one hit per page, scored by rank
+    docs   BM25 over the local document index (doc_index.py): internal PRDs, tickets, past reports
+
+With several providers, they run concurrently and their hits are merged by score. Scores are not
+comparable across providers (BM25 is unbounded, web results only have a rank), so each provider's
+scores are divided by its best one and multiplied by the provider's weight (SEARCH_WEIGHT_<NAME>,
+default 1) before merging.
+"""
+import abc
+import asyncio
+import os
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+from doc_index import DocumentIndex, document_index
+from hedging import search_hedge_policy
+from local_search import LocalSearchBackend
+from model_router import run_stage
+from prompt_registry import render
+from search_agent import search_agent
+
+MAX_MERGED_HITS = 8
+DOC_HITS = 5
+DOC_MIN_RELATIVE_SCORE = 0.3    # doc passages scoring below this share of the best one are dropped
+
+
+class SearchHit(BaseModel):
+    provider: str = Field(description="Name of the provider that found it")
+    source: str = Field(description="URL, file path or other citation")
+    title: str = Field(default="")
+    text: str = Field(description="Summary, page text or passage")
+    score: float = Field(description="Provider score; only comparable within one provider")
+
+
+class SearchProvider(abc.ABC):
+    """ Interface: search() returns the hits for one planned search, best first """
+    name = "base"
+
+    @abc.abstractmethod
+    async def search(self, query: str, reason: str = "") -> List[SearchHit]:
+        raise NotImplementedError
+
+
+class WebSearchProvider(SearchProvider):
+    """ Hosted WebSearchTool; the search agent already summarizes, so this is a single hit """
+    name = "web"
+
+    def __init__(self, hedge: bool = False):
+        self.hedge = hedge
+
+    async def search(self, query: str, reason: str = "") -> List[SearchHit]:
+        input = render("search.item", query=query, reason=reason)
+        if self.hedge:
+            result = await search_hedge_policy.run(lambda: run_stage("search", search_agent, input))
+        else:
+            result = await run_stage("search", search_agent, input)
+        summary = str(result.final_output)
+        return [SearchHit(provider=self.name, source=f"web search: {query}", text=summary, score=1.0)] if summary else []
+
+
+_local_search_backend = None
+
+
+def local_search_backend() -> LocalSearchBackend:
+    """ Shared local backend so the HTTP pool and page cache survive across runs """
+    global _local_search_backend
+    if _local_search_backend is None:
+        _local_search_backend = LocalSearchBackend()
+    return _local_search_backend
+
+
+class LocalWebProvider(SearchProvider):
+    """ Fetched and extracted result pages; earlier results score higher """
+    name = "local"
+
+    def __init__(self, backend: Optional[LocalSearchBackend] = None):
+        self.backend = backend or local_search_backend()
+
+    async def search(self, query: str, reason: str = "") -> List[SearchHit]:
+        pages = [page for page in await self.backend.search(query) if page.text]
+        return [SearchHit(provider=self.name, source=page.url, title=page.title, text=page.text,
+                          score=(len(pages) - rank) / len(pages))
+                for rank, page in enumerate(pages)]
+
+
+class DocumentProvider(SearchProvider):
+    """ BM25 passages from the local document index """
+    name = "docs"
+
+    def __init__(self, index: Optional[DocumentIndex] = None, k: int = DOC_HITS):
+        self.index = index or document_index()
+        self.k = k
+
+    async def search(self, query: str, reason: str = "") -> List[SearchHit]:
+        # mmap reads can touch the disk; keep them off the event loop
+        hits = await asyncio.to_thread(self.index.search, query, self.k)
+        if not hits:
+            return []
+        floor = hits[0].score * DOC_MIN_RELATIVE_SCORE
+        return [SearchHit(provider=self.name, source=f"{hit.path}#{hit.passage}", title=hit.title, text=hit.text,
+                          score=hit.score)
+                for hit in hits if hit.score >= floor]
+
+
+def provider_weight(name: str) -> float:
+    return float(os.environ.get(f"SEARCH_WEIGHT_{name.upper()}", "1"))
+
+
+def merge_hits(results: Dict[str, List[SearchHit]], limit: int = MAX_MERGED_HITS) -> List[SearchHit]:
+    """ Hits of all providers, best first, by score relative to the provider's best times its weight """
+    ranked = []
+    for name, hits in results.items():
+        best = max((hit.score for hit in hits), default=0.0)
+        if best <= 0:
+            continue
+        weight = provider_weight(name)
+        ranked += [(hit.score / best * weight, hit) for hit in hits]
+    ranked.sort(key=lambda pair: -pair[0])
+    return [hit for _, hit in ranked[:limit]]
+
+
+def provider_names() -> List[str]:
+    names = os.environ.get("SEARCH_PROVIDERS", os.environ.get("SEARCH_BACKEND", "web"))
+    return [name.strip() for name in names.split(",") if name.strip()]
+
+
+def create_providers(names: List[str], hedge: bool = False) -> List[SearchProvider]:
+    providers: List[SearchProvider] = []
+    for name in names:
+        if name == "web":
+            providers.append(WebSearchProvider(hedge=hedge))
+        elif name == "local":
+            providers.append(LocalWebProvider())
+        elif name == "docs":
+            providers.append(DocumentProvider())
+        else:
+            raise ValueError(f"Unknown search provider: {name}")
+    return providers
+
+
+async def search_all(providers: List[SearchProvider], query: str, reason: str = "") -> Optional[List[SearchHit]]:
+    """ Merged hits of all providers; None if every provider failed """
+    outcomes = await asyncio.gather(*[provider.search(query, reason) for provider in providers], return_exceptions=True)
+    results = {}
+    for provider, outcome in zip(providers, outcomes):
+        if isinstance(outcome, BaseException):
+            if isinstance(outcome, asyncio.CancelledError):
+                raise outcome
+            print(f"Search provider {provider.name} failed for '{query}': {outcome}")
+            continue
+        results[provider.name] = outcome
+    if not results:
+        return None
+    return merge_hits(results)
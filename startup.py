@@ -0,0 +1,109 @@
+"""
+Cold-start helpers.
+
+The UI imports agent modules (and with them the Agents SDK and OpenAI client) on first use
+instead of at startup. warm_up() loads them in a background thread after the first page has
+rendered, so the first real request doesn't pay for the imports either.
+
+    python startup.py                  # import-time profile of app.py (python -X importtime)
+    python startup.py research_manager --top 30
+"""
+import argparse
+import socket
+import ssl
+import subprocess
+import sys
+import threading
+import time
+from typing import List, NamedTuple, Optional, Sequence
+from urllib.parse import urlparse
+
+# Modules the first research / feature request needs, in dependency order
+WARM_MODULES = ["agents", "model_router", "research_manager", "feature_agent", "query_clarifying_agent"]
+WARM_HOSTS = ["https://api.openai.com"]
+
+_warm_thread: Optional[threading.Thread] = None
+warm_up_seconds: Optional[float] = None
+
+
+class ImportTiming(NamedTuple):
+    module: str
+    self_ms: float
+    cumulative_ms: float
+    depth: int
+
+
+# ============================
+# Import-time profile
+# ============================
+def profile_imports(module: str = "app") -> List[ImportTiming]:
+    """ Run `python -X importtime -c 'import <module>'` in a fresh interpreter and parse its report """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True,
+    )
+    timings = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        timings.append(ImportTiming(name.strip(), int(self_us) / 1000, int(cumulative_us) / 1000, depth))
+    if completed.returncode != 0 and not timings:
+        print(completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "import failed")
+    return timings
+
+
+def print_profile(timings: Sequence[ImportTiming], top: int = 20) -> None:
+    if not timings:
+        return
+    total = max(t.cumulative_ms for t in timings)
+    print(f"Total import time: {total:.0f}ms\n")
+    print(f"{'cumulative':>11} {'self':>8}  module (top {top} by cumulative time)")
+    for timing in sorted(timings, key=lambda t: -t.cumulative_ms)[:top]:
+        print(f"{timing.cumulative_ms:>9.0f}ms {timing.self_ms:>6.0f}ms  {'  ' * min(timing.depth, 6)}{timing.module}")
+
+
+# ============================
+# Background warm-up
+# ============================
+def _prime_connection(url: str, timeout: float = 3.0) -> None:
+    """ Resolve the host and complete one TLS handshake, so DNS and the network path are warm """
+    host = urlparse(url).hostname
+    with socket.create_connection((host, 443), timeout=timeout) as sock:
+        with ssl.create_default_context().wrap_socket(sock, server_hostname=host):
+            pass
+
+
+def _warm(modules: Sequence[str], hosts: Sequence[str]) -> None:
+    global warm_up_seconds
+    start = time.perf_counter()
+    for module in modules:
+        try:
+            __import__(module)
+        except Exception as e:
+            print(f"⚠️  Warm-up could not import {module}: {e}")
+    for url in hosts:
+        try:
+            _prime_connection(url)
+        except OSError as e:
+            print(f"⚠️  Warm-up could not reach {url}: {e}")
+    warm_up_seconds = time.perf_counter() - start
+    print(f"Warm-up finished in {warm_up_seconds:.2f}s")
+
+
+def warm_up(modules: Sequence[str] = WARM_MODULES, hosts: Sequence[str] = WARM_HOSTS) -> None:
+    """ Import agent modules and prime the model API connection in a daemon thread, once per process """
+    global _warm_thread
+    if _warm_thread is not None:
+        return
+    _warm_thread = threading.Thread(target=_warm, args=(list(modules), list(hosts)), name="warm-up", daemon=True)
+    _warm_thread.start()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import-time profile of a module")
+    parser.add_argument("module", nargs="?", default="app")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+    print_profile(profile_imports(args.module), args.top)
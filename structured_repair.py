@@ -0,0 +1,284 @@
+"""
+Tolerant structured outputs: repair a malformed model answer instead of failing the whole run.
+
+TolerantOutputSchema is a drop-in output_type for agents with a pydantic output. Output that
+validates is used as is. Otherwise it is repaired locally: the JSON is extracted from code fences
+or surrounding text, truncated JSON is closed (partial_json.parse_partial), keys are matched
+case/style-insensitively, near-miss types are coerced (a string where a list is expected, a list
+where a string is expected, numbers as strings), an unfinished last list item is dropped and
+fields declared optional are filled with empty values.
+
+If that still does not validate, OutputRepairNeeded is raised; run_stage answers it with one small
+"output_repair" call that regenerates only the broken fields from the bad fragment, rather than
+rerunning the stage.
+
+OUTPUT_REPAIR=local disables the repair call, OUTPUT_REPAIR=0 disables repair entirely.
+"""
+import json
+import os
+import re
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple, Type, Union, get_args, get_origin
+
+from agents import Agent, AgentOutputSchema
+from agents.exceptions import ModelBehaviorError
+from pydantic import BaseModel, Field, ValidationError, create_model
+
+from partial_json import parse_partial
+
+FRAGMENT_CHARS = 4000   # of the malformed fields sent to the repair call
+CONTEXT_CHARS = 2000    # of the recovered fields sent along as context
+
+REPAIR_INSTRUCTIONS = (
+    "You fix malformed structured outputs. You are given the fields of an output that failed validation, "
+    "the fragment that was produced for them and the fields that were recovered. Return correct values "
+    "for the requested fields only. Keep the original content wherever it is usable; only complete or "
+    "reshape what is missing or malformed."
+)
+
+# escalated = local repair failed; those not repaired_by_model failed the stage
+_stats = {"valid": 0, "repaired_locally": 0, "escalated": 0, "repaired_by_model": 0}
+
+
+def repair_mode() -> str:
+    return os.environ.get("OUTPUT_REPAIR", "1")
+
+
+def repair_stats() -> Dict[str, int]:
+    return dict(_stats)
+
+
+class RepairOutcome(NamedTuple):
+    value: Optional[BaseModel]      # the validated output, if local repair succeeded
+    data: Dict[str, Any]            # fields recovered so far, coerced to the model's types
+    invalid: List[str]              # top-level fields still missing or invalid
+    errors: List[str]
+    notes: List[str]                # what local repair changed
+
+
+# ============================
+# Local repair
+# ============================
+def _normalize_key(key: str) -> str:
+    key = re.sub(r"([a-z0-9])([A-Z])", r"\1_\2", str(key))
+    return re.sub(r"[^a-z0-9]+", "_", key.lower()).strip("_")
+
+
+def _extract_json(text: str) -> Tuple[Any, bool]:
+    """ The JSON value in a model answer and whether it had to be closed because it was truncated """
+    text = re.sub(r"^\s*```(?:json)?\s*|\s*```\s*$", "", text.strip())
+    start = min([i for i in (text.find("{"), text.find("[")) if i >= 0], default=-1)
+    if start < 0:
+        return None, False
+    try:
+        # raw_decode ignores anything the model wrote after the JSON value
+        return json.JSONDecoder().raw_decode(text[start:])[0], False
+    except json.JSONDecodeError:
+        return parse_partial(text[start:]), True
+
+
+def _split_items(text: str) -> List[str]:
+    """ A bulleted / numbered / one-per-line string as list items """
+    lines = [re.sub(r"^\s*(?:[-*•]|\d+[.)])\s+", "", line).strip() for line in text.splitlines()]
+    items = [line for line in lines if line]
+    return items if len(items) > 1 else [text.strip()]
+
+
+def _to_text(value: Any) -> str:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict):
+        return "\n".join(f"{key}: {_to_text(item)}" for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return "\n".join(_to_text(item) for item in value)
+    return json.dumps(value) if value is None or isinstance(value, bool) else str(value)
+
+
+def _coerce(value: Any, annotation: Any) -> Any:
+    """ Best-effort conversion of a near-miss value to `annotation`; validation has the final say """
+    origin = get_origin(annotation)
+    if origin is Union:
+        options = [arg for arg in get_args(annotation) if arg is not type(None)]
+        return value if value is None or not options else _coerce(value, options[0])
+    if origin in (list, List):
+        item_type = (get_args(annotation) or (Any,))[0]
+        if value is None:
+            return []
+        if isinstance(value, str):
+            parsed, _ = _extract_json(value) if value.lstrip().startswith("[") else (None, False)
+            value = parsed if isinstance(parsed, list) else (_split_items(value) if item_type is str else [value])
+        elif isinstance(value, dict):
+            value = [f"{key}: {_to_text(item)}" for key, item in value.items()] if item_type is str else [value]
+        elif not isinstance(value, list):
+            value = [value]
+        return [_coerce(item, item_type) for item in value]
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        if isinstance(value, str):
+            parsed, _ = _extract_json(value)
+            value = parsed if isinstance(parsed, dict) else value
+        return _coerce_fields(value, annotation) if isinstance(value, dict) else value
+    if annotation is str:
+        return value if value is None else _to_text(value)
+    if annotation in (int, float) and isinstance(value, str):
+        match = re.search(r"-?\d[\d,]*\.?\d*", value)
+        if match:
+            number = float(match.group().replace(",", ""))
+            return int(number) if annotation is int and number.is_integer() else number
+    if annotation is bool and isinstance(value, str):
+        return value.strip().lower() in ("true", "yes", "y", "1")
+    return value
+
+
+def _coerce_fields(data: Dict[str, Any], model: Type[BaseModel]) -> Dict[str, Any]:
+    """ The model's fields found in `data`, matched by normalized key; unknown keys are dropped """
+    by_key = {_normalize_key(key): value for key, value in data.items()}
+    fields = {}
+    for name, field in model.model_fields.items():
+        value = by_key.get(_normalize_key(field.alias or name), by_key.get(_normalize_key(name)))
+        if value is not None:
+            fields[name] = _coerce(value, field.annotation)
+    return fields
+
+
+def _unwrap(data: Any, model: Type[BaseModel]) -> Any:
+    """ {"FeatureDefinition": {...}} -> {...}; a bare list for a model with a single list field -> {field: list} """
+    names = {_normalize_key(name) for name in model.model_fields}
+    if isinstance(data, dict) and not names & {_normalize_key(key) for key in data} and len(data) == 1:
+        inner = next(iter(data.values()))
+        if isinstance(inner, (dict, list)):
+            return _unwrap(inner, model)
+    if isinstance(data, list):
+        list_fields = [name for name, field in model.model_fields.items() if get_origin(field.annotation) in (list, List)]
+        if len(list_fields) == 1:
+            return {list_fields[0]: data}
+    return data
+
+
+def _empty(annotation: Any) -> Any:
+    origin = get_origin(annotation)
+    if origin in (list, List):
+        return []
+    if origin is Union and type(None) in get_args(annotation):
+        return None
+    return {str: "", int: 0, float: 0.0, bool: False}.get(annotation)
+
+
+def repair_output(model: Type[BaseModel], text: str, optional: Iterable[str] = ()) -> RepairOutcome:
+    """ Repair a malformed `model` answer locally; `optional` fields may be filled with empty values """
+    notes: List[str] = []
+    data, truncated = _extract_json(text)
+    if truncated and data is not None:
+        notes.append("closed truncated JSON")
+    data = _unwrap(data, model)
+    if not isinstance(data, dict):
+        return RepairOutcome(None, {}, list(model.model_fields), ["no JSON object found"], notes)
+    data = _coerce_fields(data, model)
+
+    for name in optional:
+        if name not in data and name in model.model_fields:
+            default = _empty(model.model_fields[name].annotation)
+            if default is not None:
+                data[name] = default
+                notes.append(f"filled {name}")
+
+    while True:
+        try:
+            return RepairOutcome(model.model_validate(data), data, [], [], notes)
+        except ValidationError as e:
+            errors = e.errors()
+        # The last item of a list of objects is the one a truncation cuts short: drop it and retry
+        cut = next((err["loc"][:2] for err in errors if truncated and len(err["loc"]) > 2
+                    and isinstance(data.get(err["loc"][0]), list) and err["loc"][1] == len(data[err["loc"][0]]) - 1),
+                   None)
+        if cut is None:
+            break
+        data[cut[0]].pop()
+        notes.append(f"dropped unfinished {cut[0]} item")
+
+    invalid = list(dict.fromkeys(str(err["loc"][0]) for err in errors if err["loc"]))
+    for name in invalid:
+        data.pop(name, None)
+    messages = [f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in errors]
+    return RepairOutcome(None, data, invalid, messages, notes)
+
+
+# ============================
+# Output schema
+# ============================
+class OutputRepairNeeded(ModelBehaviorError):
+    """ Local repair was not enough; carries what is needed for a targeted repair call """
+
+    def __init__(self, model: Type[BaseModel], text: str, outcome: RepairOutcome):
+        super().__init__(f"Invalid {model.__name__} output ({'; '.join(outcome.errors[:5])})")
+        self.model = model
+        self.text = text
+        self.outcome = outcome
+
+    def repair_agent(self, agent_model: str) -> Agent:
+        fields = {name: (self.model.model_fields[name].annotation,
+                         Field(description=self.model.model_fields[name].description))
+                  for name in self.outcome.invalid}
+        output_type = create_model(f"{self.model.__name__}Repair", **fields)
+        return Agent(name="OutputRepairAgent", instructions=REPAIR_INSTRUCTIONS, model=agent_model,
+                     output_type=output_type)
+
+    def repair_input(self) -> str:
+        data, _ = _extract_json(self.text)
+        data = _unwrap(data, self.model)
+        if isinstance(data, dict):
+            by_key = {_normalize_key(key): value for key, value in data.items()}
+            fragment = json.dumps({name: by_key.get(_normalize_key(name)) for name in self.outcome.invalid},
+                                  ensure_ascii=False)
+        else:
+            fragment = self.text
+        context = json.dumps(self.outcome.data, ensure_ascii=False)
+        return (f"Output type: {self.model.__name__}\n"
+                f"Fields to return: {', '.join(self.outcome.invalid)}\n"
+                f"Validation errors:\n" + "\n".join(f"- {error}" for error in self.outcome.errors) + "\n\n"
+                f"Malformed fragment:\n{fragment[:FRAGMENT_CHARS]}\n\n"
+                f"Recovered fields (context):\n{context[:CONTEXT_CHARS]}")
+
+    def merge(self, repaired: BaseModel) -> BaseModel:
+        try:
+            value = self.model.model_validate({**self.outcome.data, **repaired.model_dump()})
+        except ValidationError as e:
+            raise ModelBehaviorError(f"Repaired {self.model.__name__} output is still invalid: {e}") from e
+        _stats["repaired_by_model"] += 1
+        return value
+
+
+class TolerantOutputSchema(AgentOutputSchema):
+    """ AgentOutputSchema for a pydantic model that repairs invalid output before giving up """
+
+    def __init__(self, output_type: Type[BaseModel], optional: Iterable[str] = ()):
+        super().__init__(output_type, strict_json_schema=True)
+        self.optional = tuple(optional)
+
+    def validate_json(self, json_str: str) -> Any:
+        try:
+            value = super().validate_json(json_str)
+        except ModelBehaviorError:
+            if repair_mode() == "0":
+                raise
+        else:
+            _stats["valid"] += 1
+            return value
+        outcome = repair_output(self.output_type, json_str, self.optional)
+        if outcome.value is not None:
+            _stats["repaired_locally"] += 1
+            print(f"🩹 Repaired {self.output_type.__name__} output locally ({', '.join(outcome.notes) or 'coerced types'})")
+            return outcome.value
+        _stats["escalated"] += 1
+        raise OutputRepairNeeded(self.output_type, json_str, outcome)
+
+
+class RepairedResult:
+    """ Stands in for the RunResult of a stage whose output was completed by a repair call """
+
+    def __init__(self, final_output: BaseModel, context_wrapper):
+        self.final_output = final_output
+        self.context_wrapper = context_wrapper
+
+    def final_output_as(self, cls, raise_if_incorrect_type: bool = False):
+        if raise_if_incorrect_type and not isinstance(self.final_output, cls):
+            raise TypeError(f"Final output is not of type {cls.__name__}")
+        return self.final_output
@@ -0,0 +1,99 @@
+"""
+Regression tests for admission control: session budgets belong to one tenant even when tenants
+reuse session names, queued research jobs count as load, and rejections carry a usable retry-after.
+"""
+import asyncio
+
+import pytest
+
+from admission import (CACHED_ONLY, NORMAL, REDUCED_SEARCH, SKIP_EMAIL, AdmissionController, AdmissionRejected,
+                       Budget)
+
+WIDE = Budget(tokens=1_000_000, requests=1_000, concurrency=100)
+
+
+def _controller(**kwargs):
+    options = dict(tenant_budget=WIDE, session_budget=Budget(tokens=10_000, requests=3, concurrency=1),
+                   max_in_flight=10, max_queue_depth=10, enabled=True)
+    options.update(kwargs)
+    return AdmissionController(**options)
+
+
+def test_tenants_sharing_a_session_name_do_not_share_its_budget():
+    controller = _controller()
+
+    async def main():
+        # research_worker.submit_research and schedule_refresh use the same session names for every tenant
+        async with controller.admit("acme", "default", "research"):
+            assert controller.check("globex", "default", "research_job").tier == NORMAL
+            with pytest.raises(AdmissionRejected) as rejected:
+                # A second request of the same tenant and session still waits its turn
+                controller.check("acme", "default", "research_job")
+            assert rejected.value.reason == "session_concurrency"
+
+    asyncio.run(main())
+
+
+def test_session_tokens_are_charged_per_tenant():
+    controller = _controller()
+
+    async def main():
+        async with controller.admit("acme", "refresh", "research"):
+            controller.call_started()
+            controller.call_finished(tokens=9_500)
+
+    asyncio.run(main())
+    assert controller.check("acme", "refresh").tier == CACHED_ONLY
+    assert controller.check("globex", "refresh").tier == NORMAL
+    assert controller.metrics()["tenants"]["acme"]["tokens"] == 9_500
+
+
+def test_queue_depth_degrades_then_sheds():
+    controller = _controller(session_budget=WIDE)
+    depth = {"queued": 0}
+    controller.queue_depth = lambda: depth["queued"]
+    tiers = {}
+    for queued in (0, 6, 8, 9, 10):
+        depth["queued"] = queued
+        try:
+            tiers[queued] = controller.check("acme", f"s{queued}", "research_job").tier
+        except AdmissionRejected as e:
+            tiers[queued] = e
+    assert tiers[0] == NORMAL and tiers[6] == REDUCED_SEARCH and tiers[8] == SKIP_EMAIL and tiers[9] == CACHED_ONLY
+    assert isinstance(tiers[10], AdmissionRejected) and tiers[10].reason == "global_load"
+    assert controller.metrics()["rejections"] == {"global_load": 1}
+
+
+def test_watch_queue_counts_queued_jobs(tmp_path):
+    from job_queue import SQLiteJobQueue
+    queue = SQLiteJobQueue(str(tmp_path / "jobs.db"))
+    controller = _controller(session_budget=WIDE, max_queue_depth=2)
+    controller.watch_queue(queue)
+    controller.check("acme", "s1")
+    queue.enqueue("simulated", {})
+    queue.enqueue("simulated", {})
+    with pytest.raises(AdmissionRejected):
+        controller.check("acme", "s2")
+
+
+def test_request_budget_retry_after_is_when_the_oldest_request_leaves_the_window():
+    controller = _controller(session_budget=Budget(tokens=10_000, requests=2, concurrency=5, window=120))
+    controller.check("acme", "s1")
+    controller.check("acme", "s1")
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.check("acme", "s1")
+    assert rejected.value.reason == "session_requests"
+    assert 110 < rejected.value.retry_after <= 120
+
+
+def test_concurrency_rejection_retries_soon_and_frees_its_slot():
+    controller = _controller()
+
+    async def main():
+        async with controller.admit("acme", "s1"):
+            with pytest.raises(AdmissionRejected) as rejected:
+                controller.check("acme", "s1")
+            assert rejected.value.retry_after == 5.0
+        assert controller.check("acme", "s1").tier == NORMAL
+
+    asyncio.run(main())
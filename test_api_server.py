@@ -0,0 +1,181 @@
+"""
+Regression tests for /research events: status and report events follow the manager's typed
+updates instead of guessing from the text.
+"""
+import asyncio
+import json
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("TRACE_MODE", "off")
+
+from starlette.requests import Request
+
+import api_server
+import research_manager
+from research_manager import REPORT, STATUS, ResearchUpdate
+
+
+class FakeManager:
+    updates = []
+
+    def __init__(self, **kwargs):
+        pass
+
+    async def run(self, feature_idea, clarified_query=None, clarification=None):
+        for update in self.updates:
+            yield update
+
+
+def _events(monkeypatch, updates):
+    monkeypatch.setattr(research_manager, "ProductAnalysisManager", FakeManager)
+    monkeypatch.setattr(FakeManager, "updates", updates)
+
+    async def main():
+        stream = api_server.StreamingRequest("research")
+        await api_server.produce_research(stream, {"feature_idea": "Churn alerts"})
+        events = []
+        while not stream.events.empty():
+            events.append(stream.events.get_nowait())
+        return events
+
+    return asyncio.run(main())
+
+
+def test_events_follow_update_kinds(monkeypatch):
+    events = _events(monkeypatch, [
+        ResearchUpdate("# of searches planned: 5"),
+        ResearchUpdate("✅ Product analysis complete!"),
+        ResearchUpdate("> 🕒 Researched 3 days ago\n\n# Product Feature Analysis: Churn alerts", REPORT),
+    ])
+    assert [event for event, _ in events] == ["status", "status", "report"]
+    assert events[-1][1].startswith("> 🕒")
+
+
+def test_run_without_report_ends_with_error(monkeypatch):
+    events = _events(monkeypatch, [ResearchUpdate("⚠️ Research is unavailable under the current load")])
+    assert [event for event, _ in events] == ["status", "error"]
+
+
+def test_research_update_is_a_str():
+    update = ResearchUpdate("# Report", REPORT)
+    assert update == "# Report" and update.kind == REPORT
+    assert ResearchUpdate("Searching...").kind == STATUS
+    assert research_manager._typed("Searching...").kind == STATUS
+
+
+class ClarifyingManager(FakeManager):
+    """ Waits for the clarification answers like speculative_research does """
+
+    async def run(self, feature_idea, clarified_query=None, clarification=None):
+        yield ResearchUpdate("⏳ Researching in the background while you answer the clarifying questions...")
+        answers = await clarification.wait_answers(timeout=2)
+        yield ResearchUpdate(f"# Product Feature Analysis: {feature_idea} for {answers[0]}", REPORT)
+
+
+def _post(path_params, body):
+    async def receive():
+        return {"type": "http.request", "body": json.dumps(body).encode(), "more_body": False}
+    return Request({"type": "http", "method": "POST", "path": "/", "headers": [], "path_params": path_params}, receive)
+
+
+def test_clarify_research_takes_answers_by_request_id(monkeypatch):
+    monkeypatch.setattr(research_manager, "ProductAnalysisManager", ClarifyingManager)
+
+    async def main():
+        stream = api_server.StreamingRequest("research")
+        run = asyncio.ensure_future(api_server._run(stream, api_server.produce_research,
+                                                    {"feature_idea": "Churn alerts", "clarify": True}))
+        await asyncio.sleep(0.01)
+        assert stream.id in api_server.CLARIFICATIONS
+        unknown = await api_server.answers(_post({"request_id": "nope"}, {"answers": ["x"]}))
+        accepted = await api_server.answers(_post({"request_id": stream.id}, {"answers": ["sales teams"]}))
+        again = await api_server.answers(_post({"request_id": stream.id}, {"answers": ["x"]}))
+        await run
+        events = []
+        while not stream.events.empty():
+            events.append(stream.events.get_nowait())
+        return stream, (unknown.status_code, accepted.status_code, again.status_code), events[:-1]
+
+    stream, statuses, events = asyncio.run(main())
+    assert statuses == (404, 200, 409)
+    assert [event for event, _ in events] == ["clarification", "status", "report", "done"]
+    assert events[0][1]["request_id"] == stream.id and len(events[0][1]["questions"]) == 3
+    assert events[2][1].endswith("for sales teams")
+    assert stream.id not in api_server.CLARIFICATIONS
+
+
+def test_cancelled_queued_research_cancels_the_job(monkeypatch):
+    import research_worker
+    cancelled = []
+
+    async def never_done(job_id, queue=None, timeout=900):
+        await asyncio.sleep(60)
+
+    monkeypatch.setattr(research_worker, "submit_research", lambda *args, **kwargs: "job-1")
+    monkeypatch.setattr(research_worker, "wait_for_job", never_done)
+    monkeypatch.setattr(research_worker, "cancel_job",
+                        lambda job_id, queue=None, reason="cancelled": cancelled.append((job_id, reason)))
+
+    async def main():
+        stream = api_server.StreamingRequest("research")
+        stream.task = stream.token.spawn(api_server.produce_queued_research(stream, {"feature_idea": "Churn alerts"}))
+        await stream.admitted
+        stream.cancel("api_cancel")
+        await asyncio.gather(stream.task, return_exceptions=True)
+        assert stream.task.cancelled()
+
+    asyncio.run(main())
+    assert cancelled == [("job-1", "api_cancel")]
+
+
+def test_metrics_opens_only_enabled_stores(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("REPORT_REUSE", raising=False)
+    monkeypatch.setenv("KNOWLEDGE_BASE", "0")
+    monkeypatch.setenv("SEARCH_PROVIDERS", "web")
+    import doc_index
+    import knowledge_base
+    import report_archive
+    for module, name in ((report_archive, "_archive"), (knowledge_base, "_knowledge_base"), (doc_index, "_index")):
+        monkeypatch.setattr(module, name, None)
+
+    request = Request({"type": "http", "method": "GET", "path": "/metrics", "headers": []})
+    body = json.loads(asyncio.run(api_server.metrics(request)).body)
+    assert not {"report_archive", "knowledge_base", "doc_index"} & set(body)
+    assert "admission" in body and "cancellation" in body
+    # A GET must not create store files
+    assert list(tmp_path.iterdir()) == []
+
+    monkeypatch.setenv("KNOWLEDGE_BASE", "1")
+    monkeypatch.setenv("SEARCH_PROVIDERS", "web,docs")
+    body = json.loads(asyncio.run(api_server.metrics(request)).body)
+    assert {"knowledge_base", "doc_index"} <= set(body) and "report_archive" not in body
+
+
+def test_wait_for_job_polls_off_the_event_loop(tmp_path, monkeypatch):
+    import threading
+    import research_worker
+    from job_queue import CANCELLED, SQLiteJobQueue
+    monkeypatch.setattr(research_worker, "POLL_INTERVAL", 0.01)
+    queue = SQLiteJobQueue(str(tmp_path / "jobs.db"))
+    job_id = queue.enqueue("research", {})
+    loop_threads = set()
+    get = queue.get
+
+    def recording_get(job_id):
+        loop_threads.add(threading.current_thread() is threading.main_thread())
+        return get(job_id)
+
+    monkeypatch.setattr(queue, "get", recording_get)
+    threading.Timer(0.05, queue.cancel, args=(job_id,)).start()
+    job = asyncio.run(research_worker.wait_for_job(job_id, queue=queue, timeout=5))
+    assert job.status == CANCELLED
+    assert loop_threads == {False}
+
+
+def test_client_helpers_share_one_queue(monkeypatch, tmp_path):
+    import research_worker
+    monkeypatch.setenv("JOB_QUEUE_URL", str(tmp_path / "jobs.db"))
+    monkeypatch.setattr(research_worker, "_queue", None)
+    assert research_worker.shared_queue() is research_worker.shared_queue()
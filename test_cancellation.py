@@ -0,0 +1,143 @@
+"""
+Regression tests for request cancellation: cancelling a token stops every task spawned through it
+(not only the awaiting one), drain() waits for them with a bound, and run_cancellable cancels the
+work when its caller goes away.
+"""
+import asyncio
+
+import pytest
+
+import cancellation
+from cancellation import CancelToken, cancel_stats, check_cancelled, current_token, run_cancellable, use_token
+
+
+class Worker:
+    """ Coroutine factory that counts starts, cancellations and clean finishes """
+
+    def __init__(self):
+        self.started = self.cancelled = self.finished = 0
+
+    async def __call__(self, seconds=60.0, ignore_cancel=False):
+        self.started += 1
+        try:
+            await asyncio.sleep(seconds)
+            self.finished += 1
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            if not ignore_cancel:
+                raise
+            await asyncio.sleep(seconds)
+
+
+def test_cancel_stops_every_spawned_task():
+    worker, token = Worker(), CancelToken("research")
+
+    async def main():
+        tasks = [token.spawn(worker()) for _ in range(3)]
+        # Tasks created by spawned tasks see the token as the current one
+        inner = token.spawn(_spawn_nested(worker))
+        await asyncio.sleep(0.01)
+        assert token.cancel("reset") == 5
+        assert await token.drain(timeout=1) == 0
+        assert all(task.cancelled() for task in tasks + [inner])
+
+    asyncio.run(main())
+    assert worker.started == 4 and worker.cancelled == 4 and worker.finished == 0
+    assert token.cancelled and token.reason == "reset"
+
+
+async def _spawn_nested(worker):
+    await current_token().spawn(worker())
+
+
+def test_cancel_is_idempotent_and_late_spawns_are_cancelled():
+    worker, token = Worker(), CancelToken()
+
+    async def main():
+        assert token.cancel("first") == 0
+        assert token.cancel("second") == 0
+        task = token.spawn(worker())
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert token.reason == "first" and worker.finished == 0
+
+
+def test_drain_reports_tasks_that_do_not_stop(monkeypatch):
+    monkeypatch.setitem(cancellation._stats, "stuck_tasks", 0)
+    worker, token = Worker(), CancelToken()
+
+    async def main():
+        stubborn = token.spawn(worker(seconds=0.3, ignore_cancel=True))
+        polite = token.spawn(worker())
+        await asyncio.sleep(0.01)
+        token.cancel()
+        assert await token.drain(timeout=0.05) == 1
+        assert polite.cancelled() and not stubborn.done()
+        assert await token.drain(timeout=1) == 0
+
+    asyncio.run(main())
+    assert cancel_stats()["stuck_tasks"] == 1
+
+
+def test_drain_without_tasks_returns_at_once():
+    async def main():
+        return await CancelToken().drain(timeout=5)
+
+    assert asyncio.run(main()) == 0
+
+
+def test_raise_if_cancelled_checkpoints():
+    token = CancelToken("feature")
+    with use_token(token):
+        check_cancelled()
+        token.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            check_cancelled()
+    assert current_token() is None
+    check_cancelled()
+
+
+def test_run_cancellable_returns_the_result():
+    async def answer():
+        return 42
+
+    assert asyncio.run(run_cancellable(answer(), CancelToken())) == 42
+
+
+def test_run_cancellable_watchdog_abandons_the_work():
+    worker, token = Worker(), CancelToken()
+
+    def watchdog():
+        if worker.started:
+            raise RuntimeError("script stopped")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(run_cancellable(worker(), token, watchdog=watchdog, poll=0.01))
+    assert token.reason == "abandoned" and worker.cancelled == 1
+
+
+def test_cancelled_caller_cancels_the_work():
+    worker, token = Worker(), CancelToken()
+
+    async def main():
+        caller = asyncio.ensure_future(run_cancellable(worker(), token))
+        await asyncio.sleep(0.01)
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+
+    asyncio.run(main())
+    assert token.reason == "abandoned" and worker.cancelled == 1
+
+
+def test_stats_count_cancellations(monkeypatch):
+    monkeypatch.setitem(cancellation._stats, "stages_avoided", 0)
+    monkeypatch.setitem(cancellation._stats, "searches_avoided", 0)
+    before = cancel_stats()["cancelled"].get("disconnect", 0)
+    CancelToken().cancel("disconnect")
+    cancellation.record_avoided(stages=2, searches=3)
+    stats = cancel_stats()
+    assert stats["cancelled"]["disconnect"] == before + 1
+    assert stats["stages_avoided"] == 2 and stats["searches_avoided"] == 3
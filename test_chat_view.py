@@ -0,0 +1,31 @@
+"""
+Regression tests for the windowed chat history: identical long messages must not collide.
+"""
+from streamlit.testing.v1 import AppTest
+
+
+def _history_app():
+    import streamlit as st
+    from chat_view import render_history
+
+    report = "# Product Feature Analysis\n\n" + "The market for meeting assistants keeps growing. " * 200
+    messages = []
+    for i in range(3):
+        messages.append({"role": "user", "content": f"Question {i}"})
+        messages.append({"role": "assistant", "content": report})
+    render_history(messages)
+
+
+def test_identical_long_messages_render_and_expand_separately(monkeypatch):
+    monkeypatch.setenv("CHAT_WINDOW", "6")
+    app = AppTest.from_function(_history_app, default_timeout=30)
+    app.run()
+    assert not app.exception
+    buttons = [button for button in app.button if button.key.startswith("expand-")]
+    # The last turn is always shown in full; the two earlier identical reports are collapsed
+    assert len(buttons) == 2
+    assert len({button.key for button in buttons}) == 2
+
+    buttons[0].click().run()
+    assert not app.exception
+    assert len([button for button in app.button if button.key.startswith("expand-")]) == 1
@@ -0,0 +1,115 @@
+"""
+Regression tests for research checkpoints: runs resume only when unfinished and never across
+tenants or sessions.
+"""
+import asyncio
+import os
+import sqlite3
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ["REPORT_REUSE"] = "0"
+os.environ["KNOWLEDGE_BASE"] = "0"
+os.environ.setdefault("TRACE_MODE", "off")
+
+from checkpoints import CheckpointStore, make_run_id
+from writer_agent import ReportData
+
+
+def test_run_id_is_scoped_to_tenant_and_session():
+    idea = "Churn alerts for SaaS CRMs"
+    assert make_run_id("acme", "s1", idea, None) != make_run_id("globex", "s1", idea, None)
+    assert make_run_id("acme", "s1", idea, None) != make_run_id("acme", "s2", idea, None)
+    assert make_run_id("acme", "s1", idea, None) == make_run_id("acme", "s1", "  churn ALERTS for saas crms", None)
+
+
+def test_stages_ignores_expired_checkpoints(tmp_path):
+    store = CheckpointStore(str(tmp_path / "checkpoints.db"), ttl=60)
+    store.save("run", "plan", "{}")
+    store.save("run", "report", "{}")
+    with sqlite3.connect(store.path) as conn:
+        conn.execute("UPDATE checkpoints SET created_at = ? WHERE stage = 'plan'", (time.time() - 120,))
+    assert store.stages("run") == ["report"]
+    assert store.load("run", "plan") is None
+
+
+class StubbedManager:
+    """ ProductAnalysisManager with every paid stage replaced by a counter """
+
+    def __new__(cls, store, **kwargs):
+        from research_manager import ProductAnalysisManager
+        manager = ProductAnalysisManager(hedge_searches=False, **kwargs)
+        manager.checkpoints = store
+        manager.calls = []
+
+        async def plan(query):
+            manager.calls.append("plan")
+            return None
+
+        async def searches(plan):
+            manager.calls.append("search")
+            return ["result"]
+
+        async def analysis(query, results):
+            manager.calls.append("analysis")
+            return "analysis"
+
+        async def write(*args):
+            manager.calls.append("report")
+            return ReportData(short_summary="s", markdown_report="# Report", follow_up_questions=[])
+
+        async def email(report):
+            manager.calls.append("email")
+            return report
+
+        manager.plan_product_research = plan
+        manager.perform_searches = searches
+        manager.analyze_technical_feasibility = analysis
+        manager.analyze_business_impact = analysis
+        manager.write_product_analysis_report = write
+        manager.send_email = email
+        return manager
+
+
+async def _run(manager, idea):
+    return [update async for update in manager.run(idea)]
+
+
+def test_finished_run_is_not_resumed(tmp_path):
+    store = CheckpointStore(str(tmp_path / "checkpoints.db"))
+    idea = "AI-powered pricing optimization for ecommerce"
+
+    first = StubbedManager(store, tenant="acme", session="s1")
+    asyncio.run(_run(first, idea))
+    assert "email" in first.calls
+    assert store.stages(first.run_id) == []
+
+    again = StubbedManager(store, tenant="acme", session="s1")
+    updates = asyncio.run(_run(again, idea))
+    assert not any("Resuming" in update for update in updates)
+    assert again.calls == first.calls
+
+
+def test_unfinished_run_resumes_only_in_its_own_session(tmp_path):
+    store = CheckpointStore(str(tmp_path / "checkpoints.db"))
+    idea = "Slack integration for Jira tickets"
+
+    interrupted = StubbedManager(store, tenant="acme", session="s1")
+
+    async def fail(report):
+        raise RuntimeError("email provider down")
+    interrupted.send_email = fail
+    try:
+        asyncio.run(_run(interrupted, idea))
+    except RuntimeError:
+        pass
+    assert "report" in store.stages(interrupted.run_id)
+
+    other_tenant = StubbedManager(store, tenant="globex", session="s1")
+    asyncio.run(_run(other_tenant, idea))
+    assert "report" in other_tenant.calls
+
+    resumed = StubbedManager(store, tenant="acme", session="s1")
+    updates = asyncio.run(_run(resumed, idea))
+    assert any("Resuming" in update for update in updates)
+    assert resumed.calls == ["plan", "search", "email"]
@@ -0,0 +1,72 @@
+"""
+Regression tests for ClarificationSession: answers submitted from another thread are never lost,
+whether they arrive before, during or after the first wait.
+"""
+import asyncio
+import os
+import threading
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("TRACE_MODE", "off")
+
+from query_clarifying_agent import ClarificationSession
+
+
+class SlowAnswers(list):
+    """ Answers whose copy is slow, widening the window between checking for a waiter and storing them """
+
+    def __init__(self, items, started: threading.Event):
+        super().__init__(items)
+        self.started = started
+
+    def __iter__(self):
+        self.started.set()
+        time.sleep(0.2)
+        return super().__iter__()
+
+
+def test_answers_submitted_while_wait_starts_are_delivered():
+    session = ClarificationSession("AI meeting summarizer")
+    started = threading.Event()
+
+    async def main():
+        submitter = threading.Thread(target=session.submit_answers, args=(SlowAnswers(["Sales teams"], started),))
+        submitter.start()
+        await asyncio.to_thread(started.wait)
+        answers = await session.wait_answers(timeout=2)
+        await asyncio.to_thread(submitter.join)
+        return answers
+
+    assert asyncio.run(main()) == ["Sales teams"]
+
+
+def test_answers_before_and_after_waiting():
+    early = ClarificationSession("AI meeting summarizer")
+    early.submit_answers(["early"])
+    assert early.answered
+    assert asyncio.run(early.wait_answers(timeout=1)) == ["early"]
+
+    late = ClarificationSession("AI meeting summarizer")
+
+    async def main():
+        waiter = asyncio.ensure_future(late.wait_answers(timeout=2))
+        await asyncio.sleep(0.01)
+        await asyncio.to_thread(late.submit_answers, ["late"])
+        return await waiter
+
+    assert asyncio.run(main()) == ["late"]
+    assert late.answered
+
+
+def test_mvp_questions_name_the_researched_idea():
+    from query_clarifying_agent import gen_mvp_questions
+    context = "Product idea: AI meeting summarizer MVP\n\nResearch digest:\nTeams lose hours to meetings."
+    questions = asyncio.run(gen_mvp_questions(context, "Yes, proceed"))
+    assert "proceed" not in questions.lower()
+    assert "AI meeting summarizer" in questions
+    assert "MVP MVP" not in questions
+    assert len(questions.splitlines()) == 5
+
+    report = "# Product Feature Analysis: Churn alerts for SaaS CRMs\n\n## Executive Summary"
+    assert "Churn alerts for SaaS CRMs" in asyncio.run(gen_mvp_questions(report, "Yes"))
@@ -0,0 +1,86 @@
+"""
+Regression tests for the document index: incremental builds mask every passage of a changed or
+deleted file, including files whose passages were split across two segments.
+"""
+import os
+
+import pytest
+
+import doc_index
+from doc_index import DocumentIndex
+
+
+def _write(directory, name, text):
+    path = os.path.join(directory, name)
+    with open(path, "w") as f:
+        f.write(text)
+    # Incremental builds compare mtime and size; make every rewrite visible
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+    return path
+
+
+def _passages(term, count):
+    """ `count` passages of PASSAGE_WORDS words, each one containing `term` """
+    filler = " ".join(["lorem"] * (doc_index.PASSAGE_WORDS - 1))
+    return " ".join(f"{term} {filler}" for _ in range(count))
+
+
+@pytest.fixture
+def small_segments(monkeypatch):
+    monkeypatch.setattr(doc_index, "SEGMENT_PASSAGES", 4)
+
+
+def test_build_and_search(tmp_path):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    _write(docs, "churn.md", "# Churn alerts PRD\nCustomers churn when alerts arrive too late.")
+    _write(docs, "pricing.txt", "Pricing tiers for the analytics add-on.")
+    index = DocumentIndex(str(tmp_path / "index"))
+    assert index.build(str(docs)) == {"added": 2, "updated": 0, "removed": 0}
+
+    hits = index.search("churn alerts")
+    assert [hit.title for hit in hits] == ["Churn alerts PRD"]
+    assert hits[0].path.endswith("churn.md") and hits[0].score > 0
+    # Another process opening the same directory sees the same index
+    assert DocumentIndex(str(tmp_path / "index")).search("pricing tiers")[0].path.endswith("pricing.txt")
+
+
+def test_changed_file_spanning_two_segments_is_fully_masked(tmp_path, small_segments):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    _write(docs, "a.txt", _passages("alpha", 3))
+    b = _write(docs, "b.txt", _passages("bravo", 3))
+    index = DocumentIndex(str(tmp_path / "index"))
+    index.build(str(docs))
+    # a.txt and the first passage of b.txt fill the first segment, b.txt continues in the second
+    assert [span["segment"] for span in index.manifest["files"][b]["spans"]] == ["seg_00000", "seg_00001"]
+    assert len(index.search("bravo", k=10)) == 3
+
+    _write(docs, "b.txt", _passages("charlie", 2))
+    assert index.build(str(docs)) == {"added": 0, "updated": 1, "removed": 0}
+    assert index.search("bravo", k=10) == []
+    assert len(index.search("charlie", k=10)) == 2
+    assert index.stats()["passages"] == 5
+
+
+def test_deleted_file_spanning_two_segments_is_fully_masked(tmp_path, small_segments):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    _write(docs, "a.txt", _passages("alpha", 3))
+    b = _write(docs, "b.txt", _passages("bravo", 3))
+    index = DocumentIndex(str(tmp_path / "index"))
+    index.build(str(docs))
+
+    os.remove(b)
+    assert index.build(str(docs)) == {"added": 0, "updated": 0, "removed": 1}
+    assert index.search("bravo", k=10) == []
+    assert index.stats()["passages"] == 3
+    assert [meta["live_passages"] for meta in index.manifest["segments"]] == [3, 0]
+
+    # Compaction drops the masked passages and keeps the spans of the remaining files right
+    index.compact()
+    assert index.stats()["segments"] == 1 and index.stats()["passages"] == 3
+    os.remove(os.path.join(docs, "a.txt"))
+    index.build(str(docs))
+    assert index.search("alpha", k=10) == []
@@ -0,0 +1,116 @@
+"""
+Regression tests for outline-first feature creation: core features are written concurrently on
+their own router stage under the request's cancel token, and a failure falls back to the single
+creator call.
+"""
+import asyncio
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("TRACE_MODE", "off")
+
+import pytest
+
+import feature_agent
+from cancellation import CancelToken, use_token
+from feature_agent import CoreFeatureOutline, FeatureDefinition, FeatureOutline, create_feature
+
+OUTLINE = FeatureOutline(
+    feature_name="Churn Radar",
+    target_users=["CS managers"],
+    core_features=[CoreFeatureOutline(title="Risk Scoring", mvp=True, scope="Score accounts"),
+                   CoreFeatureOutline(title="Alert Routing", mvp=True, scope="Notify owners"),
+                   CoreFeatureOutline(title="Playbooks", mvp=False, scope="Suggest actions")],
+    competition=["Gainsight"],
+    acceptance_criteria=["Scores refresh daily"],
+    success_metrics=["Churn -10%"],
+)
+SINGLE = FeatureDefinition(feature_name="Single", target_users=[], core_features=["# Single"], competition=[],
+                           acceptance_criteria=[], success_metrics=[])
+
+
+class FakeResult:
+    def __init__(self, output):
+        self.final_output = output
+
+    def final_output_as(self, cls):
+        return self.final_output
+
+
+class FakeStages:
+    """ run_stage stand-in: records calls; core features take `delay` seconds and may fail """
+
+    def __init__(self, delay=0.05, fail_title=None):
+        self.calls, self.running, self.cancelled = [], 0, 0
+        self.max_running = 0
+        self.delay, self.fail_title = delay, fail_title
+
+    async def __call__(self, stage, agent, input, run_config=None, on_field=None, **kwargs):
+        self.calls.append((stage, agent.name))
+        if stage == "feature_outline":
+            return FakeResult(OUTLINE)
+        if stage == "feature_creator":
+            return FakeResult(SINGLE)
+        title = input.rsplit(": ", 1)[1]
+        if title == self.fail_title:
+            raise RuntimeError("malformed core feature")
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        finally:
+            self.running -= 1
+        return FakeResult(f"# {title}\nBody of {title}.")
+
+
+def test_outline_then_core_features_in_parallel(monkeypatch):
+    stages = FakeStages()
+    monkeypatch.setattr(feature_agent, "run_stage", stages)
+    draft = asyncio.run(create_feature("context"))
+    assert stages.calls[0] == ("feature_outline", "Agent_FeatureOutline")
+    assert stages.calls[1:] == [("core_feature", "Agent_CoreFeature")] * 3
+    assert stages.max_running == 3
+    assert draft.feature_name == "Churn Radar" and draft.competition == ["Gainsight"]
+    assert [body.splitlines()[0] for body in draft.core_features] == [
+        "# Risk Scoring (MVP)", "# Alert Routing (MVP)", "# Playbooks (Phase 2)"]
+
+
+def test_failed_core_feature_falls_back_to_single_creator(monkeypatch):
+    stages = FakeStages(delay=60, fail_title="Risk Scoring")
+    monkeypatch.setattr(feature_agent, "run_stage", stages)
+    draft = asyncio.run(create_feature("context"))
+    assert draft is SINGLE
+    assert stages.calls[-1] == ("feature_creator", feature_agent.feature_creator_agent.name)
+    # The other core features were stopped when one failed
+    assert stages.cancelled == 2
+
+
+def test_core_feature_tasks_belong_to_the_request_token(monkeypatch):
+    stages = FakeStages(delay=60)
+    monkeypatch.setattr(feature_agent, "run_stage", stages)
+    token = CancelToken("feature turn")
+
+    async def main():
+        with use_token(token):
+            caller = asyncio.ensure_future(create_feature("context"))
+        await asyncio.sleep(0.05)
+        assert stages.running == 3
+        assert token.cancel("reset") == 3
+        await asyncio.sleep(0.01)
+        assert stages.cancelled == 3
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+
+    asyncio.run(main())
+
+
+def test_core_features_have_their_own_stage():
+    from model_router import STAGE_ROUTES
+    from prompt_registry import PROMPTS, STAGE_AGENTS, TYPICAL_VARIABLE_TOKENS
+    assert PROMPTS["feature.core"].stage == "core_feature"
+    assert STAGE_AGENTS["core_feature"] == "feature_agent:core_feature_agent"
+    assert "core_feature" in STAGE_ROUTES and "core_feature" in TYPICAL_VARIABLE_TOKENS
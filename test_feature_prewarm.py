@@ -0,0 +1,52 @@
+"""
+Regression tests for FeaturePrewarmer.ready: a cancelled or slow pre-warm yields None, but a
+cancelled caller stays cancelled.
+"""
+import asyncio
+import concurrent.futures
+
+import pytest
+
+from feature_prewarm import FeaturePrewarm, FeaturePrewarmer
+
+
+def _prewarmer() -> FeaturePrewarmer:
+    prewarmer = FeaturePrewarmer()
+    prewarmer._future = concurrent.futures.Future()
+    return prewarmer
+
+
+def test_cancelled_caller_is_not_swallowed():
+    prewarmer = _prewarmer()
+
+    async def main():
+        waiter = asyncio.create_task(prewarmer.ready(timeout=5))
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        # The shield keeps the pre-warm itself running for a later turn
+        assert not prewarmer._future.cancelled()
+
+    asyncio.run(main())
+
+
+def test_cancelled_prewarm_gives_none():
+    prewarmer = _prewarmer()
+
+    async def main():
+        waiter = asyncio.create_task(prewarmer.ready(timeout=5))
+        await asyncio.sleep(0.05)
+        prewarmer.cancel()
+        return await waiter
+
+    assert asyncio.run(main()) is None
+    assert asyncio.run(_prewarmer().ready()) is None
+
+
+def test_timeout_and_result():
+    prewarmer = _prewarmer()
+    assert asyncio.run(prewarmer.ready(timeout=0.05)) is None
+    prepared = FeaturePrewarm(digest="digest", questions="1. Who?")
+    prewarmer._future.set_result(prepared)
+    assert asyncio.run(prewarmer.ready()) is prepared
@@ -0,0 +1,97 @@
+"""
+Regression tests for hedged calls: cancelling the caller cancels every attempt it started.
+"""
+import asyncio
+
+import pytest
+
+from cancellation import CancelToken, use_token
+from hedging import HedgePolicy
+
+
+def _policy(**kwargs) -> HedgePolicy:
+    policy = HedgePolicy("search", budget=1.0, **kwargs)
+    for _ in range(20):
+        policy.latencies.append(0.01)
+    policy.requests = 20
+    return policy
+
+
+class Attempts:
+    """ make_call factory whose attempts never finish on their own """
+
+    def __init__(self):
+        self.started = 0
+        self.cancelled = 0
+
+    async def __call__(self):
+        self.started += 1
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+
+
+@pytest.mark.parametrize("measure_losers", [False, True])
+def test_cancelled_caller_cancels_primary_and_hedge(measure_losers):
+    policy, attempts = _policy(measure_losers=measure_losers), Attempts()
+
+    async def main():
+        caller = asyncio.create_task(policy.run(attempts))
+        await asyncio.sleep(0.1)
+        assert attempts.started == 2
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+        await asyncio.sleep(0.01)
+        # Checked inside the loop: asyncio.run() would cancel leftovers itself on exit
+        assert attempts.cancelled == 2
+
+    asyncio.run(main())
+
+
+def test_cancelled_caller_cancels_primary_before_the_hedge():
+    policy, attempts = _policy(), Attempts()
+    policy.latencies.extend([5.0] * 20)
+
+    async def main():
+        caller = asyncio.create_task(policy.run(attempts))
+        await asyncio.sleep(0.05)
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+        await asyncio.sleep(0.01)
+        assert (attempts.started, attempts.cancelled) == (1, 1)
+
+    asyncio.run(main())
+
+
+def test_attempts_belong_to_the_request_token():
+    policy, attempts = _policy(), Attempts()
+    token = CancelToken("research run")
+
+    async def main():
+        with use_token(token):
+            caller = asyncio.create_task(policy.run(attempts))
+        await asyncio.sleep(0.1)
+        assert token.cancel("disconnect") == 2
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+        assert attempts.cancelled == 2
+
+    asyncio.run(main())
+
+
+def test_hedge_wins_over_straggler():
+    policy = _policy()
+    calls = []
+
+    async def call():
+        calls.append(len(calls))
+        await asyncio.sleep(1 if len(calls) == 1 else 0.01)
+        return len(calls)
+
+    assert asyncio.run(policy.run(call)) == 2
+    assert policy.hedge_wins == 1
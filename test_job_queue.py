@@ -0,0 +1,142 @@
+"""
+Regression tests for the job queue: a job is claimed by exactly one worker, a worker that lost its
+lease to the reaper can no longer heartbeat, complete or fail the job, and a cancelled job stops
+its worker at the next heartbeat.
+"""
+import threading
+import time
+
+import pytest
+
+from job_queue import CANCELLED, DONE, FAILED, QUEUED, RUNNING, JobQueue, LocalRedisStandIn, RedisJobQueue, SQLiteJobQueue
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def queue(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteJobQueue(str(tmp_path / "jobs.db"), max_attempts=2)
+    return RedisJobQueue(client=LocalRedisStandIn(), max_attempts=2)
+
+
+def test_base_queue_is_abstract():
+    with pytest.raises(TypeError):
+        JobQueue()
+
+
+def test_concurrent_claims_hand_out_each_job_once(queue):
+    job_ids = {queue.enqueue("simulated", {"n": n}) for n in range(40)}
+    claimed, lock = [], threading.Lock()
+
+    def worker(worker_id):
+        while True:
+            job = queue.claim(worker_id)
+            if job is None:
+                return
+            assert job.status == RUNNING and job.worker_id == worker_id and job.attempts == 1
+            with lock:
+                claimed.append(job.job_id)
+
+    threads = [threading.Thread(target=worker, args=(f"w{i}",)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(claimed) == sorted(job_ids)
+
+
+def test_concurrent_reapers_requeue_an_expired_job_once(queue):
+    job_id = queue.enqueue("simulated", {})
+    queue.claim("dead-worker", visibility_timeout=0.01)
+    time.sleep(0.05)
+    threads = [threading.Thread(target=queue.requeue_expired) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert queue.get(job_id).status == QUEUED
+    assert queue.counts().get(QUEUED) == 1
+    assert queue.claim("w2").job_id == job_id
+    assert queue.claim("w3") is None
+
+
+def test_reaped_worker_cannot_heartbeat_or_finish(queue):
+    job_id = queue.enqueue("simulated", {})
+    queue.claim("slow-worker", visibility_timeout=0.01)
+    time.sleep(0.05)
+    job = queue.claim("w2")
+    assert job.job_id == job_id and job.attempts == 2
+
+    assert not queue.heartbeat(job_id, "slow-worker")
+    queue.complete(job_id, "slow-worker", "stale report")
+    queue.fail(job_id, "slow-worker", "stale error")
+    job = queue.get(job_id)
+    assert job.status == RUNNING and job.worker_id == "w2" and job.result is None
+
+    assert queue.heartbeat(job_id, "w2")
+    queue.complete(job_id, "w2", "report")
+    assert queue.get(job_id).status == DONE and queue.get(job_id).result == "report"
+
+
+def test_expired_job_fails_after_max_attempts(queue):
+    job_id = queue.enqueue("simulated", {})
+    for attempt in range(2):
+        assert queue.claim(f"w{attempt}", visibility_timeout=0.01).job_id == job_id
+        time.sleep(0.05)
+    assert queue.claim("w3") is None
+    job = queue.get(job_id)
+    assert job.status == FAILED and job.error == "lease expired"
+
+
+def test_failed_job_is_retried_then_failed(queue):
+    job_id = queue.enqueue("simulated", {})
+    queue.fail(queue.claim("w1").job_id, "w1", "boom")
+    assert queue.get(job_id).status == QUEUED
+    queue.fail(queue.claim("w2").job_id, "w2", "boom again")
+    job = queue.get(job_id)
+    assert job.status == FAILED and job.error == "boom again"
+    assert queue.claim("w3") is None
+
+
+def test_cancelled_queued_job_is_never_claimed(queue):
+    job_id = queue.enqueue("simulated", {})
+    assert queue.cancel(job_id, "disconnect")
+    assert queue.claim("w1") is None
+    job = queue.get(job_id)
+    assert job.status == CANCELLED and job.error == "disconnect"
+    assert not queue.cancel(job_id)
+
+
+def test_cancelled_running_job_fails_its_heartbeat(queue):
+    job_id = queue.enqueue("simulated", {})
+    queue.claim("w1")
+    assert queue.cancel(job_id, "api_cancel")
+    assert not queue.heartbeat(job_id, "w1")
+    queue.complete(job_id, "w1", "late report")
+    queue.fail(job_id, "w1", "late error")
+    queue.requeue_expired()
+    job = queue.get(job_id)
+    assert job.status == CANCELLED and job.result is None and job.error == "api_cancel"
+    assert queue.counts().get(RUNNING, 0) == 0 and queue.counts().get(QUEUED, 0) == 0
+
+
+def test_finished_job_cannot_be_cancelled(queue):
+    job_id = queue.enqueue("simulated", {})
+    queue.complete(queue.claim("w1").job_id, "w1", "report")
+    assert not queue.cancel(job_id)
+    assert queue.get(job_id).status == DONE
+
+
+def test_worker_stops_a_job_cancelled_while_running(queue):
+    from research_worker import process_one
+    job_id = queue.enqueue("simulated", {"seconds": 30})
+    threading.Timer(0.2, queue.cancel, args=(job_id, "disconnect")).start()
+    start = time.time()
+    assert process_one(queue, "w1", visibility_timeout=0.15).job_id == job_id
+    assert time.time() - start < 5
+    assert queue.get(job_id).status == CANCELLED
+
+
+def test_worker_pool_rejects_in_process_queue():
+    from research_worker import run_pool
+    with pytest.raises(ValueError):
+        run_pool(2, "local-redis://")
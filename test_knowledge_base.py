@@ -0,0 +1,85 @@
+"""
+Regression tests for the knowledge base: facts stay within their tenant, internal documents are
+never mined, and only sentences naming competitors in a market sense become competitor facts.
+"""
+import asyncio
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("TRACE_MODE", "off")
+
+from knowledge_base import KnowledgeBase, extract_facts
+
+MARKET_TEXT = (
+    "The meeting transcription market reached $3.2 billion in 2024 and keeps growing quickly. "
+    "Otter.ai charges $16.99 per user per month for its business plan. "
+    "About 48% of enterprises already use meeting transcription tools in their teams. "
+    "Key players in meeting transcription include Otter.ai, Fireflies and Gong. "
+    "Meeting transcription competitors such as Fireflies offer a free tier for small teams. "
+)
+QUERY = "meeting transcription market pricing"
+
+
+def test_facts_are_scoped_to_tenant(tmp_path):
+    kb = KnowledgeBase(str(tmp_path / "kb.db"))
+    assert kb.add(QUERY, MARKET_TEXT, "https://example.com", tenant="acme") >= 4
+    assert kb.answer(QUERY, tenant="acme") is not None
+    assert kb.relevant(QUERY, tenant="globex") == []
+    assert kb.answer(QUERY, tenant="globex") is None
+    assert kb.entities(tenant="globex") == []
+    assert kb.entities(tenant="acme")
+
+
+def test_same_fact_is_kept_per_tenant(tmp_path):
+    kb = KnowledgeBase(str(tmp_path / "kb.db"))
+    kb.add(QUERY, MARKET_TEXT, "a", tenant="acme")
+    kb.add(QUERY, MARKET_TEXT, "b", tenant="globex")
+    assert {fact.source for fact in kb.relevant(QUERY, tenant="acme")} == {"a"}
+    assert {fact.source for fact in kb.relevant(QUERY, tenant="globex")} == {"b"}
+
+
+def test_base_without_tenant_column_is_migrated(tmp_path):
+    import sqlite3
+    path = str(tmp_path / "kb.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE facts (id INTEGER PRIMARY KEY AUTOINCREMENT, hash TEXT UNIQUE NOT NULL, "
+                     "kind TEXT NOT NULL, entity TEXT NOT NULL, text TEXT NOT NULL, query TEXT NOT NULL, "
+                     "source TEXT NOT NULL, created_at REAL NOT NULL)")
+    kb = KnowledgeBase(path)
+    kb.add(QUERY, MARKET_TEXT, "a")
+    assert kb.answer(QUERY) is not None
+
+
+def test_competitor_facts_need_a_market_sense():
+    loose = [
+        "Team leaders in Sales review the dashboards daily across the company.",
+        "The category is crowded and players like Otter.ai keep shipping features.",
+        "Our vendors in Europe such as Acme Logistics deliver every week on time.",
+    ]
+    for sentence in loose:
+        assert extract_facts(sentence) == [], sentence
+    facts = extract_facts("Gong is the market leader in revenue intelligence for sales teams.")
+    assert [(fact.kind, fact.entity) for fact in facts] == [("competitor", "Gong")]
+    facts = extract_facts("Competitors such as Fireflies offer a free tier for small teams.")
+    assert [(fact.kind, fact.entity) for fact in facts] == [("competitor", "Fireflies")]
+
+
+def test_document_hits_are_not_learned(tmp_path, monkeypatch):
+    import research_manager
+    from planner_agent import WebSearchItem
+    from search_providers import SearchHit
+
+    async def search_all(providers, query, reason=""):
+        return [SearchHit(provider="docs", source="docs/prd.md", text=MARKET_TEXT, score=3.0),
+                SearchHit(provider="docs", source="docs/notes.md", text=MARKET_TEXT, score=2.0)]
+
+    async def summarize_pages(query, pages):
+        return MARKET_TEXT
+
+    monkeypatch.setattr(research_manager, "search_all", search_all)
+    manager = research_manager.ProductAnalysisManager(hedge_searches=False, tenant="acme")
+    manager.knowledge = KnowledgeBase(str(tmp_path / "kb.db"))
+    manager.summarize_pages = summarize_pages
+    summary = asyncio.run(manager.search(WebSearchItem(query=QUERY, reason="market")))
+    assert summary == MARKET_TEXT
+    assert manager.knowledge.stats()["facts"] == 0
@@ -0,0 +1,132 @@
+"""
+Regression tests for the model router: stage-specific health, recovery of avoided models, and no
+cross-model retry once a tool-using agent has called a tool.
+"""
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("TRACE_MODE", "off")
+
+from agents.models.interface import Model, ModelProvider
+
+import model_router
+from model_router import MIN_SAMPLES, ModelRouter, StageRoute
+
+ROUTES = {
+    "writer": StageRoute(models=["mini", "backup"], latency_slo=120),
+    "planner": StageRoute(models=["mini", "backup"], latency_slo=15),
+}
+
+
+def test_slow_calls_of_one_stage_do_not_affect_another():
+    router = ModelRouter(routes=ROUTES, profile="default")
+    for _ in range(MIN_SAMPLES):
+        router.record("writer", "mini", 60.0)
+        router.record("planner", "mini", 2.0)
+    assert router.choose("planner") == "mini"
+    assert router.choose("writer") == "mini"
+
+
+def test_avoided_primary_is_probed_and_recovers(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(model_router.time, "time", lambda: clock[0])
+    router = ModelRouter(routes=ROUTES, profile="default")
+    for _ in range(MIN_SAMPLES):
+        router.choose("planner")
+        router.record("planner", "mini", 40.0)
+    assert router.choose("planner") == "backup"
+
+    clock[0] += model_router.PROBE_INTERVAL
+    assert router.choose("planner") == "mini"
+    assert router.decisions[-1].reason == "probe"
+    # One probe per interval
+    assert router.choose("planner") == "backup"
+
+
+def test_old_samples_expire(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(model_router.time, "time", lambda: clock[0])
+    router = ModelRouter(routes=ROUTES, profile="default")
+    for _ in range(MIN_SAMPLES):
+        router.record("planner", "mini", 40.0, error=True)
+    assert router._stats("planner", "mini").p90() == 40.0
+    clock[0] += model_router.SAMPLE_TTL + 1
+    assert router._stats("planner", "mini").p90() is None
+    assert router.choose("planner") == "mini"
+
+
+def test_report_aggregates_per_model():
+    router = ModelRouter(routes=ROUTES, profile="default")
+    router.record("writer", "mini", 1.0, input_tokens=10, output_tokens=5)
+    router.record("planner", "mini", 1.0, input_tokens=1, output_tokens=1)
+    report = router.report()
+    assert report["mini"]["calls"] == 2
+    assert report["mini"]["tokens"] == 17
+    assert set(report["mini"]["stages"]) == {"writer", "planner"}
+
+
+def test_search_fast_profile_is_not_a_no_op():
+    route = model_router.STAGE_ROUTES["search"]
+    assert route.fast_model is None or route.fast_model != route.models[0]
+
+
+class _FakeModel(Model):
+    """ Model that asks for the `research` tool on its first turn and then fails, like a dropped connection """
+
+    def __init__(self, name, calls, use_tool):
+        self.name, self.calls, self.use_tool = name, calls, use_tool
+
+    async def get_response(self, system_instructions, input, *args, **kwargs):
+        from agents.items import ModelResponse
+        from agents.usage import Usage
+        from openai.types.responses import ResponseFunctionToolCall
+        self.calls.append(self.name)
+        turn = sum(1 for item in input if isinstance(item, dict) and item.get("type") == "function_call_output") \
+            if isinstance(input, list) else 0
+        if self.use_tool and turn == 0:
+            call = ResponseFunctionToolCall(type="function_call", call_id="call_1", name="research",
+                                            arguments='{"idea": "churn"}', id="fc_1", status="completed")
+            return ModelResponse(output=[call], usage=Usage(), response_id=None)
+        raise RuntimeError("connection reset")
+
+    def stream_response(self, *args, **kwargs):
+        raise NotImplementedError
+
+
+def _run_failing_stage(monkeypatch, use_tool):
+    import asyncio
+    from agents import Agent, RunConfig, function_tool
+
+    calls, research_runs = [], []
+
+    @function_tool
+    def research(idea: str) -> str:
+        """ Run the research pipeline """
+        research_runs.append(idea)
+        return "report"
+
+    class Provider(ModelProvider):
+        def get_model(self, model_name):
+            return _FakeModel(model_name, calls, use_tool)
+
+    monkeypatch.setattr(model_router, "router", ModelRouter(routes={"agent": ROUTES["writer"]}, profile="default"))
+    agent = Agent(name="Agent_Research", instructions="Research", model="mini", tools=[research])
+    try:
+        asyncio.run(model_router.run_stage("agent", agent, "churn", run_config=RunConfig(model_provider=Provider(),
+                                                                                         tracing_disabled=True)))
+    except RuntimeError as e:
+        assert "connection reset" in str(e)
+    return calls, research_runs
+
+
+def test_failure_after_a_tool_call_is_not_rerun_on_another_model(monkeypatch):
+    calls, research_runs = _run_failing_stage(monkeypatch, use_tool=True)
+    # The tool ran once; retrying on "backup" would have run the whole research pipeline again
+    assert research_runs == ["churn"]
+    assert calls == ["mini", "mini"]
+
+
+def test_failure_before_any_tool_call_is_retried_on_the_next_model(monkeypatch):
+    calls, research_runs = _run_failing_stage(monkeypatch, use_tool=False)
+    assert research_runs == []
+    assert calls == ["mini", "backup"]
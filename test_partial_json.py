@@ -0,0 +1,79 @@
+"""
+Regression tests for the incremental JSON parser behind streamed report and feature fields.
+"""
+import json
+
+import pytest
+
+from partial_json import FieldEvent, StreamingJSONParser, parse_partial
+
+REPORT = {
+    "short_summary": "Churn alerts pay off for \"mid-market\" CRMs, {mostly}.",
+    "markdown_report": "# Report\n\n## Executive Summary\nC:\\path, [brackets] and commas",
+    "follow_up_questions": ["Pricing?", "Which CRMs first?"],
+    "score": 7.5,
+    "approved": True,
+    "owner": None,
+}
+
+
+def _feed(text: str, chunk: int):
+    parser = StreamingJSONParser()
+    events = []
+    for i in range(0, len(text), chunk):
+        events.extend(parser.feed(text[i:i + chunk]))
+    return parser, events
+
+
+@pytest.mark.parametrize("chunk", [1, 3, 17, 10_000])
+def test_fields_are_reported_once_in_order_whatever_the_chunking(chunk):
+    parser, events = _feed(json.dumps(REPORT, indent=2), chunk)
+    assert parser.done
+    assert events == [
+        FieldEvent(("short_summary",), REPORT["short_summary"]),
+        FieldEvent(("markdown_report",), REPORT["markdown_report"]),
+        FieldEvent(("follow_up_questions", 0), "Pricing?"),
+        FieldEvent(("follow_up_questions", 1), "Which CRMs first?"),
+        FieldEvent(("follow_up_questions",), REPORT["follow_up_questions"]),
+        FieldEvent(("score",), 7.5),
+        FieldEvent(("approved",), True),
+        FieldEvent(("owner",), None),
+    ]
+
+
+def test_preamble_and_code_fence_are_skipped():
+    _, events = _feed('Here is the report:\n```json\n{"short_summary": "ok"}\n```', 4)
+    assert events == [FieldEvent(("short_summary",), "ok")]
+
+
+def test_nested_values_are_reported_at_depth_two_only():
+    _, events = _feed('{"core_features": [{"name": "Alerts", "steps": ["a", "b"]}]}', 5)
+    assert events[0] == FieldEvent(("core_features", 0), {"name": "Alerts", "steps": ["a", "b"]})
+    assert all(len(event.path) <= 2 for event in events)
+
+
+def test_field_is_not_reported_before_it_closes():
+    parser = StreamingJSONParser()
+    assert parser.feed('{"short_summary": "Churn al') == []
+    assert parser.feed('erts", "score": 4') == [FieldEvent(("short_summary",), "Churn alerts")]
+    assert parser.feed('2}') == [FieldEvent(("score",), 42)]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"short_summary": "Churn al', {"short_summary": "Churn al"}),
+    ('{"a": 1, "b": [1, 2', {"a": 1, "b": [1, 2]}),
+    ('{"a": 1, "b":', {"a": 1}),
+    ('{"a": "x\\', {"a": "x"}),
+    ('noise {"a": {"b": tr', {"a": {}}),
+    ('no json here', None),
+])
+def test_parse_partial(text, expected):
+    assert parse_partial(text) == expected
+
+
+def test_parse_partial_of_every_prefix_never_raises():
+    text = json.dumps(REPORT)
+    for end in range(len(text) + 1):
+        value = parse_partial(text[:end])
+        assert value is None or isinstance(value, dict)
+    assert parse_partial(text) == REPORT
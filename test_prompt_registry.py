@@ -0,0 +1,60 @@
+"""
+Regression tests for the prompt prefix lock: agent instructions are part of the locked prefix, and the
+check reads them without running the Streamlit or Gradio scripts.
+"""
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("TRACE_MODE", "off")
+
+import prompt_registry
+from prompt_registry import PROMPTS, STAGE_AGENTS, check_prefix_stability
+
+
+def test_instruction_change_is_reported(tmp_path, monkeypatch):
+    import writer_agent
+    monkeypatch.setattr(prompt_registry, "LOCK_FILE", str(tmp_path / "lock.json"))
+    monkeypatch.setattr(prompt_registry, "STAGE_AGENTS", {"writer": STAGE_AGENTS["writer"],
+                                                          "report_section": STAGE_AGENTS["report_section"]})
+    assert check_prefix_stability(update=True) == []
+    assert check_prefix_stability() == []
+
+    monkeypatch.setattr(writer_agent.section_writer_agent, "instructions",
+                        writer_agent.section_writer_agent.instructions + "\nBe brief.")
+    problems = check_prefix_stability()
+    assert len(problems) == 1 and problems[0].startswith("report_section: agent instructions changed")
+
+
+def test_section_prompts_have_their_own_stage():
+    from model_router import STAGE_ROUTES
+    assert PROMPTS["writer.section"].stage == "report_section"
+    assert STAGE_AGENTS["report_section"] == "writer_agent:section_writer_agent"
+    assert "report_section" in STAGE_ROUTES
+
+
+
+def test_check_loads_every_stage_without_running_a_ui_script():
+    import subprocess
+    import sys
+    script = ("import sys, prompt_registry\n"
+              "assert all(prompt_registry._agent_instructions(stage) for stage in prompt_registry.STAGE_AGENTS)\n"
+              "print(sorted(m for m in ('app', 'streamlit', 'deep_research', 'gradio') if m in sys.modules))")
+    output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(prompt_registry.__file__)),
+                            env={**os.environ, "OPENAI_API_KEY": "test", "TRACE_MODE": "off"}).stdout
+    assert output.strip().splitlines()[-1] == "[]"
+
+
+def test_both_research_agents_use_the_locked_instructions():
+    import ast
+    root = os.path.dirname(os.path.abspath(prompt_registry.__file__))
+    for script in ("app.py", "deep_research.py"):
+        with open(os.path.join(root, script)) as f:
+            tree = ast.parse(f.read())
+        agents = [call for call in ast.walk(tree) if isinstance(call, ast.Call)
+                  and getattr(call.func, "id", None) == "Agent"
+                  and any(kw.arg == "name" and getattr(kw.value, "value", None) == "Alex_ResearchManager"
+                          for kw in call.keywords)]
+        assert len(agents) == 1, script
+        instructions = next(kw.value for kw in agents[0].keywords if kw.arg == "instructions")
+        assert isinstance(instructions, ast.Name) and instructions.id == "RESEARCH_AGENT_INSTRUCTIONS", script
@@ -0,0 +1,87 @@
+"""
+Regression tests for report reuse: archived reports stay within their tenant, ideas that differ
+in one word are not served each other's report, and stale reports are refreshed once per tenant.
+"""
+import asyncio
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("TRACE_MODE", "off")
+
+from report_archive import ReportArchive, terms_compatible
+
+
+def test_lookup_is_scoped_to_tenant(tmp_path):
+    archive = ReportArchive(str(tmp_path / "archive.db"))
+    archive.store("AI meeting summarizer", '{"report": "acme"}', tenant="acme")
+    assert archive.lookup("AI meeting summarizer", tenant="globex") is None
+    hit = archive.lookup("AI meeting summarizer", tenant="acme")
+    assert hit is not None and hit.report_json == '{"report": "acme"}'
+
+
+def test_same_query_is_archived_per_tenant(tmp_path):
+    archive = ReportArchive(str(tmp_path / "archive.db"))
+    first = archive.store("AI meeting summarizer", "a", tenant="acme")
+    second = archive.store("AI meeting summarizer", "b", tenant="globex")
+    assert first != second
+    assert archive.lookup("AI meeting summarizer", tenant="acme").report_json == "a"
+
+
+def test_replaced_word_is_not_reused(tmp_path):
+    archive = ReportArchive(str(tmp_path / "archive.db"))
+    archive.store("AI-powered pricing optimization for ecommerce", "ecommerce")
+    archive.store("Slack integration for Jira tickets", "jira")
+    assert archive.lookup("AI-powered pricing optimization for hotels") is None
+    assert archive.lookup("Jira integration for Slack messages") is None
+
+
+def test_rephrasing_is_reused(tmp_path):
+    archive = ReportArchive(str(tmp_path / "archive.db"))
+    archive.store("meeting notes summarization with AI", "meetings")
+    hit = archive.lookup("AI meeting summarizer")
+    assert hit is not None and hit.report_json == "meetings"
+
+
+def test_terms_compatible():
+    assert terms_compatible("Churn alerts for SaaS CRM", "churn alert for saas CRMs")
+    assert not terms_compatible("Slack integration for Jira tickets", "Jira integration for Slack messages")
+
+
+def test_archive_without_tenant_column_is_migrated(tmp_path):
+    import sqlite3
+    path = str(tmp_path / "archive.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE reports (id INTEGER PRIMARY KEY AUTOINCREMENT, query TEXT NOT NULL, "
+                     "report TEXT NOT NULL, embedding BLOB NOT NULL, created_at REAL NOT NULL, "
+                     "hits INTEGER NOT NULL DEFAULT 0)")
+    archive = ReportArchive(path)
+    archive.store("AI meeting summarizer", "old")
+    assert archive.lookup("AI meeting summarizer").report_json == "old"
+
+
+def test_refresh_is_deduplicated_per_tenant(monkeypatch):
+    import research_manager
+
+    class FakeManager:
+        def __init__(self, **kwargs):
+            pass
+
+        async def run(self, query, run_id=None):
+            yield "refreshed"
+
+    submitted = []
+    monkeypatch.setattr(research_manager, "ProductAnalysisManager", FakeManager)
+    monkeypatch.setattr(research_manager.background_loop, "submit", submitted.append)
+    monkeypatch.setattr(research_manager, "_refreshing", set())
+
+    research_manager.schedule_refresh("churn alerts", tenant="acme")
+    # Each tenant has its own archived copy of the query, so each gets its own refresh
+    research_manager.schedule_refresh("churn alerts", tenant="globex")
+    research_manager.schedule_refresh("churn alerts", tenant="acme")
+    assert len(submitted) == 2
+
+    asyncio.run(submitted.pop(0))
+    research_manager.schedule_refresh("churn alerts", tenant="acme")
+    assert len(submitted) == 2
+    for coro in submitted:
+        coro.close()
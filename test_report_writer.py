@@ -0,0 +1,59 @@
+"""
+Regression tests for the parallel report writer: its calls go to their own router stages and
+each section is streamed as soon as it is written.
+"""
+import asyncio
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ["KNOWLEDGE_BASE"] = "0"
+os.environ.setdefault("TRACE_MODE", "off")
+
+import research_manager
+from partial_json import FieldEvent
+from writer_agent import REPORT_SECTIONS, ReportOutline, ReportSummary, SectionOutline
+
+
+class FakeResult:
+    def __init__(self, output):
+        self.final_output = output
+
+    def final_output_as(self, cls):
+        return self.final_output
+
+
+def fake_run_stage(calls):
+    async def run_stage(stage, agent, input, on_field=None, **kwargs):
+        calls.append(stage)
+        if stage == "report_outline":
+            return FakeResult(ReportOutline(sections=[SectionOutline(title=title, key_points=["point"])
+                                                     for title in REPORT_SECTIONS]))
+        if stage == "report_summary":
+            if on_field is not None:
+                on_field(FieldEvent(("short_summary",), "Summary."))
+            return FakeResult(ReportSummary(short_summary="Summary.", follow_up_questions=["Pricing?"]))
+        await asyncio.sleep(0.01)
+        return FakeResult(f"Body of {input.split('Section: ')[1].splitlines()[0]}.")
+    return run_stage
+
+
+def test_parallel_writer_stages(monkeypatch):
+    calls = []
+    monkeypatch.setattr(research_manager, "run_stage", fake_run_stage(calls))
+    manager = research_manager.ProductAnalysisManager(hedge_searches=False)
+    report = asyncio.run(manager.write_report_in_parallel("Churn alerts", ["result"], "tech", "business"))
+    assert calls == ["report_outline"] + ["report_section"] * len(REPORT_SECTIONS) + ["report_summary"]
+    assert report.short_summary == "Summary."
+    assert report.markdown_report.startswith("# Product Feature Analysis: Churn alerts")
+
+
+def test_parallel_writer_streams_each_section(monkeypatch):
+    calls, fields = [], []
+    monkeypatch.setattr(research_manager, "run_stage", fake_run_stage(calls))
+    manager = research_manager.ProductAnalysisManager(hedge_searches=False, on_report_field=fields.append)
+    report = asyncio.run(manager.write_report_in_parallel("Churn alerts", ["result"], "tech", "business"))
+    sections = sorted(field for field in fields if field.path[0] == "markdown_report")
+    assert [field.path[1] for field in sections] == list(range(len(REPORT_SECTIONS)))
+    assert all(field.value in report.markdown_report for field in sections)
+    assert sections[0].value.startswith("## Executive Summary")
+    assert fields[-1].path == ("short_summary",)
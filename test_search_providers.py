@@ -0,0 +1,69 @@
+"""
+Regression tests for search providers: the interface is abstract, and merged hits are ranked by
+score relative to each provider's best, times the provider's weight.
+"""
+import asyncio
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("TRACE_MODE", "off")
+
+import pytest
+
+from search_providers import SearchHit, SearchProvider, merge_hits, search_all
+
+
+def _hit(provider, source, score):
+    return SearchHit(provider=provider, source=source, text=f"text of {source}", score=score)
+
+
+class StaticProvider(SearchProvider):
+    def __init__(self, name, hits=None, error=None):
+        self.name, self.hits, self.error = name, hits or [], error
+
+    async def search(self, query, reason=""):
+        if self.error is not None:
+            raise self.error
+        return self.hits
+
+
+def test_provider_interface_is_abstract():
+    with pytest.raises(TypeError):
+        SearchProvider()
+
+    class Incomplete(SearchProvider):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_merge_normalizes_scores_per_provider():
+    # BM25 scores are unbounded, web ranks are at most 1: neither may dominate by scale alone
+    merged = merge_hits({
+        "docs": [_hit("docs", "prd.md#0", 24.0), _hit("docs", "prd.md#3", 6.0)],
+        "local": [_hit("local", "a.com", 1.0), _hit("local", "b.com", 0.5)],
+    })
+    # 24/24 and 1/1 tie, then b.com at 0.5 beats prd.md#3 at 6/24
+    assert [hit.source for hit in merged] == ["prd.md#0", "a.com", "b.com", "prd.md#3"]
+
+
+def test_merge_applies_weights_and_limit(monkeypatch):
+    monkeypatch.setenv("SEARCH_WEIGHT_DOCS", "0.4")
+    merged = merge_hits({
+        "docs": [_hit("docs", "prd.md#0", 24.0)],
+        "local": [_hit("local", f"{n}.com", 1.0 - n / 10) for n in range(5)],
+        "empty": [],
+        "zero": [_hit("zero", "z.com", 0.0)],
+    }, limit=4)
+    assert [hit.source for hit in merged] == ["0.com", "1.com", "2.com", "3.com"]
+    assert [hit.source for hit in merge_hits({"docs": [_hit("docs", "prd.md#0", 24.0)],
+                                              "local": [_hit("local", "a.com", 1.0), _hit("local", "b.com", 0.3)]})
+            ] == ["a.com", "prd.md#0", "b.com"]
+
+
+def test_search_all_skips_failed_providers():
+    good = StaticProvider("local", [_hit("local", "a.com", 1.0)])
+    bad = StaticProvider("docs", error=RuntimeError("index missing"))
+    assert [hit.source for hit in asyncio.run(search_all([good, bad], "churn"))] == ["a.com"]
+    assert asyncio.run(search_all([bad], "churn")) is None
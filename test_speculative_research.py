@@ -0,0 +1,146 @@
+"""
+Regression tests for speculative research: searches start on the bare idea while the clarifying
+questions are answered, the plan is reconciled by query overlap, only the delta searches are
+launched, unused speculative searches are cancelled, and unanswered questions time out.
+"""
+import asyncio
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ["KNOWLEDGE_BASE"] = "0"
+os.environ["CHECKPOINTS"] = "0"
+os.environ.setdefault("TRACE_MODE", "off")
+
+import pytest
+
+import research_manager
+from planner_agent import WebSearchItem, WebSearchPlan
+from query_clarifying_agent import ClarificationSession
+from research_manager import ProductAnalysisManager, query_similarity
+
+IDEA = "AI meeting summarizer"
+CLARIFIED = "AI meeting summarizer for sales teams"
+PLANS = {
+    IDEA: ["AI meeting summarizer market size", "AI meeting summarizer competitors",
+           "meeting summarizer pricing models", "remote work meeting statistics"],
+    CLARIFIED: ["AI meeting summarizer market size", "AI meeting summarizer competitors pricing",
+                "sales call recording tools", "CRM integration for sales notes"],
+}
+
+
+def _plan(queries):
+    return WebSearchPlan(searches=[WebSearchItem(reason="test", query=query) for query in queries])
+
+
+class StubManager(ProductAnalysisManager):
+    """ Plans from PLANS; every search records its query and waits until released """
+
+    def __init__(self):
+        super().__init__(hedge_searches=False)
+        self.started, self.cancelled = [], []
+        self.release = asyncio.Event()
+
+    async def plan_product_research(self, query):
+        return _plan(PLANS[query])
+
+    async def search(self, item):
+        self.started.append(item.query)
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled.append(item.query)
+            raise
+        return f"result: {item.query}"
+
+
+@pytest.fixture(autouse=True)
+def clarified_query(monkeypatch):
+    async def create_query(original_query, answers):
+        return CLARIFIED
+    monkeypatch.setattr(research_manager, "create_query", create_query)
+
+
+def test_query_similarity_is_jaccard_of_significant_terms():
+    assert query_similarity("AI meeting summarizer market size", "AI meeting summarizer market size") == 1.0
+    # {meeting, summarizer, competitors} vs {meeting, summarizer, competitors, pricing}
+    assert query_similarity("AI meeting summarizer competitors", "AI meeting summarizer competitors pricing") == 0.75
+    assert query_similarity("sales call recording tools", "remote work meeting statistics") == 0.0
+    assert query_similarity("AI", "an AI") == 0.0
+
+
+def test_only_delta_searches_are_launched_and_unused_ones_cancelled():
+    async def main():
+        manager, clarification = StubManager(), ClarificationSession(IDEA)
+        run = asyncio.ensure_future(manager.speculative_research(IDEA, clarification))
+        await asyncio.sleep(0.01)
+        speculative = list(manager.started)
+        assert len(speculative) == research_manager.SPECULATIVE_SEARCHES
+
+        clarification.submit_answers(["Sales teams"])
+        await asyncio.sleep(0.01)
+        manager.release.set()
+        query, results = await run
+        return manager, speculative, query, results
+
+    manager, speculative, query, results = asyncio.run(main())
+    assert query == CLARIFIED
+    # The two matching speculative searches are reused; only the two new ones are launched
+    assert manager.started[len(speculative):] == ["sales call recording tools", "CRM integration for sales notes"]
+    assert manager.cancelled == ["meeting summarizer pricing models"]
+    assert sorted(results) == sorted(f"result: {search}" for search in [
+        "AI meeting summarizer market size", "AI meeting summarizer competitors",
+        "sales call recording tools", "CRM integration for sales notes"])
+    assert manager.searches_planned == manager.searches_done == 4
+
+
+def test_unanswered_clarification_falls_back_to_the_original_plan(monkeypatch):
+    monkeypatch.setattr(research_manager, "CLARIFICATION_TIMEOUT", 0.05)
+
+    async def main():
+        manager = StubManager()
+        manager.release.set()
+        return manager, await manager.speculative_research(IDEA, ClarificationSession(IDEA))
+
+    manager, (query, results) = asyncio.run(main())
+    assert query == IDEA
+    assert sorted(manager.started) == sorted(PLANS[IDEA])
+    assert len(results) == len(PLANS[IDEA]) and manager.cancelled == []
+
+
+def test_cancelled_run_cancels_speculative_searches():
+    async def main():
+        manager, clarification = StubManager(), ClarificationSession(IDEA)
+        run = asyncio.ensure_future(manager.speculative_research(IDEA, clarification))
+        await asyncio.sleep(0.01)
+        run.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await run
+        await asyncio.sleep(0.01)
+        assert sorted(manager.cancelled) == sorted(manager.started)
+        assert len(manager.started) == research_manager.SPECULATIVE_SEARCHES
+
+    asyncio.run(main())
+
+
+class AnsweredManager:
+    def __init__(self, **kwargs):
+        self.cancel_token = kwargs["cancel_token"]
+
+    async def run(self, feature_idea, clarification=None):
+        answers = await clarification.wait_answers(timeout=2)
+        yield research_manager.ResearchUpdate(f"{feature_idea}: {answers[0]}", research_manager.REPORT)
+
+
+def test_clarified_research_outlives_the_turn_that_asked(monkeypatch):
+    monkeypatch.setattr(research_manager, "ProductAnalysisManager", AnsweredManager)
+    pending = research_manager.ClarifiedResearch(IDEA, session="s1")
+    assert len(pending.questions.splitlines()) == 3
+    # The answers come in a later asyncio.run(), like the next Streamlit turn
+    pending.answer(["Sales teams"])
+    assert asyncio.run(pending.report()) == f"{IDEA}: Sales teams"
+
+    abandoned = research_manager.ClarifiedResearch(IDEA, session="s2")
+    abandoned.cancel()
+    assert abandoned.cancel_token.cancelled
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(abandoned.report())
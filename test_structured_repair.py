@@ -0,0 +1,85 @@
+"""
+Regression tests for structured output repair: malformed answers are fixed locally where possible
+and escalated with only the broken fields otherwise.
+"""
+import json
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("TRACE_MODE", "off")
+
+import pytest
+from agents.exceptions import ModelBehaviorError
+from pydantic import BaseModel, Field
+
+from structured_repair import OutputRepairNeeded, TolerantOutputSchema, repair_output
+from writer_agent import ReportData, ReportOutline
+
+
+class Estimate(BaseModel):
+    name: str = Field(description="Feature name")
+    weeks: int = Field(description="Effort in weeks")
+    risky: bool = Field(description="Whether the estimate is risky")
+    steps: list[str] = Field(description="Implementation steps")
+
+
+def test_fenced_answer_with_trailing_text():
+    text = '```json\n{"short_summary": "s", "markdown_report": "# R", "follow_up_questions": ["q"]}\n```\nHope this helps!'
+    outcome = repair_output(ReportData, text)
+    assert outcome.value == ReportData(short_summary="s", markdown_report="# R", follow_up_questions=["q"])
+    assert outcome.notes == []
+
+
+def test_truncated_answer_is_closed_and_optional_fields_filled():
+    text = '{"short_summary": "Churn alerts pay off.", "markdown_report": "# Report\\n\\nThe market is gro'
+    outcome = repair_output(ReportData, text, optional=["follow_up_questions"])
+    assert outcome.value.markdown_report == "# Report\n\nThe market is gro"
+    assert outcome.value.follow_up_questions == []
+    assert outcome.notes == ["closed truncated JSON", "filled follow_up_questions"]
+
+
+def test_keys_wrappers_and_near_miss_types():
+    text = json.dumps({"Estimate": {"Name": "Alerts", "Weeks": "about 6 weeks", "RISKY": "yes",
+                                    "steps": "1. Ingest events\n2. Score churn\n3. Send alerts"}})
+    outcome = repair_output(Estimate, text)
+    assert outcome.value == Estimate(name="Alerts", weeks=6, risky=True,
+                                     steps=["Ingest events", "Score churn", "Send alerts"])
+
+
+def test_unfinished_last_list_item_is_dropped():
+    text = ('{"sections": [{"title": "Executive Summary", "key_points": ["a", "b"]}, '
+            '{"title": "Market Opportunity Assessment", "key_po')
+    outcome = repair_output(ReportOutline, text)
+    assert [section.title for section in outcome.value.sections] == ["Executive Summary"]
+    assert "dropped unfinished sections item" in outcome.notes
+
+
+def test_no_json_is_reported_as_all_fields_invalid():
+    outcome = repair_output(ReportData, "I could not write the report.")
+    assert outcome.value is None
+    assert outcome.invalid == list(ReportData.model_fields)
+
+
+def test_schema_escalates_only_the_broken_fields():
+    schema = TolerantOutputSchema(Estimate)
+    text = '{"name": "Alerts", "weeks": "soon", "risky": false, "steps": ["a"]}'
+    with pytest.raises(OutputRepairNeeded) as raised:
+        schema.validate_json(text)
+    needed = raised.value
+    assert needed.outcome.invalid == ["weeks"]
+    assert "Fields to return: weeks" in needed.repair_input()
+    assert '"weeks": "soon"' in needed.repair_input()
+
+    repair_type = needed.repair_agent("gpt-4.1-mini").output_type
+    assert list(repair_type.model_fields) == ["weeks"]
+    assert needed.merge(repair_type(weeks=3)) == Estimate(name="Alerts", weeks=3, risky=False, steps=["a"])
+
+
+def test_valid_output_passes_and_repair_can_be_disabled(monkeypatch):
+    schema = TolerantOutputSchema(Estimate)
+    valid = '{"name": "Alerts", "weeks": 2, "risky": false, "steps": ["a"]}'
+    assert schema.validate_json(valid).weeks == 2
+    monkeypatch.setenv("OUTPUT_REPAIR", "0")
+    with pytest.raises(ModelBehaviorError) as raised:
+        schema.validate_json('{"name": "Alerts", "weeks": "2"')
+    assert not isinstance(raised.value, OutputRepairNeeded)
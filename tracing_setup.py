@@ -0,0 +1,254 @@
+"""
+Trace sampling and local span export for the Agents SDK.
+
+TRACE_MODE:
+    full     every trace is exported (the SDK default)
+    sampled  a deterministic share of traces (TRACE_SAMPLE_RATE) is exported, plus every trace that
+             had an error or ran longer than TRACE_SLOW_SECONDS; spans are buffered until the trace
+             ends so that decision can be made (default)
+    off      tracing disabled
+
+TRACE_EXPORTER:
+    backend  the hosted OpenAI traces dashboard (default)
+    local    TRACE_LOCAL_PATH, a SQLite file (or JSON lines if it ends in .jsonl); works offline
+    both
+
+    python tracing_setup.py          # overhead of off / sampled / full on a simulated research run
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from agents.tracing import (Span, Trace, TracingProcessor, set_trace_processors, set_tracing_disabled)
+from agents.tracing.processors import BatchTraceProcessor, TracingExporter, default_exporter
+
+DEFAULT_SAMPLE_RATE = 0.1
+DEFAULT_SLOW_SECONDS = 60.0
+DEFAULT_LOCAL_PATH = "traces.db"
+MAX_BUFFERED_SPANS = 2000   # per trace; a runaway trace stops buffering rather than growing forever
+
+
+def head_sampled(trace_id: str, rate: float) -> bool:
+    """ Deterministic head decision, so callers can tell in advance whether a trace will be exported """
+    if rate >= 1:
+        return True
+    return int(hashlib.sha1(trace_id.encode()).hexdigest()[:8], 16) / 0xFFFFFFFF < rate
+
+
+# ============================
+# Local exporter
+# ============================
+class LocalSpanExporter(TracingExporter):
+    """ Writes traces and spans to a SQLite file, or appends JSON lines for a .jsonl path """
+
+    def __init__(self, path: str = DEFAULT_LOCAL_PATH):
+        self.path = path
+        self.jsonl = path.endswith(".jsonl")
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        if not self.jsonl:
+            # Only the batch processor's worker thread writes, but the tables are created here
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS traces (
+                    trace_id TEXT PRIMARY KEY, workflow TEXT, metadata TEXT, exported_at REAL
+                )""")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS spans (
+                    span_id TEXT PRIMARY KEY, trace_id TEXT, parent_id TEXT, type TEXT, name TEXT,
+                    started_at TEXT, ended_at TEXT, error TEXT, data TEXT
+                )""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_spans_trace ON spans (trace_id)")
+
+    def export(self, items: List[Any]) -> None:
+        records = [item.export() for item in items]
+        records = [record for record in records if record]
+        if not records:
+            return
+        with self._lock:
+            if self.jsonl:
+                with open(self.path, "a") as f:
+                    for record in records:
+                        f.write(json.dumps(record, default=str) + "\n")
+                return
+            traces = [(r["id"], r.get("workflow_name"), json.dumps(r.get("metadata"), default=str), time.time())
+                      for r in records if r.get("object") == "trace"]
+            spans = [(r["id"], r.get("trace_id"), r.get("parent_id"), (r.get("span_data") or {}).get("type"),
+                      (r.get("span_data") or {}).get("name"), r.get("started_at"), r.get("ended_at"),
+                      json.dumps(r.get("error"), default=str) if r.get("error") else None,
+                      json.dumps(r.get("span_data"), default=str))
+                     for r in records if r.get("object") == "trace.span"]
+            self._conn.execute("BEGIN")
+            self._conn.executemany("INSERT OR REPLACE INTO traces VALUES (?, ?, ?, ?)", traces)
+            self._conn.executemany("INSERT OR REPLACE INTO spans VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", spans)
+            self._conn.execute("COMMIT")
+
+
+# ============================
+# Sampling processor
+# ============================
+class SamplingProcessor(TracingProcessor):
+    """
+    Buffers each trace's spans until the trace ends, then forwards the whole trace to the
+    downstream processors if it was head-sampled, had an error or was slow; otherwise drops it.
+    """
+
+    def __init__(self, downstream: List[TracingProcessor], rate: float = DEFAULT_SAMPLE_RATE,
+                 slow_seconds: float = DEFAULT_SLOW_SECONDS):
+        self.downstream = downstream
+        self.rate = rate
+        self.slow_seconds = slow_seconds
+        self._lock = threading.Lock()
+        self._started: Dict[str, float] = {}
+        self._spans: Dict[str, List[Span]] = {}
+        self._errors: Dict[str, bool] = {}
+        self.kept = {"head": 0, "error": 0, "slow": 0}
+        self.dropped = 0
+
+    def on_trace_start(self, trace: Trace) -> None:
+        with self._lock:
+            self._started[trace.trace_id] = time.perf_counter()
+            self._spans[trace.trace_id] = []
+            self._errors[trace.trace_id] = False
+
+    def on_span_start(self, span: Span) -> None:
+        pass
+
+    def on_span_end(self, span: Span) -> None:
+        with self._lock:
+            spans = self._spans.get(span.trace_id)
+            if spans is None:
+                return
+            if span.error:
+                self._errors[span.trace_id] = True
+            if len(spans) < MAX_BUFFERED_SPANS:
+                spans.append(span)
+
+    def on_trace_end(self, trace: Trace) -> None:
+        with self._lock:
+            started = self._started.pop(trace.trace_id, None)
+            spans = self._spans.pop(trace.trace_id, [])
+            error = self._errors.pop(trace.trace_id, False)
+            duration = time.perf_counter() - started if started is not None else 0.0
+            if head_sampled(trace.trace_id, self.rate):
+                reason = "head"
+            elif error:
+                reason = "error"
+            elif duration >= self.slow_seconds:
+                reason = "slow"
+            else:
+                self.dropped += 1
+                return
+            self.kept[reason] += 1
+        for processor in self.downstream:
+            processor.on_trace_start(trace)
+            for span in spans:
+                processor.on_span_end(span)
+            processor.on_trace_end(trace)
+
+    def shutdown(self) -> None:
+        for processor in self.downstream:
+            processor.shutdown()
+
+    def force_flush(self) -> None:
+        for processor in self.downstream:
+            processor.force_flush()
+
+    def stats(self) -> Dict[str, int]:
+        return {**{f"kept_{reason}": count for reason, count in self.kept.items()}, "dropped": self.dropped}
+
+
+# ============================
+# Configuration
+# ============================
+sampler: Optional[SamplingProcessor] = None
+_configured = False
+
+
+def trace_mode() -> str:
+    return os.environ.get("TRACE_MODE", "sampled")
+
+
+def sample_rate() -> float:
+    return float(os.environ.get("TRACE_SAMPLE_RATE", DEFAULT_SAMPLE_RATE))
+
+
+def trace_url(trace_id: str) -> Optional[str]:
+    """ Dashboard URL of a trace, if it is certain to be exported to the hosted backend """
+    if trace_mode() == "off" or os.environ.get("TRACE_EXPORTER", "backend") == "local":
+        return None
+    if trace_mode() == "sampled" and not head_sampled(trace_id, sample_rate()):
+        return None
+    return f"https://platform.openai.com/traces/trace?trace_id={trace_id}"
+
+
+def configure_tracing(mode: Optional[str] = None, exporter: Optional[str] = None, force: bool = False) -> None:
+    """ Install the processors for TRACE_MODE / TRACE_EXPORTER; runs once per process unless forced """
+    global sampler, _configured
+    if _configured and not force:
+        return
+    _configured = True
+    mode = mode or trace_mode()
+    exporter = exporter or os.environ.get("TRACE_EXPORTER", "backend")
+
+    if mode == "off":
+        set_tracing_disabled(True)
+        return
+    set_tracing_disabled(False)
+    processors: List[TracingProcessor] = []
+    if exporter in ("backend", "both"):
+        processors.append(BatchTraceProcessor(default_exporter()))
+    if exporter in ("local", "both"):
+        processors.append(BatchTraceProcessor(LocalSpanExporter(os.environ.get("TRACE_LOCAL_PATH", DEFAULT_LOCAL_PATH))))
+
+    if mode == "full":
+        sampler = None
+        set_trace_processors(processors)
+    else:
+        sampler = SamplingProcessor(processors, rate=sample_rate(),
+                                    slow_seconds=float(os.environ.get("TRACE_SLOW_SECONDS", DEFAULT_SLOW_SECONDS)))
+        set_trace_processors([sampler])
+
+
+if __name__ == "__main__":
+    # Tracing overhead on a simulated research run: one trace, planner + 5 searches + writer + email spans
+    import asyncio
+    import tempfile
+
+    from agents.tracing import custom_span, flush_traces, trace
+
+    async def simulated_run(i: int) -> None:
+        with trace("Product Analysis trace"):
+            for stage in ["planner"] + ["search"] * 5 + ["writer", "email"]:
+                with custom_span(stage, {"input": f"run {i} " + "x" * 500}):
+                    await asyncio.sleep(0)
+
+    async def bench(runs: int = 500) -> float:
+        # 500 runs x 9 items stays under the batch processor's queue limit, so nothing is dropped
+        start = time.perf_counter()
+        for i in range(runs):
+            await simulated_run(i)
+        return (time.perf_counter() - start) / runs * 1e6
+
+    path = os.path.join(tempfile.mkdtemp(), "traces.db")
+    os.environ["TRACE_LOCAL_PATH"] = path
+    results, sampled_stats = {}, None
+    for mode in ("off", "sampled", "full"):
+        configure_tracing(mode=mode, exporter="local", force=True)
+        asyncio.run(bench(100))   # warm-up
+        flush_traces()
+        results[mode] = asyncio.run(bench())
+        flush_traces()
+        if sampler is not None:
+            sampled_stats = sampler.stats()
+    baseline = results["off"]
+    for mode, micros in results.items():
+        print(f"{mode:>8}: {micros:7.0f}µs per run ({micros - baseline:+.0f}µs vs off)")
+    print(f"sampled mode: {sampled_stats}")
+    count = sqlite3.connect(path).execute("SELECT COUNT(*) FROM spans").fetchone()[0]
+    print(f"{count} spans written to {path}")
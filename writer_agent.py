@@ -1,5 +1,7 @@
 from pydantic import BaseModel, Field
 from agents import Agent
+from model_router import stage_model
+from structured_repair import TolerantOutputSchema
 
 INSTRUCTIONS = (
     "You are a senior researcher tasked with writing a cohesive report for a research query. "
@@ -22,6 +24,91 @@ class ReportData(BaseModel):
 writer_agent = Agent(
     name="WriterAgent",
     instructions=INSTRUCTIONS,
-    model="gpt-4o-mini",
-    output_type=ReportData,
-)
\ No newline at end of file
+    model=stage_model("writer"),
+    output_type=TolerantOutputSchema(ReportData, optional=["follow_up_questions"]),
+)
+
+
+# ============================
+# Outline-then-parallel-sections writer
+# ============================
+# Section title -> keywords used to route search results to the section that needs them
+REPORT_SECTIONS = {
+    "Executive Summary": [],
+    "Market Opportunity Assessment": ["market", "size", "growth", "demand", "trend", "adoption", "tam", "segment"],
+    "Technical Feasibility Analysis": ["technical", "technology", "architecture", "api", "integration", "data", "model", "infrastructure"],
+    "Business Impact and ROI": ["revenue", "roi", "pricing", "cost", "monetization", "business", "margin", "value"],
+    "Competitive Analysis": ["competitor", "competitors", "competition", "alternative", "vendor", "leader", "differentiation"],
+    "Recommended MVP Scope": ["feature", "features", "user", "users", "workflow", "pain", "need", "mvp"],
+    "Implementation Roadmap": ["timeline", "phase", "launch", "roadmap", "rollout", "resource", "team"],
+    "Risk Assessment": ["risk", "risks", "regulation", "compliance", "privacy", "security", "challenge"],
+    "Next Steps and Recommendations": ["recommendation", "opportunity", "strategy", "next"],
+}
+
+
+class SectionOutline(BaseModel):
+    title: str = Field(description="Section title, exactly as given")
+    key_points: list[str] = Field(description="3-5 points this section must make")
+
+
+class ReportOutline(BaseModel):
+    sections: list[SectionOutline] = Field(description="One entry per requested section, in order")
+
+
+class ReportSummary(BaseModel):
+    short_summary: str = Field(description="A short 2-3 sentence summary of the findings.")
+
+    follow_up_questions: list[str] = Field(description="Suggested topics to research further")
+
+
+OUTLINE_INSTRUCTIONS = (
+    "You are a senior researcher planning a product analysis report. Given the query, the research "
+    "notes and the list of section titles, return an outline with 3-5 key points per section. "
+    "Keep points short and specific; they will be handed to separate writers, so avoid overlap between sections."
+)
+
+SECTION_INSTRUCTIONS = (
+    "You are a senior researcher writing one section of a product analysis report. "
+    "You will be given the query, the section title, the points the section must make and the research "
+    "relevant to it. Write only that section in markdown, starting with a '## <title>' heading. "
+    "Be detailed and concrete, 150-250 words. Do not repeat content that belongs to other sections."
+)
+
+REPORT_SUMMARY_INSTRUCTIONS = (
+    "You are given a finished product analysis report. Return a 2-3 sentence summary of its findings "
+    "and 3-5 suggested topics to research further."
+)
+
+outline_agent = Agent(
+    name="WriterOutlineAgent",
+    instructions=OUTLINE_INSTRUCTIONS,
+    model=stage_model("report_outline"),
+    output_type=TolerantOutputSchema(ReportOutline),
+)
+
+section_writer_agent = Agent(
+    name="WriterSectionAgent",
+    instructions=SECTION_INSTRUCTIONS,
+    model=stage_model("report_section"),
+)
+
+report_summary_agent = Agent(
+    name="WriterSummaryAgent",
+    instructions=REPORT_SUMMARY_INSTRUCTIONS,
+    model=stage_model("report_summary"),
+    output_type=TolerantOutputSchema(ReportSummary, optional=["follow_up_questions"]),
+)
+
+
+def select_section_evidence(section: str, search_results: list[str], limit: int = 3) -> list[str]:
+    """ The search results most relevant to a section, by keyword overlap """
+    keywords = REPORT_SECTIONS.get(section, [])
+    if not keywords:
+        return search_results[:limit]
+    scored = []
+    for index, result in enumerate(search_results):
+        text = result.lower()
+        score = sum(text.count(keyword) for keyword in keywords)
+        scored.append((score, -index, result))
+    scored.sort(reverse=True)
+    return [result for score, _, result in scored[:limit] if score > 0] or search_results[:1]